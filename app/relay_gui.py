@@ -2,12 +2,81 @@
 import tkinter as tk
 from tkinter import ttk
 import requests
+from requests.adapters import HTTPAdapter
 import argparse
-import json
-from datetime import datetime
+import queue
 import threading
+import uuid
 import sys
 
+# Relays per row in the relay grid
+GRID_COLUMNS = 8
+# Milliseconds between checks for finished API calls
+POLL_MS = 30
+
+
+class ApiWorker:
+    """Runs API calls on one background thread over a persistent keep-alive session.
+
+    The GUI thread enqueues calls and never blocks; finished calls are handed back through
+    `results`, which the GUI drains from its own event loop.
+    """
+
+    def __init__(self, base_url, timeout=5, retries=1):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.commands = queue.Queue()
+        self.results = queue.Queue()
+        self._status_pending = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="RelayApiWorker", daemon=True)
+        self._thread.start()
+
+    def get(self, path, tag):
+        self.commands.put(('GET', path, tag, None))
+
+    def post(self, path, tag):
+        # One idempotency key per command, so a retry after a timeout cannot switch twice
+        self.commands.put(('POST', path, tag, str(uuid.uuid4())))
+
+    def refresh_status(self):
+        """Queue a status read unless one is already waiting."""
+        if not self._status_pending.is_set():
+            self._status_pending.set()
+            self.get('/relay/status', 'status')
+
+    def close(self):
+        self.commands.put(None)
+
+    def _run(self):
+        while True:
+            item = self.commands.get()
+            if item is None:
+                self.session.close()
+                return
+            method, path, tag, key = item
+            if tag == 'status':
+                self._status_pending.clear()
+            self.results.put((tag, path) + self._request(method, path, key))
+
+    def _request(self, method, path, key):
+        headers = {'Idempotency-Key': key} if key else None
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, self.base_url + path, headers=headers,
+                                                timeout=self.timeout)
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = {}
+                return response.status_code, data, None
+            except requests.RequestException as e:
+                error = str(e)
+        return None, None, error
+
+
 class RelayControllerGUI:
     def __init__(self, host, port):
         self.host = host
@@ -15,176 +84,164 @@ class RelayControllerGUI:
         self.base_url = f"http://{host}:{port}"
         self.version = "Unknown"
         self.connected = False
-        
+        self.api = ApiWorker(self.base_url)
+
         # Create main window
         self.root = tk.Tk()
         self.root.title("Network Relay Controller")
         self.root.resizable(False, False)
-        
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
         # Create main frame
         self.main_frame = ttk.Frame(self.root, padding="10")
         self.main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
+
         # Header with version and connection info
         self.header_var = tk.StringVar(value="Network Relay Controller")
         self.connection_var = tk.StringVar(value=f"Connected to: {host}:{port}")
-        
-        ttk.Label(self.main_frame, textvariable=self.header_var).grid(row=0, column=0, columnspan=3)
-        ttk.Label(self.main_frame, textvariable=self.connection_var).grid(row=1, column=0, columnspan=3)
-        ttk.Separator(self.main_frame, orient='horizontal').grid(row=2, column=0, columnspan=3, sticky='ew', pady=5)
-        
+
+        ttk.Label(self.main_frame, textvariable=self.header_var).grid(row=0, column=0)
+        ttk.Label(self.main_frame, textvariable=self.connection_var).grid(row=1, column=0)
+        ttk.Separator(self.main_frame, orient='horizontal').grid(row=2, column=0, sticky='ew', pady=5)
+
         # Global control buttons
         button_frame = ttk.Frame(self.main_frame)
-        button_frame.grid(row=3, column=0, columnspan=3, pady=5)
-        
+        button_frame.grid(row=3, column=0, pady=5)
+
         self.all_on_btn = ttk.Button(button_frame, text="All ON", command=self.turn_all_on)
         self.all_on_btn.grid(row=0, column=0, padx=5)
-        
+
         self.all_off_btn = ttk.Button(button_frame, text="All OFF", command=self.turn_all_off)
         self.all_off_btn.grid(row=0, column=1, padx=5)
-        
+
         self.status_btn = ttk.Button(button_frame, text="Get Status", command=self.get_relay_status)
         self.status_btn.grid(row=0, column=2, padx=5)
-        
-        # Relay status and control
-        self.relay_states = {}  # StringVar for LED display
+
+        # Relay grid, built from the first status response
+        self.relay_frame = ttk.Frame(self.main_frame)
+        self.relay_frame.grid(row=4, column=0, pady=2)
         self.relay_status = {}  # Current state of each relay (True=ON, False=OFF)
+        self.relay_leds = {}    # LED label of each relay, updated in place
         self.relay_buttons = {}
-        
-        for i in range(4):
-            relay_id = i + 1
-            # Relay status label with LED
-            self.relay_states[relay_id] = tk.StringVar(value="●")
-            self.relay_status[relay_id] = False  # Initialize all relays as OFF
-            relay_frame = ttk.Frame(self.main_frame)
-            relay_frame.grid(row=i+4, column=0, columnspan=3, pady=2)
-            
-            ttk.Label(relay_frame, text=f"Relay {relay_id}: ").grid(row=0, column=0)
-            led_label = ttk.Label(relay_frame, textvariable=self.relay_states[relay_id], foreground='red', font=('TkDefaultFont', 18, 'bold'))
-            led_label.grid(row=0, column=1)
-            
-            # Toggle button
-            toggle_btn = ttk.Button(
-                relay_frame, 
-                text=f"Toggle {relay_id}",
-                command=lambda x=relay_id: self.toggle_relay(x)
-            )
-            toggle_btn.grid(row=0, column=2, padx=5)
-            self.relay_buttons[relay_id] = toggle_btn
-        
+
         # Status bar
         self.status_var = tk.StringVar(value="Status: Disconnected")
-        ttk.Label(self.main_frame, textvariable=self.status_var).grid(row=8, column=0, columnspan=3, pady=5)
-        
+        ttk.Label(self.main_frame, textvariable=self.status_var).grid(row=5, column=0, pady=5)
+
+        self._handlers = {'health': self._on_health, 'version': self._on_version,
+                          'status': self._on_status, 'relay': self._on_relay_command,
+                          'all': self._on_all_command}
+        self.root.after(POLL_MS, self._poll_results)
+
         # Initialize connection
         self.initialize_connection()
 
     def initialize_connection(self):
-        """Initialize connection and get initial status"""
+        """Queue the health check; version and status follow once it succeeds"""
         self.status_var.set("Status: Connecting...")
-        threading.Thread(target=self._initialize_async).start()
-
-    def _initialize_async(self):
-        """Asynchronous initialization to prevent GUI freezing"""
-        try:
-            if self.check_health():
-                self.get_version()
-                self.get_relay_status()
-                self.connected = True
-                self.status_var.set("Status: Connected ✓")
-            else:
-                self.status_var.set("Status: Connection Failed")
-        except Exception as e:
-            self.handle_api_error(str(e))
-
-    def check_health(self):
-        """Check API health"""
-        try:
-            response = requests.get(f"{self.base_url}/system/health", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+        self.api.get('/system/health', 'health')
 
     def get_version(self):
-        """Get controller version"""
-        try:
-            response = requests.get(f"{self.base_url}/system/version", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                self.version = data.get('version', 'Unknown')
-                self.header_var.set(f"Network Relay Controller - v{self.version}")
-        except Exception as e:
-            self.handle_api_error(f"Version check failed: {str(e)}")
+        self.api.get('/system/version', 'version')
 
     def get_relay_status(self):
-        """Get status of all relays"""
-        def update_gui(data):
-            for relay in data.get('relays', []):
-                relay_id = relay['id']
-                state = relay['state']
-                if relay_id in self.relay_states:
-                    is_on = state == 'ON'
-                    color = 'green' if is_on else 'red'
-                    self.relay_status[relay_id] = is_on  # Update stored state
-                    self.relay_states[relay_id].set("●")
-                    for widget in self.main_frame.winfo_children():
-                        if isinstance(widget, ttk.Frame):
-                            for child in widget.winfo_children():
-                                if isinstance(child, ttk.Label) and \
-                                   child.cget('textvariable') == str(self.relay_states[relay_id]):
-                                    child.configure(foreground=color)
-
-        try:
-            response = requests.get(f"{self.base_url}/relay/status", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                self.root.after(0, update_gui, data)
-                self.status_var.set("Status: Updated successfully")
-            else:
-                self.status_var.set("Status: Failed to get relay status")
-        except Exception as e:
-            self.handle_api_error(str(e))
+        self.api.refresh_status()
 
     def toggle_relay(self, relay_id):
-        """Toggle specific relay based on its current state"""
-        try:
-            # Get current state and determine target state
-            current_state = self.relay_status.get(relay_id, False)
-            # Send opposite command of current state
-            command = "off" if current_state else "on"
-            
-            response = requests.post(
-                f"{self.base_url}/relay/{relay_id}/{command}",
-                timeout=5
-            )
-            if response.status_code == 200:
-                self.get_relay_status()
-            else:
-                self.status_var.set(f"Status: Failed to {command} relay {relay_id}")
-        except Exception as e:
-            self.handle_api_error(str(e))
+        """Toggle specific relay based on its last known state"""
+        command = "off" if self.relay_status.get(relay_id, False) else "on"
+        self.api.post(f"/relay/{relay_id}/{command}", 'relay')
 
     def turn_all_on(self):
-        """Turn all relays on"""
-        try:
-            response = requests.post(f"{self.base_url}/relay/all/on", timeout=5)
-            if response.status_code == 200:
-                self.get_relay_status()
-            else:
-                self.status_var.set("Status: Failed to turn all relays on")
-        except Exception as e:
-            self.handle_api_error(str(e))
+        self.api.post("/relay/all/on", 'all')
 
     def turn_all_off(self):
-        """Turn all relays off"""
+        self.api.post("/relay/all/off", 'all')
+
+    def close(self):
+        self.api.close()
+        self.root.destroy()
+
+    def _poll_results(self):
+        """Apply finished API calls on the Tk thread; a failing handler never stops polling"""
         try:
-            response = requests.post(f"{self.base_url}/relay/all/off", timeout=5)
-            if response.status_code == 200:
-                self.get_relay_status()
-            else:
-                self.status_var.set("Status: Failed to turn all relays off")
-        except Exception as e:
-            self.handle_api_error(str(e))
+            while True:
+                try:
+                    tag, path, code, data, error = self.api.results.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if error is not None:
+                        self.handle_api_error(error)
+                    else:
+                        self._handlers[tag](path, code, data)
+                except Exception as e:
+                    self.handle_api_error(f"{path}: {e}")
+        finally:
+            self.root.after(POLL_MS, self._poll_results)
+
+    def _on_health(self, path, code, data):
+        if code == 200:
+            self.connected = True
+            self.status_var.set("Status: Connected ✓")
+            self.get_version()
+            self.get_relay_status()
+        else:
+            self.status_var.set("Status: Connection Failed")
+
+    def _on_version(self, path, code, data):
+        if code == 200:
+            self.version = data.get('version', 'Unknown')
+            self.header_var.set(f"Network Relay Controller - v{self.version}")
+
+    def _on_status(self, path, code, data):
+        if code != 200:
+            self.status_var.set("Status: Failed to get relay status")
+            return
+        relays = data.get('relays', [])
+        if [r['id'] for r in relays] != list(self.relay_leds):
+            self._build_relays([r['id'] for r in relays])
+        for relay in relays:
+            self._set_led(relay['id'], relay['state'] == 'ON')
+        self.status_var.set("Status: Updated successfully")
+
+    def _on_relay_command(self, path, code, data):
+        if code == 200:
+            self._set_led(data['relay'], data['state'] == 'ON')
+        else:
+            self.status_var.set(f"Status: {path} failed: {data.get('message', code)}")
+
+    def _on_all_command(self, path, code, data):
+        if code == 200:
+            self.get_relay_status()
+        else:
+            self.status_var.set(f"Status: {path} failed: {data.get('message', code)}")
+
+    def _build_relays(self, relay_ids):
+        """Create one LED and toggle button per relay, GRID_COLUMNS per row"""
+        for child in self.relay_frame.winfo_children():
+            child.destroy()
+        self.relay_leds.clear()
+        self.relay_buttons.clear()
+        self.relay_status.clear()
+        for i, relay_id in enumerate(relay_ids):
+            cell = ttk.Frame(self.relay_frame)
+            cell.grid(row=i // GRID_COLUMNS, column=i % GRID_COLUMNS, padx=4, pady=2)
+            ttk.Label(cell, text=f"Relay {relay_id}: ").grid(row=0, column=0)
+            led = ttk.Label(cell, text="●", foreground='red', font=('TkDefaultFont', 18, 'bold'))
+            led.grid(row=0, column=1)
+            button = ttk.Button(cell, text=f"Toggle {relay_id}", command=lambda x=relay_id: self.toggle_relay(x))
+            button.grid(row=0, column=2, padx=5)
+            self.relay_leds[relay_id] = led
+            self.relay_buttons[relay_id] = button
+            self.relay_status[relay_id] = False
+
+    def _set_led(self, relay_id, is_on):
+        led = self.relay_leds.get(relay_id)
+        if led is None or self.relay_status[relay_id] == is_on:
+            return
+        self.relay_status[relay_id] = is_on
+        led.configure(foreground='green' if is_on else 'red')
 
     def handle_api_error(self, error_msg):
         """Handle API errors"""
@@ -198,10 +255,10 @@ def parse_arguments():
                       help='Hostname or IP address of relay controller')
     parser.add_argument('-p', '--port', type=int, default=5000,
                       help='Port number of relay controller API')
-    
+
     parser._optionals.title = 'Available options'
     parser._positionals.title = 'Positional arguments'
-    
+
     return parser.parse_args()
 
 def main():
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Requests/sec and p99 latency of the API under each api.server mode.
+
+Each mode runs `python -m src.main` in a subprocess (mock GPIO, temporary config)
+and is hit by concurrent keep-alive clients on /relay/status and /relay/<id>/on.
+
+    python benchmarks/bench_serving.py --clients 16 --requests 500
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ROUTES = [("GET", "/relay/status"), ("POST", "/relay/1/on")]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_config(tmpdir, mode, port, workers):
+    with open(os.path.join(ROOT, 'config', 'settings.yaml')) as f:
+        cfg = yaml.safe_load(f)
+    cfg['api'].update({'host': '127.0.0.1', 'port': port, 'server': mode, 'workers': workers})
+    # Measure the server, not the admission limits
+    cfg['api'].pop('rate_limits', None)
+    cfg['logging'].update({'file': os.path.join(tmpdir, 'bench.log'), 'console': False, 'level': 'WARNING'})
+    path = os.path.join(tmpdir, f'{mode}.yaml')
+    with open(path, 'w') as f:
+        yaml.safe_dump(cfg, f)
+    return path
+
+
+def wait_ready(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/system/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+
+def run_load(port, method, path, clients, requests_per_client):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client():
+        local = []
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                conn.request(method, path)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    errors.append(resp.status)
+                if resp.getheader("Connection", "").lower() == "close":
+                    conn.close()
+            except (OSError, http.client.HTTPException) as e:
+                errors.append(str(e))
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+def bench_mode(mode, clients, requests_per_client, workers):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config_path = write_config(tmpdir, mode, port, workers)
+        proc = subprocess.Popen([sys.executable, '-m', 'src.main', '--config', config_path], cwd=ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(port)
+            return {f"{method} {path}": run_load(port, method, path, clients, requests_per_client)
+                    for method, path in ROUTES}
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['development', 'threaded', 'waitress'])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help='requests per client per route')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes:
+        try:
+            results[mode] = bench_mode(mode, args.clients, args.requests, args.workers)
+        except Exception as e:
+            print(f"{mode}: skipped ({e})", file=sys.stderr)
+            continue
+        for route, r in results[mode].items():
+            print(f"{mode:12} {route:20} {r['rps']:>9} req/s  p50 {r['p50_ms']:>7} ms  "
+                  f"p99 {r['p99_ms']:>7} ms  errors {r['errors']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Cold-start time of `python -m src.main`: time to first GPIO write and to first served request.
+
+"First GPIO write" is the "Relays in boot state" log line, emitted once the backend has
+driven every pin to its boot state; "first request" is the first 200 from /relay/status.
+Each run is repeated with and without a warm parsed-config cache.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import http.client
+import json
+import os
+import selectors
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_serving import ROOT, free_port  # noqa: E402
+
+READY_LINE = "Relays in boot state"
+
+
+def write_config(tmpdir, port):
+    with open(os.path.join(ROOT, 'config', 'settings.yaml')) as f:
+        cfg = yaml.safe_load(f)
+    cfg['api'].update({'host': '127.0.0.1', 'port': port})
+    cfg['gpio'] = {'backend': 'simulator'}
+    cfg['logging'].update({'file': None, 'console': True, 'level': 'INFO', 'async': False})
+    cfg['system']['config_reload_interval'] = 0
+    for section in ('journal', 'history'):
+        cfg.pop(section, None)
+    path = os.path.join(tmpdir, 'startup.yaml')
+    with open(path, 'w') as f:
+        yaml.safe_dump(cfg, f)
+    return path
+
+
+def first_request(port, deadline):
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/relay/status")
+            status = conn.getresponse().status
+            conn.close()
+            if status == 200:
+                return time.perf_counter()
+        except OSError:
+            pass
+        time.sleep(0.002)
+    raise RuntimeError(f"server on port {port} did not answer")
+
+
+def run_once(config_path, port, cache, timeout=20.0):
+    """Start the service once; returns (ms to first GPIO write, ms to first request)."""
+    cmd = [sys.executable, '-m', 'src.main', '-c', config_path, '--config-cache', cache]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + timeout
+    try:
+        gpio_at = None
+        with selectors.DefaultSelector() as sel:
+            sel.register(proc.stderr, selectors.EVENT_READ)
+            while gpio_at is None:
+                if time.monotonic() > deadline or not sel.select(timeout=deadline - time.monotonic()):
+                    raise RuntimeError("no boot-state log line from src.main")
+                line = proc.stderr.readline()
+                if not line:
+                    raise RuntimeError(f"src.main exited with {proc.wait()}")
+                if READY_LINE in line:
+                    gpio_at = time.perf_counter()
+        served_at = first_request(port, deadline)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return (gpio_at - start) * 1000, (served_at - start) * 1000
+
+
+def bench(runs, warm):
+    gpio, served = [], []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config_path = write_config(tmpdir, port)
+        cache = config_path + '.cache' if warm else ''
+        if warm:
+            run_once(config_path, port, cache)  # populate the cache
+        for _ in range(runs):
+            g, s = run_once(config_path, port, cache)
+            gpio.append(g)
+            served.append(s)
+    return {"config_cache": "warm" if warm else "off", "runs": runs,
+            "first_gpio_write_ms": round(sorted(gpio)[len(gpio) // 2], 1),
+            "first_request_ms": round(sorted(served)[len(served) // 2], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+    results = [bench(args.runs, warm) for warm in (False, True)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'config cache':<14}{'first GPIO write':>18}{'first request':>16}  (median of {args.runs})")
+    for r in results:
+        print(f"{r['config_cache']:<14}{r['first_gpio_write_ms']:>15.1f} ms{r['first_request_ms']:>13.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
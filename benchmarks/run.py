@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Reproducible benchmark suite for the relay controller and API, on simulated GPIO.
+
+    python -m benchmarks.run --save-baseline baseline.json
+    python -m benchmarks.run --compare baseline.json --threshold 0.2 --json results.json
+
+Every case reports operations per second and per-operation latency percentiles, each the
+median of --repeat runs. No baseline is committed, since numbers only compare on the same
+machine: save one from the commit you are comparing against. --compare exits with status 1
+when a case's throughput dropped or its p99 latency grew by more than --threshold relative
+to the baseline file and, per operation, by more than --min-delta-us microseconds.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict
+
+from src.gpio_backend import SimulatedBackend
+from src.logger import setup_logger, shutdown_logger
+from src.relay_controller import RelayController
+
+CASES: Dict[str, Callable[[argparse.Namespace], Dict]] = {}
+
+
+def case(name):
+    def register(fn):
+        CASES[name] = fn
+        return fn
+    return register
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 100) -> Dict:
+    """Time `iterations` calls of `fn` individually and summarize them."""
+    for _ in range(min(warmup, iterations)):
+        fn()
+    samples = [0.0] * iterations
+    clock = time.perf_counter
+    start = clock()
+    for i in range(iterations):
+        t0 = clock()
+        fn()
+        samples[i] = clock() - t0
+    total = clock() - start
+    return summarize(samples, total)
+
+
+def summarize(samples, elapsed) -> Dict:
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        "ops": n,
+        "ops_per_sec": round(n / elapsed, 1),
+        "mean_us": round(sum(samples) / n * 1e6, 2),
+        "p50_us": round(samples[n // 2] * 1e6, 2),
+        "p99_us": round(samples[min(n - 1, int(n * 0.99))] * 1e6, 2),
+    }
+
+
+def quiet_logger():
+    log = logging.getLogger("RelayBenchmark")
+    log.setLevel(logging.WARNING)
+    return log
+
+
+def make_controller(relays: int, latency_us: float = 0):
+    pin_map = {rid: rid for rid in range(1, relays + 1)}
+    backend = SimulatedBackend(write_latency_us=latency_us, transaction_latency_us=latency_us)
+    return RelayController(pin_map, quiet_logger(), backend=backend)
+
+
+@case("toggle")
+def bench_toggle(args):
+    ctrl = make_controller(4)
+    state = [False]
+
+    def toggle():
+        state[0] = not state[0]
+        (ctrl.turn_on if state[0] else ctrl.turn_off)(1)
+    try:
+        return {"relays=4": measure(toggle, args.iterations)}
+    finally:
+        ctrl.cleanup()
+
+
+@case("turn_all_on")
+def bench_turn_all(args):
+    results = {}
+    for relays in (4, 16, 64, 256):
+        ctrl = make_controller(relays)
+        flip = [False]
+
+        def all_on_off():
+            flip[0] = not flip[0]
+            (ctrl.turn_all_on if flip[0] else ctrl.turn_all_off)()
+        results[f"relays={relays}"] = measure(all_on_off, args.iterations)
+        ctrl.cleanup()
+    return results
+
+
+@case("status")
+def bench_status(args):
+    results = {}
+    for relays in (4, 64, 256):
+        ctrl = make_controller(relays)
+        results[f"cached relays={relays}"] = measure(ctrl.get_status_json, args.iterations)
+        flip = [False]
+
+        def changed_then_read():
+            flip[0] = not flip[0]
+            (ctrl.turn_on if flip[0] else ctrl.turn_off)(1)
+            return ctrl.get_status_json()
+        results[f"after change relays={relays}"] = measure(changed_then_read, args.iterations)
+        ctrl.cleanup()
+    return results
+
+
+@case("http")
+def bench_http(args):
+    from benchmarks.bench_serving import run_load
+    from src.api_server import init_api, shutdown_api
+    from src.server import PooledWSGIServer
+
+    class Config:
+        def get(self, section, key=None):
+            return {} if section == 'api' else "bench"
+
+    # Keep werkzeug's per-request access log out of the results
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    ctrl = make_controller(4)
+    app = init_api(ctrl, Config(), quiet_logger())
+    server = PooledWSGIServer("127.0.0.1", 0, app, workers=args.clients)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    results = {}
+    try:
+        requests_per_client = max(1, args.iterations // (10 * args.clients))
+        for method, path in (("GET", "/relay/status"), ("POST", "/relay/1/on")):
+            load = run_load(server.port, method, path, args.clients, requests_per_client)
+            results[f"{method} {path} clients={args.clients}"] = {
+                "ops": load["requests"], "ops_per_sec": load["rps"], "errors": load["errors"],
+                "p50_us": load["p50_ms"] * 1000, "p99_us": load["p99_ms"] * 1000}
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutdown_api()
+        ctrl.cleanup()
+    return results
+
+
+@case("binary")
+def bench_binary(args):
+    import socket
+    from src import binary_protocol as bp
+
+    ctrl = make_controller(4)
+    server = bp.BinaryProtocolServer(ctrl, quiet_logger(), "127.0.0.1", tcp_port=0, udp_port=0)
+    server.start()
+    results = {}
+    try:
+        with socket.create_connection(server.tcp_address) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            seq = [0]
+
+            def round_trip():
+                seq[0] += 1
+                sock.sendall(bp.encode_command(bp.ON if seq[0] & 1 else bp.OFF, seq[0], 1))
+                sock.recv(bp.FRAME_SIZE)
+            results["tcp round trip"] = measure(round_trip, args.iterations)
+
+            frames = b"".join(bp.encode_command(bp.ON if i & 1 else bp.OFF, i, 1)
+                              for i in range(args.iterations))
+            start = time.perf_counter()
+            sock.sendall(frames)
+            received = 0
+            while received < len(frames):
+                received += len(sock.recv(65536))
+            elapsed = time.perf_counter() - start
+            # Pipelined frames have no individual latency; report the mean time per command
+            per_op = round(elapsed / args.iterations * 1e6, 2)
+            results["tcp pipelined"] = {"ops": args.iterations,
+                                        "ops_per_sec": round(args.iterations / elapsed, 1),
+                                        "mean_us": per_op, "p50_us": per_op, "p99_us": per_op}
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(server.udp_address)
+
+            def udp_round_trip():
+                seq[0] += 1
+                sock.send(bp.encode_command(bp.ON if seq[0] & 1 else bp.OFF, seq[0], 1))
+                sock.recv(bp.FRAME_SIZE)
+            results["udp round trip"] = measure(udp_round_trip, args.iterations)
+    finally:
+        server.stop()
+        ctrl.cleanup()
+    return results
+
+
+@case("logging")
+def bench_logging(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for mode, async_mode in (("sync file", False), ("async file", True)):
+            name = f"RelayBenchmarkLog{int(async_mode)}"
+            log = setup_logger(name, "INFO", os.path.join(tmpdir, f"{name}.log"), console=False,
+                               async_mode=async_mode, queue_size=args.iterations + 1000)
+            results[mode] = measure(lambda: log.info("Relay %s ON", 1), args.iterations)
+            shutdown_logger(name)
+    return results
+
+
+def _us_per_op(result) -> float:
+    return 1e6 / result["ops_per_sec"] if result["ops_per_sec"] else float("inf")
+
+
+def median_runs(runs):
+    """Per-variant median of every metric over repeated runs of one case."""
+    return {variant: {key: statistics.median(run[variant][key] for run in runs) for key in runs[0][variant]}
+            for variant in runs[0]}
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, min_delta_us: float = 0):
+    """Yield (case, variant, message) for every regression beyond `threshold` and `min_delta_us`.
+
+    A slowdown counts only when it is both relatively and absolutely large, so the jitter of
+    sub-microsecond cases does not fail the comparison.
+    """
+    for name, variants in results.items():
+        for variant, current in variants.items():
+            base = baseline.get(name, {}).get(variant)
+            if not base:
+                continue
+            per_op_delta_us = _us_per_op(current) - _us_per_op(base)
+            if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold) and per_op_delta_us > min_delta_us:
+                yield name, variant, f"throughput {base['ops_per_sec']} -> {current['ops_per_sec']} ops/s"
+            if (current["p99_us"] > base["p99_us"] * (1 + threshold)
+                    and current["p99_us"] - base["p99_us"] > min_delta_us):
+                yield name, variant, f"p99 {base['p99_us']} -> {current['p99_us']} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='run only these cases')
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent HTTP clients')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--save-baseline', help='write results as the new baseline file')
+    parser.add_argument('--compare', help='baseline file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--min-delta-us', type=float, default=1.0,
+                        help='ignore slowdowns smaller than this per operation')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the median is reported')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or CASES:
+        results[name] = median_runs([CASES[name](args) for _ in range(max(args.repeat, 1))])
+        for variant, r in results[name].items():
+            print(f"{name:12} {variant:34} {r['ops_per_sec']:>12} ops/s  p50 {r['p50_us']:>9} us  "
+                  f"p99 {r['p99_us']:>9} us")
+
+    report = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                       "iterations": args.iterations, "repeat": args.repeat, "timestamp": time.time()},
+              "results": results}
+    for path in filter(None, (args.json, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = list(compare(results, baseline, args.threshold, args.min_delta_us))
+        for name, variant, message in regressions:
+            print(f"REGRESSION {name} [{variant}]: {message}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Virtual relay board for hardware-in-the-loop runs without real hardware.
+
+Unlike SimulatedBackend, which only stores pin states, the board models the relay itself:
+contacts move `switch_latency_ms` after the coil is driven, bounce for `bounce_ms`, and
+read-back reports the contacts rather than the last command. Relays can be stuck and bus
+transactions can fail at a configurable rate.
+"""
+import random
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+from src.gpio_backend import SimulatedBackend
+
+
+class VirtualRelayBoard(SimulatedBackend):
+    """SimulatedBackend with mechanical relay behaviour and fault injection.
+
+    `stuck` maps pins to the state their contacts are welded or jammed in; writes to them
+    are accepted but read-back never changes. `write_fail_rate` and `read_fail_rate` make
+    a bus transaction raise OSError with that probability.
+    """
+
+    name = "virtual"
+
+    def __init__(self, switch_latency_ms: float = 0, bounce_ms: float = 0, write_fail_rate: float = 0,
+                 read_fail_rate: float = 0, stuck: Optional[Mapping[int, bool]] = None,
+                 write_latency_us: float = 0, read_latency_us: float = 0, transaction_latency_us: float = 0,
+                 seed: Optional[int] = None, clock=time.monotonic):
+        super().__init__(write_latency_us, read_latency_us, transaction_latency_us)
+        self.switch_latency = switch_latency_ms / 1000.0
+        self.bounce = bounce_ms / 1000.0
+        self.settle_time = self.switch_latency + self.bounce
+        self.write_fail_rate = write_fail_rate
+        self.read_fail_rate = read_fail_rate
+        self.stuck: Dict[int, bool] = {int(pin): bool(state) for pin, state in (stuck or {}).items()}
+        self.clock = clock
+        self.random = random.Random(seed)
+        # pin -> (contact state before the last command, commanded state, time the contacts move)
+        self._moves: Dict[int, tuple] = {}
+        self.operations: Dict[int, int] = {}
+        self.write_failures = 0
+        self.read_failures = 0
+        self._lock = threading.Lock()
+
+    def setup(self, pins, states):
+        super().setup(pins, states)
+        with self._lock:
+            self._moves = {}
+            self.operations = {pin: 0 for pin in pins}
+
+    def contact(self, pin: int, now: Optional[float] = None) -> bool:
+        """State of the relay contacts on `pin` at `now`, including bounce and stuck relays."""
+        if pin in self.stuck:
+            return self.stuck[pin]
+        now = self.clock() if now is None else now
+        move = self._moves.get(pin)
+        if move is None:
+            return self.pins.get(pin, False)
+        before, after, moves_at = move
+        if now < moves_at:
+            return before
+        if now < moves_at + self.bounce:
+            return self.random.random() < 0.5
+        return after
+
+    def write(self, pin, state):
+        self._delay(self.transaction_latency + self.write_latency)
+        self._drive([(pin, state)])
+
+    def write_many(self, writes):
+        writes = list(writes)
+        self._delay(self.transaction_latency + self.write_latency * len(writes))
+        self._drive(writes)
+
+    def _drive(self, writes):
+        with self._lock:
+            if self.write_fail_rate and self.random.random() < self.write_fail_rate:
+                self.write_failures += 1
+                raise OSError("Injected bus write failure")
+            now = self.clock()
+            for pin, state in writes:
+                state = bool(state)
+                if self.pins.get(pin) != state:
+                    self._moves[pin] = (self.contact(pin, now), state, now + self.switch_latency)
+                    self.operations[pin] = self.operations.get(pin, 0) + 1
+                self.pins[pin] = state
+            self.writes += len(writes)
+            self.transactions += 1
+
+    def read(self, pin):
+        return self.read_many([pin])[0]
+
+    def read_many(self, pins):
+        self._delay(self.read_latency)
+        with self._lock:
+            if self.read_fail_rate and self.random.random() < self.read_fail_rate:
+                self.read_failures += 1
+                raise OSError("Injected bus read failure")
+            now = self.clock()
+            return [self.contact(pin, now) for pin in pins]
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Replay a recorded or synthetic command trace against a running relay server.
+
+    python -m simulator.loadgen --url http://127.0.0.1:5000 --rate 200 --clients 16 --duration 10
+    python -m simulator.loadgen --rate 100 --duration 5 --record trace.jsonl
+    python -m simulator.loadgen --trace trace.jsonl --clients 8 --json
+
+A trace is JSON lines of {"t": seconds from start, "method": "POST", "path": "/relay/3/on"}.
+Commands are sent open-loop at their scheduled time, so latency is measured from when a
+command was due, including any wait for a free client. All writes to one relay go through
+the same client. That client checks every status read against what it last wrote to its
+relays; a mismatch is a consistency error.
+"""
+import argparse
+import http.client
+import json
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+RELAY_WRITE = re.compile(r"^/relay/(\d+)/(on|off)$")
+
+
+def synthetic_trace(relay_ids: Sequence[int], rate: float, duration: float, read_ratio: float = 0.2,
+                    seed: Optional[int] = None) -> List[Dict]:
+    """`rate` commands per second for `duration` seconds: status reads and random relay on/off."""
+    rng = random.Random(seed)
+    trace = []
+    for i in range(int(rate * duration)):
+        if rng.random() < read_ratio:
+            trace.append({"t": i / rate, "method": "GET", "path": "/relay/status"})
+        else:
+            action = rng.choice(("on", "off"))
+            trace.append({"t": i / rate, "method": "POST", "path": f"/relay/{rng.choice(relay_ids)}/{action}"})
+    return trace
+
+
+def load_trace(path: str) -> List[Dict]:
+    with open(path) as f:
+        trace = [json.loads(line) for line in f if line.strip()]
+    for i, entry in enumerate(trace):
+        entry.setdefault("method", "GET")
+        if "path" not in entry:
+            raise ValueError(f"Trace entry {i} has no path")
+    return trace
+
+
+def save_trace(path: str, trace: List[Dict]):
+    with open(path, 'w') as f:
+        for entry in trace:
+            f.write(json.dumps(entry) + "\n")
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"p50": round(pick(0.50), 3), "p90": round(pick(0.90), 3), "p99": round(pick(0.99), 3),
+            "max": round(values[-1], 3)}
+
+
+class _Client(threading.Thread):
+    """Sends its share of the trace over one keep-alive connection and tracks its relays."""
+
+    def __init__(self, host, port, timeout):
+        super().__init__(daemon=True)
+        self.host, self.port, self.timeout = host, port, timeout
+        self.commands = queue.Queue()
+        self.expected: Dict[int, bool] = {}
+        self.latencies: List[float] = []
+        self.service: List[float] = []
+        self.statuses = Counter()
+        self.consistency_errors = 0
+        self.mismatches: List[Dict] = []
+
+    def request(self, conn, method, path):
+        conn.request(method, path)
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, body
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        while True:
+            item = self.commands.get()
+            if item is None:
+                break
+            due, method, path = item
+            start = time.perf_counter()
+            write = RELAY_WRITE.match(path)
+            try:
+                status, body = self.request(conn, method, path)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self.statuses["transport_error"] += 1
+                if write:
+                    # The command may or may not have been applied
+                    self.expected.pop(int(write.group(1)), None)
+                continue
+            end = time.perf_counter()
+            self.latencies.append((end - due) * 1000)
+            self.service.append((end - start) * 1000)
+            self.statuses[str(status)] += 1
+            if status != 200:
+                continue
+            if write:
+                self.expected[int(write.group(1))] = write.group(2) == "on"
+            elif path.startswith("/relay/status"):
+                self.check(json.loads(body), "status read")
+        conn.close()
+
+    def check(self, status_body, when):
+        """Count relays this client owns whose reported state differs from its last write."""
+        reported = {r["id"]: r["state"] == "ON" for r in status_body.get("relays", [])}
+        for rid, state in self.expected.items():
+            if reported.get(rid) != state:
+                self.consistency_errors += 1
+                if len(self.mismatches) < 20:
+                    self.mismatches.append({"relay": rid, "expected": "ON" if state else "OFF",
+                                            "reported": "ON" if reported.get(rid) else "OFF", "at": when})
+
+
+def run(url: str, trace: List[Dict], clients: int = 8, timeout: float = 10.0) -> Dict:
+    """Replay `trace` against `url` with `clients` connections and return the report."""
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    workers = [_Client(host, port, timeout) for _ in range(clients)]
+    for worker in workers:
+        worker.start()
+    trace = sorted(trace, key=lambda entry: entry.get("t", 0))
+    start = time.perf_counter()
+    for n, entry in enumerate(trace):
+        due = start + entry.get("t", 0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        write = RELAY_WRITE.match(entry["path"])
+        owner = workers[int(write.group(1)) % clients] if write else workers[n % clients]
+        owner.commands.put((due, entry["method"].upper(), entry["path"]))
+    for worker in workers:
+        worker.commands.put(None)
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    # Once everything has settled, the final state must match every relay's last write
+    final = http.client.HTTPConnection(host, port, timeout=timeout)
+    final.request("GET", "/relay/status")
+    status_body = json.loads(final.getresponse().read())
+    final.close()
+    for worker in workers:
+        worker.check(status_body, "end of run")
+
+    statuses = sum((worker.statuses for worker in workers), Counter())
+    completed = sum(n for code, n in statuses.items() if code != "transport_error")
+    span = trace[-1].get("t", 0) if trace else 0
+    return {
+        "commands": len(trace),
+        "completed": completed,
+        "duration_s": round(elapsed, 3),
+        "target_rps": round(len(trace) / span, 1) if span else None,
+        "throughput_rps": round(completed / elapsed, 1) if elapsed else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": percentiles([v for worker in workers for v in worker.latencies]),
+        "service_ms": percentiles([v for worker in workers for v in worker.service]),
+        "consistency_errors": sum(worker.consistency_errors for worker in workers),
+        "mismatches": [m for worker in workers for m in worker.mismatches][:20],
+    }
+
+
+def relay_ids(url: str, timeout: float = 10.0) -> List[int]:
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname or "127.0.0.1", parts.port or 80, timeout=timeout)
+    conn.request("GET", "/relay/status")
+    body = json.loads(conn.getresponse().read())
+    conn.close()
+    return [relay["id"] for relay in body["relays"]]
+
+
+def print_report(report: Dict):
+    print(f"commands      {report['commands']} ({report['completed']} completed in {report['duration_s']} s)")
+    print(f"throughput    {report['throughput_rps']} req/s (target {report['target_rps']})")
+    print(f"statuses      {', '.join(f'{code}: {n}' for code, n in report['statuses'].items())}")
+    for name in ("latency_ms", "service_ms"):
+        p = report[name]
+        print(f"{name:<14}p50 {p['p50']}  p90 {p['p90']}  p99 {p['p99']}  max {p['max']}")
+    print(f"consistency   {report['consistency_errors']} errors")
+    for mismatch in report['mismatches']:
+        print(f"  relay {mismatch['relay']}: expected {mismatch['expected']}, "
+              f"reported {mismatch['reported']} ({mismatch['at']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay relay command traces against a running server")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--trace', help='JSON-lines trace to replay (default: synthetic)')
+    parser.add_argument('--rate', type=float, default=100, help='Synthetic commands per second')
+    parser.add_argument('--duration', type=float, default=10, help='Synthetic trace length in seconds')
+    parser.add_argument('--read-ratio', type=float, default=0.2, help='Share of synthetic status reads')
+    parser.add_argument('--relays', help='Comma-separated relay ids (default: from /relay/status)')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--record', help='Also write the trace that was sent to this file')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        ids = [int(r) for r in args.relays.split(',')] if args.relays else relay_ids(args.url)
+        trace = synthetic_trace(ids, args.rate, args.duration, args.read_ratio, args.seed)
+    if args.record:
+        save_trace(args.record, trace)
+    report = run(args.url, trace, args.clients)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report['consistency_errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,20 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from src.relay_controller import RelayController
 from src.config_manager import ConfigManager
+from src.event_stream import EventBroadcaster
+from src.idempotency import IdempotencyCache
 from src.logger import setup_logger
-import os
+from src.metrics import REGISTRY
+from src.rate_limiter import RateLimiter
+from src.relay_rules import RuleViolation
+from src.scheduler import RelayScheduler
+from datetime import datetime
+import itertools
+import json
+import math
+import threading
+import time
+import zlib
 
 app = Flask(__name__)
 
@@ -10,14 +22,165 @@ app = Flask(__name__)
 relay_controller = None
 config = None
 logger = None
+events = None
+scheduler = None
+# The scheduler init_api started itself because none was passed in; shutdown_api stops it
+_own_scheduler = None
+idempotency = None
+long_polls = None
+sse_slots = None
+boot_tag = None
+limits = {}
+trusted_clients = frozenset()
+write_slots = None
+_version_cache = None
+_request_ids = itertools.count(1)
+
+# Upper bound for /relay/status?wait=...&timeout=
+LONG_POLL_MAX_SECONDS = 60
+
+HTTP_REQUESTS = REGISTRY.counter("relay_http_requests_total", "HTTP requests by route, method and status.",
+                                 ["route", "method", "status"])
+HTTP_LATENCY = REGISTRY.histogram("relay_http_request_duration_seconds", "HTTP request latency by route.",
+                                  ["route"])
+HTTP_RATE_LIMITED = REGISTRY.counter("relay_http_rate_limited_total", "Requests refused by admission control.",
+                                     ["budget"])
+
+# Monitoring endpoints and the all-off safety command are never rate limited
+UNLIMITED_ENDPOINTS = frozenset({'system_health', 'metrics', 'relay_all_off'})
+READ_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+@app.before_request
+def _start_timer():
+    g.start_time = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-Id', '')[:64] or f"{boot_tag}-{next(_request_ids)}"
+
+@app.before_request
+def _admit():
+    """Token-bucket admission per client, route class and relay; writes also need a free write slot."""
+    if request.endpoint in UNLIMITED_ENDPOINTS:
+        return None
+    write = request.method not in READ_METHODS
+    route_class = 'write' if write else 'read'
+    checks = [(route_class, (route_class,))]
+    if request.remote_addr not in trusted_clients:
+        checks.insert(0, ('client', (request.remote_addr,)))
+    if write and limits.get('relay') is not None:
+        checks.append(('relay', _switched_relays()))
+    for budget, keys in checks:
+        limiter = limits.get(budget)
+        if limiter is not None and keys:
+            wait = limiter.acquire_all(keys)
+            if wait:
+                return _rate_limited(budget, wait)
+    if write and write_slots is not None:
+        if not write_slots.acquire(blocking=False):
+            return _rate_limited('write_concurrency', 1)
+        g.write_slot = True
+    return None
+
+def _switched_relays():
+    """Relay ids a write request would actually switch, for the per-relay budget.
+
+    Relays already in the requested state cost nothing; empty if the request can't be read.
+    """
+    view_args = request.view_args or {}
+    endpoint = request.endpoint
+    try:
+        if endpoint in ('relay_on', 'relay_off'):
+            wanted = {view_args['relay_id']: endpoint == 'relay_on'}
+        elif 'relay_id' in view_args:
+            # A pulse switches and reverts whatever the current state
+            return (view_args['relay_id'],)
+        elif endpoint == 'relay_all_on':
+            wanted = dict.fromkeys(relay_controller.bank.ids, True)
+        elif endpoint == 'relay_batch':
+            wanted = _parse_batch(request.get_json(silent=True))
+        elif endpoint == 'relay_set_mask':
+            body = request.get_json(silent=True)
+            mask = relay_controller.bank.parse_mask(body['mask'])
+            wanted = dict.fromkeys(relay_controller.bank.to_states(0, mask), _parse_state("mask", body['state']))
+        elif endpoint in ('group_on', 'group_off'):
+            mask = relay_controller.rules.group(view_args['name'])
+            wanted = dict.fromkeys(relay_controller.bank.to_states(0, mask), endpoint == 'group_on')
+        else:
+            return ()
+    except (KeyError, TypeError, ValueError):
+        # The route itself answers malformed requests
+        return ()
+    status = relay_controller.status
+    return tuple(rid for rid, state in wanted.items() if status.get(rid) != state)
+
+@app.teardown_request
+def _release_write_slot(exc):
+    if g.pop('write_slot', False):
+        write_slots.release()
+
+@app.before_request
+def _replay_idempotent():
+    """Answer a retried POST (same Idempotency-Key, or X-Client-Id + X-Client-Seq) from the cache."""
+    if request.method != 'POST' or idempotency is None:
+        return None
+    key = request.headers.get('Idempotency-Key')
+    if not key and request.headers.get('X-Client-Seq'):
+        key = f"{request.headers.get('X-Client-Id', request.remote_addr)}:{request.headers['X-Client-Seq']}"
+    if not key:
+        return None
+    fingerprint = f"POST {request.path} {zlib.crc32(request.get_data()):08x}"
+    try:
+        stored = idempotency.begin(key, fingerprint)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 422
+    except TimeoutError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    if stored is None:
+        g.idempotency_key = key
+        return None
+    body, status, mimetype = stored
+    response = app.response_class(body, status=status, mimetype=mimetype)
+    response.headers['Idempotent-Replay'] = 'true'
+    return response
+
+@app.after_request
+def _store_idempotent(response):
+    key = g.pop('idempotency_key', None)
+    if key is not None:
+        if response.status_code >= 500:
+            # Let the client's retry run the command again
+            idempotency.discard(key)
+        else:
+            idempotency.finish(key, (response.get_data(), response.status_code, response.mimetype))
+    return response
+
+@app.teardown_request
+def _release_idempotent(exc):
+    key = g.pop('idempotency_key', None)
+    if key is not None:
+        idempotency.discard(key)
+
+@app.after_request
+def _record_request(response):
+    start = g.get('start_time')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        elapsed = time.perf_counter() - start
+        HTTP_LATENCY.labels(route).observe(elapsed)
+        HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        logger.debug("%s %s %s", request.method, request.path, response.status_code,
+                     extra={"event": "http_request", **_request_fields(), "status": response.status_code,
+                            "latency_ms": round(elapsed * 1000, 3)})
+        response.headers['X-Request-Id'] = g.request_id
+    return response
 
 @app.route('/relay/all/on', methods=['POST'])
 def relay_all_on():
     try:
         relay_controller.turn_all_on()
         return jsonify({"status": "success", "message": "All relays turned ON"})
+    except RuleViolation as e:
+        return _rule_violation(e)
     except Exception as e:
-        logger.error(str(e))
+        _log_error(e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/relay/all/off', methods=['POST'])
@@ -25,8 +188,10 @@ def relay_all_off():
     try:
         relay_controller.turn_all_off()
         return jsonify({"status": "success", "message": "All relays turned OFF"})
+    except RuleViolation as e:
+        return _rule_violation(e)
     except Exception as e:
-        logger.error(str(e))
+        _log_error(e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/relay/<int:relay_id>/on', methods=['POST'])
@@ -34,8 +199,10 @@ def relay_on(relay_id):
     try:
         relay_controller.turn_on(relay_id)
         return jsonify({"status": "success", "relay": relay_id, "state": "ON"})
+    except RuleViolation as e:
+        return _rule_violation(e)
     except Exception as e:
-        logger.error(str(e))
+        _log_error(e)
         return jsonify({"status": "error", "message": str(e)}), 400
 
 @app.route('/relay/<int:relay_id>/off', methods=['POST'])
@@ -43,44 +210,328 @@ def relay_off(relay_id):
     try:
         relay_controller.turn_off(relay_id)
         return jsonify({"status": "success", "relay": relay_id, "state": "OFF"})
+    except RuleViolation as e:
+        return _rule_violation(e)
+    except Exception as e:
+        _log_error(e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/relay/batch', methods=['POST'])
+def relay_batch():
+    try:
+        states = _parse_batch(request.get_json(silent=True))
+        results = relay_controller.apply(states)
+        return jsonify({"status": "success", "relays": results})
+    except RuleViolation as e:
+        return _rule_violation(e)
+    except Exception as e:
+        _log_error(e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/group/<name>/on', methods=['POST'])
+def group_on(name):
+    return _switch_group(name, True)
+
+@app.route('/group/<name>/off', methods=['POST'])
+def group_off(name):
+    return _switch_group(name, False)
+
+@app.route('/relay/mask', methods=['GET'])
+def relay_mask():
+    return jsonify({"mask": relay_controller.get_mask_hex()})
+
+@app.route('/relay/mask', methods=['POST'])
+def relay_set_mask():
+    try:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or 'mask' not in body or 'state' not in body:
+            raise ValueError("Body must be a JSON object with 'mask' and 'state'")
+        relay_controller.set_mask(body['mask'], _parse_state("mask", body['state']))
+        return jsonify({"status": "success", "mask": relay_controller.get_mask_hex()})
+    except RuleViolation as e:
+        return _rule_violation(e)
+    except Exception as e:
+        _log_error(e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/relay/<int:relay_id>/pulse', methods=['POST'])
+def relay_pulse(relay_id):
+    try:
+        body = request.get_json(silent=True) or {}
+        duration_ms = float(body.get('duration_ms', 0))
+        state = _parse_state(relay_id, body.get('state', "ON"))
+        job_id = scheduler.pulse(relay_id, duration_ms, state)
+        return jsonify({"status": "success", "relay": relay_id, "duration_ms": duration_ms, "job": job_id})
+    except RuleViolation as e:
+        return _rule_violation(e)
+    except Exception as e:
+        _log_error(e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/schedule', methods=['POST'])
+def schedule_create():
+    try:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or 'relay' not in body or 'action' not in body:
+            raise ValueError("Body must be a JSON object with 'relay' and 'action'")
+        relay_id = int(body['relay'])
+        if str(body['action']).lower() not in ("on", "off"):
+            raise ValueError(f"Invalid action: {body['action']}")
+        at = body.get('at')
+        if isinstance(at, str):
+            at = datetime.fromisoformat(at).timestamp()
+        job_id = scheduler.schedule(relay_id, str(body['action']).lower() == "on",
+                                    delay_ms=body.get('delay_ms'), at=at, cron=body.get('cron'))
+        return jsonify({"status": "success", "job": job_id}), 201
     except Exception as e:
-        logger.error(str(e))
+        _log_error(e)
         return jsonify({"status": "error", "message": str(e)}), 400
 
+@app.route('/schedule', methods=['GET'])
+def schedule_list():
+    return jsonify({"jobs": scheduler.list_jobs()})
+
+@app.route('/schedule/<int:job_id>', methods=['DELETE'])
+def schedule_cancel(job_id):
+    if not scheduler.cancel(job_id):
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+    return jsonify({"status": "success", "job": job_id})
+
 @app.route('/relay/status', methods=['GET'])
 def relay_status():
+    """Relay states with an ETag; `?wait=<etag>&timeout=<s>` blocks until they differ from that tag."""
     try:
-        status = relay_controller.get_status()
-        return jsonify({"relays": status})
+        version, body = relay_controller.get_versioned_status_json()
+        wait = request.args.get('wait')
+        if wait is not None and wait.strip('"') == _status_etag(version):
+            timeout = request.args.get('timeout', 30, type=float)
+            if not math.isfinite(timeout):
+                return jsonify({"status": "error", "message": "Invalid timeout"}), 400
+            timeout = min(max(timeout, 0), LONG_POLL_MAX_SECONDS)
+            if not long_polls.acquire(blocking=False):
+                response = jsonify({"status": "error", "message": "Too many long-poll requests"})
+                response.headers['Retry-After'] = '1'
+                return response, 503
+            try:
+                relay_controller.wait_for_change(version, timeout)
+            finally:
+                long_polls.release()
+            version, body = relay_controller.get_versioned_status_json()
+            if _status_etag(version) == wait.strip('"'):
+                return _not_modified(_status_etag(version))
+        return _conditional(body, _status_etag(version))
     except Exception as e:
-        logger.error(str(e))
+        _log_error(e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/relay/history', methods=['GET'])
+def relay_history():
+    try:
+        since = _parse_time(request.args.get('since'))
+        until = _parse_time(request.args.get('until'))
+        relay_id = request.args.get('id', type=int)
+        limit = min(request.args.get('limit', 1000, type=int), 10000)
+        order = request.args.get('order', 'desc')
+        records = relay_controller.history.query(since, until, relay_id, limit, order)
+        return jsonify({"events": records, "truncated": len(records) == limit})
+    except Exception as e:
+        _log_error(e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/relay/<int:relay_id>/stats', methods=['GET'])
+def relay_stats(relay_id):
+    try:
+        return jsonify(relay_controller.history.relay_stats(relay_id))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+
+@app.route('/relay/events', methods=['GET'])
+def relay_events():
+    # Each subscriber holds a worker for as long as it stays connected
+    if not sse_slots.acquire(blocking=False):
+        response = jsonify({"status": "error", "message": "Too many event stream subscribers"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return Response(_holding(events.stream(), sse_slots), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/system/version', methods=['GET'])
 def system_version():
+    global _version_cache
     try:
-        version = config.get('system', 'version')
-        build_date = None
-        version_file = os.path.join(os.path.dirname(__file__), '..', 'version.txt')
-        if os.path.exists(version_file):
-            with open(version_file) as f:
-                lines = f.readlines()
-                if len(lines) > 1:
-                    build_date = lines[1].strip().replace('Build date: ', '')
-        return jsonify({"version": version, "build_date": build_date or "unknown"})
+        snapshot = config.snapshot
+        cache = _version_cache
+        if cache is None or cache[0] is not snapshot:
+            # Serialized once per config snapshot
+            body = json.dumps({"version": snapshot.version, "build_date": snapshot.build_date}).encode()
+            cache = _version_cache = (snapshot, body, f"{zlib.crc32(body):08x}")
+        return _conditional(cache[1], cache[2])
     except Exception as e:
-        logger.error(str(e))
+        _log_error(e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/system/health', methods=['GET'])
 def system_health():
-    return jsonify({"status": "healthy"})
+    checks = relay_controller.health()
+    healthy = checks.pop("healthy")
+    body = json.dumps({"status": "healthy" if healthy else "unhealthy", "checks": checks}).encode()
+    if not healthy:
+        # Never answer 304 here: monitors key on the 503
+        return app.response_class(body, status=503, mimetype='application/json')
+    return _conditional(body, f"{zlib.crc32(body):08x}")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def _switch_group(name, state):
+    try:
+        mask = relay_controller.rules.group(name)
+    except KeyError:
+        return jsonify({"status": "error", "message": f"Unknown group: {name}"}), 404
+    try:
+        relay_controller.set_mask(mask, state)
+        relays = list(relay_controller.bank.to_states(0, mask))
+        return jsonify({"status": "success", "group": name, "state": "ON" if state else "OFF", "relays": relays})
+    except RuleViolation as e:
+        return _rule_violation(e)
+    except Exception as e:
+        _log_error(e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+def _holding(stream, slot):
+    """Yield from `stream` and release `slot` once it ends or the client goes away."""
+    try:
+        yield from stream
+    finally:
+        slot.release()
+
+def close_streams():
+    """End every event stream and long poll so their workers can finish; used at shutdown."""
+    if events is not None:
+        events.close()
+    if relay_controller is not None:
+        relay_controller.release_waiters()
+
+def shutdown_api():
+    """Stop the scheduler init_api created on its own; a scheduler passed in is the caller's to stop."""
+    global _own_scheduler
+    if _own_scheduler is not None:
+        _own_scheduler.stop()
+        _own_scheduler = None
+
+def _status_etag(version):
+    # The boot tag keeps tags from a previous run, which restarted at version 0, from matching
+    return f"{boot_tag}-{version}"
+
+def _not_modified(etag):
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+def _conditional(body, etag):
+    """`body` as JSON with a strong ETag, or 304 if the client's If-None-Match already has it."""
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+def _rate_limited(budget, wait):
+    HTTP_RATE_LIMITED.labels(budget).inc()
+    response = jsonify({"status": "error", "message": f"Rate limit exceeded ({budget})"})
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response, 429
+
+def _request_fields():
+    """Structured log fields identifying the current request."""
+    fields = {"route": request.url_rule.rule if request.url_rule is not None else request.path,
+              "method": request.method, "client": request.remote_addr, "request_id": g.get('request_id')}
+    relay_id = (request.view_args or {}).get('relay_id')
+    if relay_id is not None:
+        fields["relay"] = relay_id
+    return fields
+
+def _log_error(e):
+    logger.error("%s %s failed: %s", request.method, request.path, e,
+                 extra={"event": "http_error", **_request_fields()})
+
+def _rule_violation(e):
+    logger.warning("Command rejected by %s rule: %s", e.rule, e,
+                   extra={"event": "rule_violation", **_request_fields(), "rule": e.rule, "relay": e.relay_id})
+    return jsonify(e.to_dict()), 409
+
+def _parse_batch(body):
+    """Turn {"relays": {"1": "ON", "2": false, ...}} into {1: True, 2: False, ...}."""
+    if not isinstance(body, dict) or not isinstance(body.get('relays'), dict) or not body['relays']:
+        raise ValueError("Body must be a JSON object with a non-empty 'relays' mapping")
+    states = {}
+    for rid, state in body['relays'].items():
+        try:
+            rid = int(rid)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid relay ID: {rid}")
+        states[rid] = _parse_state(rid, state)
+    return states
+
+def _parse_time(value):
+    """Query time bound as epoch seconds or an ISO timestamp; None when absent."""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def _parse_state(rid, state):
+    """Accept "ON"/"OFF" (any case), booleans and 0/1."""
+    if isinstance(state, str):
+        if state.upper() not in ("ON", "OFF"):
+            raise ValueError(f"Invalid state for relay {rid}: {state}")
+        return state.upper() == "ON"
+    if not isinstance(state, (bool, int)):
+        raise ValueError(f"Invalid state for relay {rid}: {state}")
+    return bool(state)
 
 # Initialization function for main.py
 
-def init_api(relay_ctrl, cfg, log):
-    global relay_controller, config, logger
+class _NoSlots:
+    """A cap of zero: every acquire fails."""
+
+    def acquire(self, blocking=True):
+        return False
+
+def init_api(relay_ctrl, cfg, log, relay_scheduler=None):
+    global relay_controller, config, logger, events, scheduler, idempotency, long_polls, sse_slots, boot_tag
+    global limits, trusted_clients, write_slots, _own_scheduler
     relay_controller = relay_ctrl
     config = cfg
     logger = log
+    api_cfg = cfg.get('api') or {}
+    idempotency = IdempotencyCache(api_cfg.get('idempotency_cache', 1024), api_cfg.get('idempotency_ttl', 300))
+    # Long polls and event streams hold a worker each; leave at least one for normal requests
+    workers = api_cfg.get('workers', 8)
+    long_poll_max = api_cfg.get('long_poll_max', max(1, workers // 2))
+    sse_max = api_cfg.get('sse_max', min(max(1, workers // 4), max(0, workers - 1 - long_poll_max)))
+    long_polls = threading.BoundedSemaphore(long_poll_max) if long_poll_max else _NoSlots()
+    sse_slots = threading.BoundedSemaphore(sse_max) if sse_max else _NoSlots()
+    boot_tag = f"{time.time_ns():x}"
+    rate_cfg = api_cfg.get('rate_limits') or {}
+    limits = {}
+    for budget in ('client', 'read', 'write', 'relay'):
+        limiter = RateLimiter.from_config(rate_cfg.get(budget))
+        if limiter is not None:
+            limits[budget] = limiter
+    # Gateways and load generators reach a node from one address; keep them off the client budget
+    trusted_clients = frozenset(api_cfg.get('trusted_clients') or ())
+    # Writes may occupy all but `read_reserve` workers, so reads still get through under a write flood
+    read_reserve = api_cfg.get('read_reserve', 0)
+    write_slots = threading.BoundedSemaphore(max(1, api_cfg.get('workers', 8) - read_reserve)) if read_reserve else None
+    shutdown_api()
+    if relay_scheduler is None:
+        relay_scheduler = _own_scheduler = RelayScheduler(relay_ctrl, log)
+        relay_scheduler.start()
+    scheduler = relay_scheduler
+    events = EventBroadcaster(relay_ctrl.get_status_json)
+    relay_ctrl.add_listener(events.publish)
     return app
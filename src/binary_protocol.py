@@ -0,0 +1,169 @@
+"""Compact binary command protocol served next to the REST API.
+
+Every request and ack is one fixed 16-byte, big-endian frame:
+
+    request: magic "RL" | version u8 | action u8 | seq u32 | arg u64
+    ack:     magic "RL" | version u8 | status u8 | seq u32 | mask u64
+
+`arg` is a relay id for ON/OFF and a relay bitmask (RelayBank order) for MASK_ON/MASK_OFF;
+the ack echoes `seq` and carries the relay mask after the command. Over TCP, frames may
+be pipelined and acks come back in order; over UDP each datagram is one frame. Masks are
+u64, so the protocol refuses to serve a bank of more than MAX_RELAYS relays.
+"""
+import socket
+import socketserver
+import struct
+import threading
+from typing import Optional
+
+from src.relay_rules import RuleViolation
+
+MAGIC = b"RL"
+VERSION = 1
+FRAME = struct.Struct("!2sBBIQ")
+FRAME_SIZE = FRAME.size
+MAX_RELAYS = 64
+
+ON, OFF, MASK_ON, MASK_OFF, ALL_ON, ALL_OFF, STATUS = range(1, 8)
+OK, BAD_FRAME, BAD_ACTION, INVALID, ERROR, REJECTED = range(6)
+
+
+def encode_command(action: int, seq: int, arg: int = 0) -> bytes:
+    return FRAME.pack(MAGIC, VERSION, action, seq, arg)
+
+
+def decode_ack(frame: bytes):
+    """Return (status, seq, mask) from an ack frame."""
+    magic, version, status, seq, mask = FRAME.unpack(frame)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a relay protocol ack")
+    return status, seq, mask
+
+
+class CommandDispatcher:
+    """Decodes request frames and runs them against a RelayController."""
+
+    def __init__(self, relay_controller, logger):
+        if len(relay_controller.bank) > MAX_RELAYS:
+            raise ValueError(f"Binary protocol masks hold {MAX_RELAYS} relays; "
+                             f"this bank has {len(relay_controller.bank)}")
+        self.relay_controller = relay_controller
+        self.logger = logger
+        ctrl = relay_controller
+        self._actions = {
+            ON: lambda rid: ctrl.turn_on(rid, "binary"),
+            OFF: lambda rid: ctrl.turn_off(rid, "binary"),
+            MASK_ON: lambda mask: ctrl.set_mask(mask, True, "binary"),
+            MASK_OFF: lambda mask: ctrl.set_mask(mask, False, "binary"),
+            ALL_ON: lambda _: ctrl.turn_all_on("binary"),
+            ALL_OFF: lambda _: ctrl.turn_all_off("binary"),
+            STATUS: lambda _: None,
+        }
+
+    def handle(self, frame: bytes) -> bytes:
+        """Run one request frame and return its ack; never raises."""
+        magic, version, action, seq, arg = FRAME.unpack(frame)
+        if magic != MAGIC or version != VERSION:
+            status = BAD_FRAME
+        else:
+            command = self._actions.get(action)
+            if command is None:
+                status = BAD_ACTION
+            else:
+                try:
+                    command(arg)
+                    status = OK
+                except RuleViolation:
+                    status = REJECTED
+                except ValueError:
+                    status = INVALID
+                except Exception as e:
+                    self.logger.error("Binary command %s failed: %s", action, e)
+                    status = ERROR
+        return FRAME.pack(MAGIC, VERSION, status, seq, self.relay_controller.mask)
+
+
+class _TCPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        handle = self.server.dispatcher.handle
+        pending = b""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return
+            pending += data
+            usable = len(pending) - len(pending) % FRAME_SIZE
+            if not usable:
+                continue
+            acks = []
+            for i in range(0, usable, FRAME_SIZE):
+                ack = handle(pending[i:i + FRAME_SIZE])
+                acks.append(ack)
+                if ack[3] == BAD_FRAME:
+                    # Framing is lost; make the client reconnect
+                    sock.sendall(b"".join(acks))
+                    return
+            pending = pending[usable:]
+            sock.sendall(b"".join(acks))
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        if len(data) != FRAME_SIZE:
+            ack = FRAME.pack(MAGIC, VERSION, BAD_FRAME, 0, 0)
+        else:
+            ack = self.server.dispatcher.handle(data)
+        sock.sendto(ack, self.client_address)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class BinaryProtocolServer:
+    """TCP and/or UDP listeners for the binary protocol; a port of None disables that listener.
+
+    Commands go through the same RelayController as the REST API, so both see one state.
+    """
+
+    def __init__(self, relay_controller, logger, host: str = "0.0.0.0", tcp_port: Optional[int] = None,
+                 udp_port: Optional[int] = None):
+        self.logger = logger
+        self.dispatcher = CommandDispatcher(relay_controller, logger)
+        self._servers = []
+        if tcp_port is not None:
+            self._servers.append(_TCPServer((host, tcp_port), _TCPHandler))
+        if udp_port is not None:
+            self._servers.append(socketserver.UDPServer((host, udp_port), _UDPHandler))
+        for server in self._servers:
+            server.dispatcher = self.dispatcher
+        self._threads = []
+
+    @property
+    def tcp_address(self):
+        return next((s.server_address for s in self._servers if isinstance(s, _TCPServer)), None)
+
+    @property
+    def udp_address(self):
+        return next((s.server_address for s in self._servers if not isinstance(s, _TCPServer)), None)
+
+    def start(self):
+        for server in self._servers:
+            kind = "TCP" if isinstance(server, _TCPServer) else "UDP"
+            thread = threading.Thread(target=server.serve_forever, name=f"Binary{kind}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            self.logger.info("Binary protocol listening on %s %s:%s", kind, *server.server_address[:2])
+
+    def stop(self):
+        for server in self._servers:
+            if self._threads:
+                server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
@@ -0,0 +1,75 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+
+class CommandExecutor:
+    """Runs submitted callables one at a time, in submission order, on a dedicated thread.
+
+    Everything that touches the hardware goes through here, so writes from concurrent
+    API workers can never interleave. After `shutdown`, `submit` raises RuntimeError.
+    """
+
+    def __init__(self, name: str = "RelayCommands"):
+        self._queue = queue.SimpleQueue()
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def on_executor_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn: Callable, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("Command executor is shut down")
+            self._queue.put((future, fn, args))
+        return future
+
+    def call(self, fn: Callable, *args):
+        """Run `fn(*args)` on the executor thread and return its result (or raise its error)."""
+        if self.on_executor_thread:
+            return fn(*args)
+        return self.submit(fn, *args).result()
+
+    def shutdown(self):
+        """Finish the commands already queued, then stop the thread."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._fail_pending()
+                return
+            future, fn, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _fail_pending(self):
+        # submit() refuses work once the stop marker is queued; never leave a caller waiting regardless
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[0].set_running_or_notify_cancel():
+                item[0].set_exception(RuntimeError("Command executor is shut down"))
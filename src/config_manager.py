@@ -1,20 +1,124 @@
-import yaml
+import logging
+import marshal
 import os
-from typing import Any, Dict
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+VERSION_FILE = os.path.join(os.path.dirname(__file__), '..', 'version.txt')
+# Bump when the cache layout changes so stale caches are ignored
+CACHE_FORMAT = 1
+
+
+def _freeze(value):
+    """Read-only copy of parsed YAML: dicts become mapping proxies, lists become tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+@dataclass(frozen=True)
+class RelaySettings:
+    pins: Mapping[int, int]
+    reconcile_interval: float = 0
+    restore_policy: str = "restore"
+    defaults: Optional[Mapping[int, bool]] = None
+    coalesce_ms: float = 0
+
+
+@dataclass(frozen=True)
+class LoggingSettings:
+    level: str = "INFO"
+    file: Optional[str] = None
+    console: bool = True
+    async_mode: bool = False
+    queue_size: int = 10000
+    max_bytes: int = 0
+    backup_count: int = 5
+    rotate_when: Optional[str] = None
+    format: str = "text"
+    sample: Optional[Mapping[str, float]] = None
+    dedup_window: float = 0
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """One validated, immutable view of the config file; replaced as a whole on reload."""
+    sections: Mapping[str, Any]
+    relays: Optional[RelaySettings]
+    logging: Optional[LoggingSettings]
+    version: Optional[str]
+    build_date: str
+    mtime: float
+
 
 class ConfigManager:
-    def __init__(self, config_path: str):
+    """Loads settings.yaml into a ConfigSnapshot and optionally reloads it when the file changes.
+
+    `snapshot` is swapped with a single assignment, so a reader that grabbed it keeps a
+    consistent view for the rest of its request. A file that fails to parse or validate is
+    logged and ignored; the previous snapshot stays active.
+
+    With `cache_path`, the parsed file is also stored there with marshal, keyed on the
+    YAML file's path, mtime and size, so later starts skip importing and running PyYAML.
+    """
+
+    def __init__(self, config_path: str, version_file: str = VERSION_FILE, cache_path: Optional[str] = None):
         self.config_path = config_path
-        self.config = self._load_config()
+        self.version_file = version_file
+        self.cache_path = cache_path
+        self.snapshot = self._load_snapshot()
+        self._listeners: List[Callable[[ConfigSnapshot, ConfigSnapshot], None]] = []
+        self._watcher = None
+        self._watch_stop = threading.Event()
+
+    @property
+    def config(self) -> Mapping[str, Any]:
+        return self.snapshot.sections
 
     def _load_config(self) -> Dict[str, Any]:
         if not os.path.exists(self.config_path):
             raise FileNotFoundError(f"Config file not found: {self.config_path}")
-        with open(self.config_path, 'r') as f:
-            config = yaml.safe_load(f)
+        stat = os.stat(self.config_path)
+        key = (CACHE_FORMAT, os.path.abspath(self.config_path), stat.st_mtime_ns, stat.st_size)
+        config = self._read_cache(key)
+        if config is None:
+            import yaml
+            with open(self.config_path, 'r') as f:
+                config = yaml.safe_load(f)
+            self._write_cache(key, config)
         self._validate_config(config)
         return config
 
+    def _read_cache(self, key):
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached_key, config = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return config if cached_key == key else None
+
+    def _write_cache(self, key, config):
+        if not self.cache_path:
+            return
+        try:
+            data = marshal.dumps((key, config))
+        except ValueError:
+            # YAML produced a type marshal cannot store (e.g. a date); parse every time
+            return
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
     def _validate_config(self, config: Dict[str, Any]):
         # Basic validation for required keys
         required = ['api', 'relays', 'logging', 'system']
@@ -24,9 +128,112 @@ class ConfigManager:
         if 'pins' not in config['relays']:
             raise ValueError("Missing relay pin mappings in config")
 
+    def _load_snapshot(self) -> ConfigSnapshot:
+        mtime = os.stat(self.config_path).st_mtime if os.path.exists(self.config_path) else 0
+        config = self._load_config()
+        relays = _relay_settings(config['relays']) if 'relays' in config else None
+        log_cfg = config.get('logging')
+        return ConfigSnapshot(sections=_freeze(config), relays=relays,
+                              logging=_logging_settings(log_cfg) if log_cfg is not None else None,
+                              version=(config.get('system') or {}).get('version'),
+                              build_date=self._read_build_date(), mtime=mtime)
+
+    def _read_build_date(self) -> str:
+        try:
+            with open(self.version_file) as f:
+                lines = f.readlines()
+        except OSError:
+            return "unknown"
+        if len(lines) > 1:
+            return lines[1].strip().replace('Build date: ', '') or "unknown"
+        return "unknown"
+
     def get(self, section: str, key: str = None):
-        if section not in self.config:
+        sections = self.snapshot.sections
+        if section not in sections:
             raise KeyError(f"Config section not found: {section}")
         if key:
-            return self.config[section].get(key)
-        return self.config[section]
+            return sections[section].get(key)
+        return sections[section]
+
+    def add_listener(self, callback: Callable[[ConfigSnapshot, ConfigSnapshot], None]):
+        """Register `callback(old, new)`, called after a reload swapped in a new snapshot."""
+        self._listeners.append(callback)
+
+    def reload(self, logger=None) -> bool:
+        """Re-read the file; returns True if a new snapshot was swapped in."""
+        old = self.snapshot
+        try:
+            new = self._load_snapshot()
+        except Exception as e:
+            (logger or logging.getLogger(__name__)).error("Config reload failed, keeping previous config: %s", e)
+            return False
+        self.snapshot = new
+        for callback in self._listeners:
+            try:
+                callback(old, new)
+            except Exception as e:
+                (logger or logging.getLogger(__name__)).error("Config listener failed: %s", e)
+        return True
+
+    def watch(self, interval: float, logger=None):
+        """Poll the file's mtime every `interval` seconds and reload when it changes."""
+        if interval <= 0 or self._watcher is not None:
+            return
+        def run():
+            seen = self.snapshot.mtime
+            while not self._watch_stop.wait(interval):
+                try:
+                    mtime = os.stat(self.config_path).st_mtime
+                except OSError:
+                    continue
+                if mtime == seen:
+                    continue
+                # A broken file is reported once, not on every poll
+                seen = mtime
+                if self.reload(logger) and logger:
+                    logger.info("Reloaded config from %s", self.config_path)
+        self._watch_stop.clear()
+        self._watcher = threading.Thread(target=run, name="ConfigWatcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watch_stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+def _relay_settings(relays: Dict[str, Any]) -> RelaySettings:
+    pins = relays.get('pins') or {}
+    if not isinstance(pins, dict):
+        raise ValueError("relays.pins must map relay IDs to pin numbers")
+    for rid, pin in pins.items():
+        if not isinstance(rid, int) or not isinstance(pin, int):
+            raise ValueError(f"Invalid relay pin mapping: {rid}: {pin}")
+    if len(set(pins.values())) != len(pins):
+        raise ValueError("relays.pins maps several relays to the same pin")
+    defaults = relays.get('defaults')
+    return RelaySettings(pins=MappingProxyType(dict(pins)),
+                         reconcile_interval=relays.get('reconcile_interval') or 0,
+                         restore_policy=relays.get('restore_policy', 'restore'),
+                         defaults=MappingProxyType(dict(defaults)) if defaults else None,
+                         coalesce_ms=relays.get('coalesce_ms', 0))
+
+
+def _logging_settings(log_cfg: Dict[str, Any]) -> LoggingSettings:
+    level = str(log_cfg.get('level', 'INFO')).upper()
+    if not isinstance(logging.getLevelName(level), int):
+        raise ValueError(f"Invalid logging level: {level}")
+    log_format = log_cfg.get('format', 'text')
+    if log_format not in ('text', 'json'):
+        raise ValueError(f"Invalid logging format: {log_format}")
+    sample = log_cfg.get('sample')
+    return LoggingSettings(level=level, file=log_cfg.get('file'), console=log_cfg.get('console', True),
+                           async_mode=log_cfg.get('async', False),
+                           queue_size=log_cfg.get('queue_size', 10000),
+                           max_bytes=log_cfg.get('max_bytes', 0),
+                           backup_count=log_cfg.get('backup_count', 5),
+                           rotate_when=log_cfg.get('rotate_when'), format=log_format,
+                           sample=MappingProxyType(dict(sample)) if sample else None,
+                           dedup_window=log_cfg.get('dedup_window', 0))
@@ -0,0 +1,61 @@
+import json
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterator
+
+
+class EventBroadcaster:
+    """Fan-out of relay state deltas to any number of Server-Sent Events subscribers.
+
+    Every event is serialized once into a shared bounded buffer; each subscriber only
+    keeps a cursor into it. A subscriber that falls further behind than the buffer
+    holds receives a `resync` event and should re-fetch the full status.
+    """
+
+    def __init__(self, snapshot: Callable[[], bytes], buffer_size: int = 256, heartbeat: float = 15.0):
+        self._snapshot = snapshot
+        self._events = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.heartbeat = heartbeat
+
+    def publish(self, changes: Dict[int, bool], version: int):
+        """Controller listener: queue one compact delta, e.g. {"v":7,"r":{"1":1,"3":0}}."""
+        delta = json.dumps({"v": version, "r": {str(rid): int(state) for rid, state in changes.items()}},
+                           separators=(",", ":"))
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, f"id: {self._seq}\nevent: delta\ndata: {delta}\n\n".encode()))
+            self._cond.notify_all()
+
+    def close(self):
+        """Wake every subscriber and end their streams."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stream(self) -> Iterator[bytes]:
+        """SSE byte stream for one subscriber: a snapshot, then deltas and heartbeats."""
+        with self._cond:
+            cursor = self._seq
+        yield b"event: snapshot\ndata: " + self._snapshot() + b"\n\n"
+        while True:
+            with self._cond:
+                if cursor == self._seq and not self._closed:
+                    self._cond.wait(self.heartbeat)
+                if self._closed:
+                    return
+                oldest = self._events[0][0] if self._events else self._seq + 1
+                if cursor + 1 < oldest:
+                    pending = None
+                    cursor = self._seq
+                else:
+                    pending = [frame for seq, frame in self._events if seq > cursor]
+                    cursor = self._seq
+            if pending is None:
+                yield b"event: resync\ndata: {}\n\n"
+            elif pending:
+                yield b"".join(pending)
+            else:
+                yield b": keep-alive\n\n"
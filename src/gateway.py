@@ -0,0 +1,205 @@
+"""Fleet gateway: one API in front of many relay controller nodes.
+
+    python -m src.gateway --config config/gateway.yaml
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+import requests
+from flask import Flask, jsonify, request
+from requests.adapters import HTTPAdapter
+
+from src.config_manager import ConfigManager
+from src.logger import setup_logger
+from src.server import serve
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'gateway.yaml')
+
+app = Flask(__name__)
+
+# Request headers passed on to a node, and node response headers passed back to the client
+FORWARDED_HEADERS = ('Idempotency-Key', 'X-Client-Id', 'X-Client-Seq', 'If-None-Match')
+RETURNED_HEADERS = ('ETag', 'Retry-After')
+
+# Global objects (to be initialized in main)
+fleet = None
+logger = None
+
+
+class NodeClient:
+    """Pooled keep-alive HTTP client for one controller node, with its last known status."""
+
+    def __init__(self, name: str, base_url: str, connect_timeout: float, read_timeout: float,
+                 pool_size: int = 4, session=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.last_status = None
+        self.last_status_at = None
+
+    def request(self, method: str, path: str, body: Any = None,
+                headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        response = self.session.request(method, self.base_url + path, json=body, headers=headers,
+                                        timeout=self.timeout)
+        try:
+            data = response.json() if response.status_code != 304 else None
+        except ValueError:
+            data = {"message": response.text}
+        return {"ok": response.status_code < 400, "code": response.status_code, "data": data,
+                "headers": {name: response.headers[name] for name in RETURNED_HEADERS if name in response.headers}}
+
+    def status(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        result = self.request('GET', '/relay/status', headers=headers)
+        if result["code"] == 200:
+            self.last_status = result["data"]
+            self.last_status_at = time.time()
+        return result
+
+
+class Fleet:
+    """Registered nodes plus a shared worker pool for parallel fan-out.
+
+    A fan-out waits at most `fanout_timeout` seconds overall, so fleet-wide calls take
+    about as long as the slowest responding node rather than the sum of all nodes. The pool
+    has at least one thread per node, so a fan-out never queues nodes behind each other.
+    """
+
+    def __init__(self, nodes: Dict[str, NodeClient], fanout_timeout: float, workers: int = 32):
+        self.nodes = nodes
+        self.fanout_timeout = fanout_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max(workers, len(nodes)), thread_name_prefix="fleet")
+
+    @classmethod
+    def from_config(cls, nodes_cfg: Dict[str, str], timeouts: Dict[str, float], workers: int = 32,
+                    pool_size: int = 4):
+        connect = timeouts.get('connect', 1.0)
+        read = timeouts.get('read', 2.0)
+        nodes = {name: NodeClient(name, url, connect, read, pool_size) for name, url in nodes_cfg.items()}
+        return cls(nodes, connect + read, workers)
+
+    def fan_out(self, method: str, path: str, body: Any = None) -> Dict[str, Dict[str, Any]]:
+        def call(node):
+            if method == 'GET' and path == '/relay/status':
+                return node.status()
+            return node.request(method, path, body)
+
+        futures = {name: self._pool.submit(call, node) for name, node in self.nodes.items()}
+        wait(futures.values(), timeout=self.fanout_timeout)
+        results = {}
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                results[name] = {"ok": False, "error": "timeout"}
+            elif future.exception() is not None:
+                results[name] = {"ok": False, "error": str(future.exception())}
+            else:
+                results[name] = future.result()
+        return results
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for node in self.nodes.values():
+            node.session.close()
+
+
+class GatewayConfigManager(ConfigManager):
+    def _validate_config(self, config: Dict[str, Any]):
+        for key in ('api', 'nodes', 'logging'):
+            if key not in config:
+                raise ValueError(f"Missing required config section: {key}")
+        if not config['nodes']:
+            raise ValueError("No nodes configured")
+
+
+@app.route('/fleet/nodes', methods=['GET'])
+def fleet_nodes():
+    return jsonify({"nodes": {name: node.base_url for name, node in fleet.nodes.items()}})
+
+@app.route('/fleet/status', methods=['GET'])
+def fleet_status():
+    results = fleet.fan_out('GET', '/relay/status')
+    nodes = {}
+    for name, result in results.items():
+        node = fleet.nodes[name]
+        if result.get("ok"):
+            nodes[name] = {"online": True, "relays": result["data"].get("relays")}
+        else:
+            nodes[name] = {"online": False, "error": result.get("error") or result.get("data"),
+                           "relays": (node.last_status or {}).get("relays"),
+                           "cached_at": node.last_status_at}
+    return jsonify({"nodes": nodes})
+
+@app.route('/fleet/relay/<path:subpath>', methods=['POST'])
+def fleet_relay(subpath):
+    results = fleet.fan_out('POST', f'/relay/{subpath}', request.get_json(silent=True))
+    failed = [name for name, result in results.items() if not result.get("ok")]
+    if failed:
+        logger.error("Fleet command /relay/%s failed on: %s", subpath, ", ".join(failed))
+    body = {"status": "error" if failed else "success", "nodes": results}
+    return jsonify(body), 207 if failed else 200
+
+@app.route('/node/<name>/relay/<path:subpath>', methods=['GET', 'POST'])
+def node_relay(name, subpath):
+    node = fleet.nodes.get(name)
+    if node is None:
+        return jsonify({"status": "error", "message": f"Unknown node: {name}"}), 404
+    headers = {key: request.headers[key] for key in FORWARDED_HEADERS if key in request.headers}
+    try:
+        if request.method == 'GET' and subpath == 'status' and not request.query_string:
+            result = node.status(headers)
+        else:
+            path = f'/relay/{subpath}'
+            if request.query_string:
+                path += '?' + request.query_string.decode('latin-1')
+            result = node.request(request.method, path, request.get_json(silent=True), headers)
+        if result["code"] == 304:
+            return app.response_class(status=304, headers=result["headers"])
+        return jsonify(result["data"]), result["code"], result["headers"]
+    except requests.RequestException as e:
+        logger.error("Node %s unreachable: %s", name, e)
+        return jsonify({"status": "error", "message": f"Node {name} unreachable: {e}"}), 502
+
+
+def init_gateway(node_fleet: Fleet, log):
+    global fleet, logger
+    fleet = node_fleet
+    logger = log
+    return app
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='Networked Relay Controller fleet gateway')
+    parser.add_argument('-c', '--config', default=CONFIG_PATH, help='Path to gateway.yaml')
+    args = parser.parse_args(argv)
+
+    config = GatewayConfigManager(args.config)
+    log_cfg = config.get('logging')
+    log = setup_logger('RelayGateway', log_cfg['level'], log_cfg.get('file'), log_cfg.get('console', True))
+
+    node_fleet = Fleet.from_config(config.get('nodes'), config.config.get('timeouts') or {},
+                                   config.config.get('fanout_workers', 32),
+                                   config.config.get('pool_size', 4))
+    gateway = init_gateway(node_fleet, log)
+
+    def shutdown(signum, frame):
+        log.info("Shutting down gateway...")
+        node_fleet.shutdown()
+        sys.exit(0)
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    serve(gateway, config.get('api'), log)
+
+if __name__ == "__main__":
+    main()
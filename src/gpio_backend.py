@@ -0,0 +1,311 @@
+import time
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    # Mock GPIO for non-RPi environments, backed by the SimulatedBackend board below
+    class GPIO:
+        BCM = BOARD = OUT = None
+        @staticmethod
+        def setmode(mode): pass
+        @staticmethod
+        def setup(pin, mode): pass
+        @staticmethod
+        def output(pin, state): _MOCK_BOARD.write(pin, state)
+        @staticmethod
+        def input(pin): return _MOCK_BOARD.read(pin)
+        @staticmethod
+        def cleanup(): pass
+
+BACKENDS = ("rpi", "lgpio", "mcp23017", "pcf8574", "simulator", "virtual")
+
+
+class GPIOBackend:
+    """Output driver used by RelayController.
+
+    `write_many` and `read_many` cover a whole bank; drivers that can address a full
+    port in one bus transaction override them, the defaults fall back to per-pin calls.
+    All calls come from the controller's command thread. `settle_time` is how long after a
+    write read-back may still show the old state; the reconciler leaves such relays alone.
+    """
+
+    name = "base"
+    settle_time = 0.0
+
+    def setup(self, pins: Sequence[int], states: Sequence[bool]):
+        raise NotImplementedError
+
+    def write(self, pin: int, state: bool):
+        raise NotImplementedError
+
+    def read(self, pin: int) -> bool:
+        raise NotImplementedError
+
+    def write_many(self, writes: Iterable[Tuple[int, bool]]):
+        for pin, state in writes:
+            self.write(pin, state)
+
+    def read_many(self, pins: Sequence[int]) -> List[bool]:
+        return [self.read(pin) for pin in pins]
+
+    def cleanup(self):
+        pass
+
+
+class RPiGPIOBackend(GPIOBackend):
+    """RPi.GPIO (or the in-process mock when RPi.GPIO is not installed)."""
+
+    name = "rpi"
+
+    def __init__(self, gpio=None, mode: str = "BOARD"):
+        self.gpio = gpio or GPIO
+        self.mode = mode
+
+    def setup(self, pins, states):
+        self.gpio.setmode(getattr(self.gpio, self.mode))
+        for pin, state in zip(pins, states):
+            self.gpio.setup(pin, self.gpio.OUT)
+            self.gpio.output(pin, state)
+
+    def write(self, pin, state):
+        self.gpio.output(pin, state)
+
+    def write_many(self, writes):
+        output = self.gpio.output
+        for pin, state in writes:
+            output(pin, state)
+
+    def read(self, pin):
+        return bool(self.gpio.input(pin))
+
+    def cleanup(self):
+        self.gpio.cleanup()
+
+
+class LgpioBackend(GPIOBackend):
+    """GPIO character device through lgpio; pins are line offsets (BCM numbers) on `chip`.
+
+    A bank write is a single group write ioctl.
+    """
+
+    name = "lgpio"
+
+    def __init__(self, chip: int = 0):
+        import lgpio
+        self.lgpio = lgpio
+        self.handle = lgpio.gpiochip_open(chip)
+        self.pins: List[int] = []
+
+    def setup(self, pins, states):
+        if self.pins:
+            # Re-setup after a pin remap
+            self.lgpio.group_free(self.handle, self.pins[0])
+        self.pins = list(pins)
+        if self.pins:
+            self.lgpio.group_claim_output(self.handle, self.pins, [int(s) for s in states])
+
+    def write(self, pin, state):
+        self.lgpio.gpio_write(self.handle, pin, int(state))
+
+    def write_many(self, writes):
+        bits = mask = 0
+        index = {pin: i for i, pin in enumerate(self.pins)}
+        for pin, state in writes:
+            bit = 1 << index[pin]
+            mask |= bit
+            if state:
+                bits |= bit
+        if mask:
+            self.lgpio.group_write(self.handle, self.pins[0], bits, mask)
+
+    def read(self, pin):
+        return bool(self.lgpio.gpio_read(self.handle, pin))
+
+    def read_many(self, pins):
+        result = self.lgpio.group_read(self.handle, self.pins[0])
+        # lgpio returns (group size, bits)
+        bits = result[1] if isinstance(result, tuple) else result
+        index = {pin: i for i, pin in enumerate(self.pins)}
+        return [bool(bits >> index[pin] & 1) for pin in pins]
+
+    def cleanup(self):
+        if self.pins:
+            self.lgpio.group_free(self.handle, self.pins[0])
+        self.lgpio.gpiochip_close(self.handle)
+
+
+class _PortExpanderBackend(GPIOBackend):
+    """Shared latch handling for I2C port expanders: pins are expander bit numbers."""
+
+    width = 8
+    # Latch value of pins that are not relays
+    idle_latch = 0
+
+    def __init__(self, bus: int = 1, address: int = 0x20, smbus=None):
+        if smbus is None:
+            from smbus2 import SMBus
+            smbus = SMBus(bus)
+        self.bus = smbus
+        self.address = address
+        self.latch = self.idle_latch
+
+    def _check(self, pin):
+        if not 0 <= pin < self.width:
+            raise ValueError(f"{self.name} pin out of range: {pin}")
+
+    def setup(self, pins, states):
+        for pin, state in zip(pins, states):
+            self._check(pin)
+            self.latch = self.latch | (1 << pin) if state else self.latch & ~(1 << pin)
+        self._configure(list(pins))
+        self._flush()
+
+    def write(self, pin, state):
+        self.write_many(((pin, state),))
+
+    def write_many(self, writes):
+        latch = self.latch
+        for pin, state in writes:
+            latch = latch | (1 << pin) if state else latch & ~(1 << pin)
+        if latch != self.latch:
+            self.latch = latch
+            self._flush()
+
+    def read(self, pin):
+        return self.read_many((pin,))[0]
+
+    def read_many(self, pins):
+        port = self._read_port()
+        return [bool(port >> pin & 1) for pin in pins]
+
+    def cleanup(self):
+        self.bus.close()
+
+    def _configure(self, pins):
+        pass
+
+    def _flush(self):
+        raise NotImplementedError
+
+    def _read_port(self) -> int:
+        raise NotImplementedError
+
+
+class MCP23017Backend(_PortExpanderBackend):
+    """MCP23017 16-bit expander; pins 0-7 are GPA0-7, 8-15 are GPB0-7.
+
+    Both output latches are written in one I2C block write.
+    """
+
+    name = "mcp23017"
+    width = 16
+    IODIRA, GPIOA, OLATA = 0x00, 0x12, 0x14
+
+    def _configure(self, pins):
+        outputs = 0
+        for pin in pins:
+            outputs |= 1 << pin
+        inputs = ~outputs & 0xFFFF
+        self.bus.write_i2c_block_data(self.address, self.IODIRA, [inputs & 0xFF, inputs >> 8])
+
+    def _flush(self):
+        self.bus.write_i2c_block_data(self.address, self.OLATA, [self.latch & 0xFF, self.latch >> 8])
+
+    def _read_port(self):
+        lo, hi = self.bus.read_i2c_block_data(self.address, self.GPIOA, 2)
+        return lo | hi << 8
+
+
+class PCF8574Backend(_PortExpanderBackend):
+    """PCF8574 8-bit quasi-bidirectional expander; the whole port is one byte write."""
+
+    name = "pcf8574"
+    width = 8
+    # Unused pins stay high so they remain usable as inputs
+    idle_latch = 0xFF
+
+    def _flush(self):
+        self.bus.write_byte(self.address, self.latch)
+
+    def _read_port(self):
+        return self.bus.read_byte(self.address)
+
+
+class SimulatedBackend(GPIOBackend):
+    """In-process relay board with configurable per-operation latency, for tests and benchmarks.
+
+    Every bus transaction costs `transaction_latency_us` plus `write_latency_us` per pin
+    it writes, so `write` pays the transaction cost for each pin while `write_many` pays it
+    once for the whole bank, like a bus where one transaction updates a whole port.
+    """
+
+    name = "simulator"
+
+    def __init__(self, write_latency_us: float = 0, read_latency_us: float = 0,
+                 transaction_latency_us: float = 0):
+        self.write_latency = write_latency_us / 1e6
+        self.read_latency = read_latency_us / 1e6
+        self.transaction_latency = transaction_latency_us / 1e6
+        self.pins: Dict[int, bool] = {}
+        self.writes = 0
+        self.transactions = 0
+
+    @staticmethod
+    def _delay(seconds):
+        if seconds <= 0:
+            return
+        if seconds >= 0.002:
+            time.sleep(seconds)
+            return
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    def setup(self, pins, states):
+        self.pins = dict(zip(pins, (bool(s) for s in states)))
+
+    def write(self, pin, state):
+        self._delay(self.transaction_latency + self.write_latency)
+        self.pins[pin] = bool(state)
+        self.writes += 1
+        self.transactions += 1
+
+    def write_many(self, writes):
+        writes = list(writes)
+        self._delay(self.transaction_latency + self.write_latency * len(writes))
+        for pin, state in writes:
+            self.pins[pin] = bool(state)
+        self.writes += len(writes)
+        self.transactions += 1
+
+    def read(self, pin):
+        self._delay(self.read_latency)
+        return self.pins.get(pin, False)
+
+    def read_many(self, pins):
+        self._delay(self.read_latency)
+        return [self.pins.get(pin, False) for pin in pins]
+
+
+# Pin states of the mock GPIO used when RPi.GPIO is not installed
+_MOCK_BOARD = SimulatedBackend()
+
+
+def create_backend(gpio_cfg: Dict[str, Any]) -> GPIOBackend:
+    """Build the backend named by `gpio.backend`, passing the remaining keys as options."""
+    options = dict(gpio_cfg or {})
+    name = options.pop('backend', 'rpi')
+    if name == "rpi":
+        return RPiGPIOBackend(mode=options.get('mode', 'BOARD'))
+    if name == "lgpio":
+        return LgpioBackend(**options)
+    if name == "mcp23017":
+        return MCP23017Backend(**options)
+    if name == "pcf8574":
+        return PCF8574Backend(**options)
+    if name == "simulator":
+        return SimulatedBackend(**options)
+    if name == "virtual":
+        from simulator.board import VirtualRelayBoard
+        return VirtualRelayBoard(**options)
+    raise ValueError(f"Unknown gpio backend: {name}")
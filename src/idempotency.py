@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class IdempotencyCache:
+    """Bounded LRU of command results keyed by client idempotency key.
+
+    A key is first reserved by `begin`; a concurrent request with the same key waits for
+    the first one to `finish` and then gets its stored result, so a retried command runs
+    once. Entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, capacity: int = 1024, ttl: float = 300.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def begin(self, key: str, fingerprint: str, wait: float = 10.0) -> Optional[Tuple]:
+        """Reserve `key` for a new command (returns None) or return the stored result of a replay.
+
+        Raises ValueError when the key was used for a different command (`fingerprint`).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._entries[key] = _Entry(fingerprint, now)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                return None
+            self._entries.move_to_end(key)
+        if entry.fingerprint != fingerprint:
+            raise ValueError(f"Idempotency key {key} was already used for {entry.fingerprint}")
+        if not entry.done.wait(wait):
+            raise TimeoutError(f"Command for idempotency key {key} is still running")
+        return entry.result
+
+    def finish(self, key: str, result: Tuple):
+        """Store the result of the command reserved under `key` and wake any waiting replays."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            entry.result = result
+            entry.done.set()
+
+    def discard(self, key: str):
+        """Drop a reservation whose command should not be cached (e.g. it failed)."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "created", "result", "done")
+
+    def __init__(self, fingerprint, created):
+        self.fingerprint = fingerprint
+        self.created = created
+        self.result = None
+        self.done = threading.Event()
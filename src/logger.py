@@ -1,22 +1,290 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
-from typing import Optional
+import queue
+import threading
+import time
+from typing import Dict, Mapping, Optional
+from src.metrics import REGISTRY
+
+# Background listeners of loggers set up with async_mode, by logger name
+_listeners: Dict[str, "BatchingQueueListener"] = {}
+# Records dropped by queue handlers that have since been shut down, so the total survives reconfiguration
+_dropped_detached = 0
+_dropped_lock = threading.Lock()
+
+
+class _BatchFlushMixin:
+    """Lets the queue listener flush a stream once per batch instead of once per record."""
+    defer_flush = False
+
+    def flush(self):
+        if not self.defer_flush:
+            super().flush()
+
+
+class _StreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class _FileHandler(_BatchFlushMixin, logging.FileHandler):
+    pass
+
+
+class _RotatingFileHandler(_BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class _TimedRotatingFileHandler(_BatchFlushMixin, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+
+LOG_FORMATS = ("text", "json")
+TEXT_FORMAT = '[%(asctime)s] %(levelname)s [%(name)s]: %(message)s'
+# Attributes every LogRecord has; anything else on a record came in through `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record: ts, level, logger, msg and every `extra=` field."""
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                 "msg": record.getMessage()}
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar suppressed)" if suppressed else text
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records of each sampled event type (the `event` extra field).
+
+    Only records below WARNING are sampled. Selection is by running credit rather than at
+    random, so a rate of 0.1 keeps exactly every tenth record of that event.
+    """
+
+    def __init__(self, rates: Mapping[str, float]):
+        super().__init__()
+        self.rates = {event: min(max(float(rate), 0.0), 1.0) for event, rate in rates.items()}
+        self._credit = dict.fromkeys(self.rates, 1.0)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            credit = self._credit[record.event] + rate
+            keep = credit >= 1.0
+            self._credit[record.event] = credit - 1.0 if keep else credit
+        return keep
+
+
+class DedupFilter(logging.Filter):
+    """Passes a repeated warning or error at most once per `window` seconds.
+
+    Records are the same when they share logger, level and formatted message, so two
+    different failures are both written. A flood whose text varies, like a GPIO read that
+    fails with a new errno each time, passes a `dedup_key` extra field to be treated as one.
+    The first record after a window carries `suppressed`, the number dropped since the last one.
+    """
+
+    def __init__(self, window: float, max_keys: int = 1024, clock=time.monotonic):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._seen: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = getattr(record, "dedup_key", None)
+        key = (record.name, record.levelno, record.getMessage() if key is None else key)
+        now = self.clock()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                return False
+            if seen is None and len(self._seen) >= self.max_keys:
+                self._seen.clear()
+            self._seen[key] = [now, 0]
+        if seen is not None and seen[1]:
+            record.suppressed = seen[1]
+        return True
 
-def setup_logger(name: str, level: str = "INFO", log_file: Optional[str] = None, console: bool = True) -> logging.Logger:
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    formatter = logging.Formatter('[%(asctime)s] %(levelname)s [%(name)s]: %(message)s')
 
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records without formatting them and drops (and counts) records when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread, not in the caller
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """Drains up to `batch_size` records at a time and flushes the handlers once per batch."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers, batch_size: int = 256):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        # Queue handlers feeding this listener
+        self.sources = []
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            for handler in self.handlers:
+                handler.defer_flush = True
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                    continue
+                self.handle(record)
+            for handler in self.handlers:
+                handler.defer_flush = False
+                handler.flush()
+            for _ in batch:
+                q.task_done()
+            if stop:
+                return
+
+
+def setup_logger(name: str, level: str = "INFO", log_file: Optional[str] = None, console: bool = True,
+                 async_mode: bool = False, queue_size: int = 10000, max_bytes: int = 0,
+                 backup_count: int = 5, rotate_when: Optional[str] = None, log_format: str = "text",
+                 sample: Optional[Mapping[str, float]] = None, dedup_window: float = 0) -> logging.Logger:
+    """Configure the named logger, replacing any handlers a previous call attached.
+
+    With `async_mode` the logger only enqueues records on a bounded queue and a
+    background thread formats and writes them. `max_bytes` enables size-based and
+    `rotate_when` (e.g. "midnight") time-based rotation of `log_file`.
+
+    `log_format` "json" writes one JSON object per line. `sample` maps event types to
+    the fraction of their records kept, and `dedup_window` > 0 lets an identical warning
+    or error through once per that many seconds. Both filters run in the caller, before a
+    record is queued or formatted.
+
+    The new handlers are built before the old ones are detached, but a record logged from
+    another thread in the instant between the two goes only to the parent loggers.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format: {log_format}")
+    formatter = JsonFormatter() if log_format == "json" else _TextFormatter(TEXT_FORMAT)
+
+    handlers = []
     # Console handler (optional)
     if console:
-        ch = logging.StreamHandler()
-        ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        handlers.append(_StreamHandler())
 
     # File handler
     if log_file:
-        fh = logging.FileHandler(log_file)
-        fh.setFormatter(formatter)
-        logger.addHandler(fh)
+        if rotate_when:
+            handlers.append(_TimedRotatingFileHandler(log_file, when=rotate_when, backupCount=backup_count))
+        elif max_bytes:
+            handlers.append(_RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count))
+        else:
+            handlers.append(_FileHandler(log_file))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    listener = None
+    if async_mode:
+        log_queue = queue.Queue(maxsize=queue_size)
+        listener = BatchingQueueListener(log_queue, *handlers)
+        listener.sources = [DroppingQueueHandler(log_queue)]
+        listener.start()
+
+    logger = logging.getLogger(name)
+    shutdown_logger(name)
+    logger.setLevel(level)
+    if sample:
+        logger.addFilter(SamplingFilter(sample))
+    if dedup_window > 0:
+        logger.addFilter(DedupFilter(dedup_window))
+    if listener is not None:
+        _listeners[name] = listener
+        logger.addHandler(listener.sources[0])
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
 
     return logger
+
+
+def shutdown_logger(name: str):
+    """Flush and detach every handler of the named logger, stopping its background listener."""
+    global _dropped_detached
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    for log_filter in list(logger.filters):
+        if isinstance(log_filter, (SamplingFilter, DedupFilter)):
+            logger.removeFilter(log_filter)
+    with _dropped_lock:
+        listener = _listeners.pop(name, None)
+        if listener is not None:
+            _dropped_detached += sum(handler.dropped for handler in listener.sources)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def queue_depth() -> int:
+    """Records waiting in the queues of all async loggers."""
+    return sum(listener.queue.qsize() for listener in list(_listeners.values()))
+
+
+def dropped_records() -> int:
+    """Records dropped so far because an async logger's queue was full, including by replaced loggers."""
+    with _dropped_lock:
+        return _dropped_detached + sum(handler.dropped for listener in list(_listeners.values())
+                                       for handler in listener.sources)
+
+
+REGISTRY.collected("relay_log_queue_depth", "Log records waiting for the background writer.", queue_depth)
+REGISTRY.collected("relay_log_dropped_total", "Log records dropped because the log queue was full.",
+                   dropped_records, kind="counter")
+
+
+@atexit.register
+def _stop_listeners():
+    for name in list(_listeners):
+        shutdown_logger(name)
@@ -1,41 +1,164 @@
 import sys
 import signal
+import argparse
+import time
+# Only what is needed to put the relays into their boot state is imported up front;
+# the web stack (Flask, Werkzeug) loads after the GPIO has been driven.
 from src.config_manager import ConfigManager
 from src.logger import setup_logger
 from src.relay_controller import RelayController
-from src.api_server import init_api
+from src.gpio_backend import create_backend
+from src.state_journal import StateJournal, initial_state
+from src.relay_history import RelayHistory
+from src.relay_rules import RelayRules
+from src.relay_bank import RelayBank
 import os
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'settings.yaml')
 
 
-def graceful_shutdown(relay_controller, logger):
+def graceful_shutdown(relay_controller, logger, scheduler=None, journal=None, protocol=None, config=None,
+                      mqtt=None, close_streams=None):
     def handler(signum, frame):
         logger.info("Shutting down...")
+        if close_streams is not None:
+            # Free the workers held by event streams and long polls
+            close_streams()
+        if config is not None:
+            config.stop_watching()
+        if protocol is not None:
+            protocol.stop()
+        if mqtt is not None:
+            mqtt.stop()
+        if scheduler is not None:
+            scheduler.stop()
         relay_controller.cleanup()
+        if journal is not None:
+            journal.close()
         sys.exit(0)
     return handler
 
 
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Networked Relay Controller server')
+    parser.add_argument('-c', '--config', default=CONFIG_PATH, help='Path to settings.yaml')
+    parser.add_argument('--config-cache', default=None,
+                        help="Parsed config cache (default: <config>.cache; '' disables)")
+    args = parser.parse_args(argv)
+    if args.config_cache is None:
+        args.config_cache = args.config + '.cache'
+    return args
+
+
+def start_logger(settings):
+    return setup_logger('RelayController', settings.level, settings.file, settings.console,
+                        async_mode=settings.async_mode, queue_size=settings.queue_size,
+                        max_bytes=settings.max_bytes, backup_count=settings.backup_count,
+                        rotate_when=settings.rotate_when, log_format=settings.format,
+                        sample=settings.sample, dedup_window=settings.dedup_window)
+
+
+def apply_config(relay_controller, logger):
+    """Config listener: apply logging and pin-map changes live, report what needs a restart."""
+    def on_reload(old, new):
+        if new.logging != old.logging:
+            changed = {k for k in vars(new.logging) if getattr(new.logging, k) != getattr(old.logging, k)}
+            if changed == {'level'}:
+                logger.setLevel(new.logging.level)
+            else:
+                start_logger(new.logging)
+            logger.info("Logging settings applied: %s", ", ".join(sorted(changed)))
+        if new.relays.pins != old.relays.pins:
+            try:
+                relay_controller.remap(new.relays.pins)
+            except ValueError as e:
+                logger.error("Relay pin change not applied: %s", e)
+        for section in ('api', 'gpio', 'journal', 'binary', 'mqtt', 'history', 'rules'):
+            if new.sections.get(section) != old.sections.get(section):
+                logger.warning("Config section '%s' changed; restart to apply it", section)
+    return on_reload
+
+
 def main():
+    started = time.perf_counter()
+    args = parse_arguments()
+
     # Load config
-    config = ConfigManager(CONFIG_PATH)
-    log_cfg = config.get('logging')
-    logger = setup_logger('RelayController', log_cfg['level'], log_cfg['file'])
+    config = ConfigManager(args.config, cache_path=args.config_cache or None)
+    settings = config.snapshot
+    logger = start_logger(settings.logging)
+
+    # Relay controller, restored from the state journal per relays.restore_policy
+    relay_cfg = settings.relays
+    pin_map = relay_cfg.pins
+    journal_cfg = config.config.get('journal') or {}
+    journal = None
+    if journal_cfg.get('file'):
+        journal = StateJournal(journal_cfg['file'], pin_map, logger,
+                               compact_after=journal_cfg.get('compact_after', 1000),
+                               fsync=journal_cfg.get('fsync', True))
+    boot_state = initial_state(relay_cfg.restore_policy, pin_map,
+                               journal.load() if journal else None, relay_cfg.defaults)
+    backend = create_backend(config.config.get('gpio') or {})
+    history_cfg = config.config.get('history') or {}
+    history = RelayHistory(pin_map, history_cfg.get('capacity', 4096), history_cfg.get('spill_file'),
+                           history_cfg.get('spill_max_bytes', 1 << 20))
+    rules = RelayRules.from_config(RelayBank(pin_map), config.config.get('rules'))
+    relay_controller = RelayController(dict(pin_map), logger, boot_state, backend,
+                                       coalesce_ms=relay_cfg.coalesce_ms, history=history, rules=rules)
+    if journal:
+        journal.start(boot_state)
+        relay_controller.add_listener(journal.record)
+    relay_controller.start_reconciler(relay_cfg.reconcile_interval)
+    logger.info("Relays in boot state after %.0f ms", (time.perf_counter() - started) * 1000)
+
+    from src.api_server import close_streams, init_api
+    from src.binary_protocol import BinaryProtocolServer
+    from src.mqtt_bridge import MqttBridge
+    from src.scheduler import RelayScheduler
+    from src.server import serve
+
+    # Pick up edits to settings.yaml without a restart
+    config.add_listener(apply_config(relay_controller, logger))
+    config.watch(config.get('system', 'config_reload_interval') or 0, logger)
+
+    # Timed and scheduled relay actions
+    scheduler = RelayScheduler(relay_controller, logger)
+    scheduler.start()
+    rules.enforce_max_on(scheduler, relay_controller.status)
+    relay_controller.add_listener(rules.on_change)
+
+    # Optional binary control protocol on the same controller
+    binary_cfg = config.config.get('binary') or {}
+    protocol = None
+    if binary_cfg.get('enabled'):
+        protocol = BinaryProtocolServer(relay_controller, logger, binary_cfg.get('host', '0.0.0.0'),
+                                        binary_cfg.get('tcp_port'), binary_cfg.get('udp_port'))
+        protocol.start()
 
-    # Relay controller
-    pin_map = config.get('relays', 'pins')
-    relay_controller = RelayController(pin_map, logger)
+    # Optional MQTT client for building automation
+    mqtt_cfg = config.config.get('mqtt') or {}
+    mqtt = None
+    if mqtt_cfg.get('enabled'):
+        mqtt = MqttBridge(relay_controller, logger, mqtt_cfg.get('node', 'controller'),
+                          mqtt_cfg.get('host', 'localhost'), mqtt_cfg.get('port', 1883),
+                          prefix=mqtt_cfg.get('prefix', 'relays'), qos=mqtt_cfg.get('qos', 1),
+                          publish_interval_ms=mqtt_cfg.get('publish_interval_ms', 50),
+                          reconnect_min=mqtt_cfg.get('reconnect_min', 1),
+                          reconnect_max=mqtt_cfg.get('reconnect_max', 60),
+                          username=mqtt_cfg.get('username'), password=mqtt_cfg.get('password'))
+        mqtt.start()
 
     # API server
-    app = init_api(relay_controller, config, logger)
+    app = init_api(relay_controller, config, logger, scheduler)
 
     # Handle signals
-    signal.signal(signal.SIGINT, graceful_shutdown(relay_controller, logger))
-    signal.signal(signal.SIGTERM, graceful_shutdown(relay_controller, logger))
+    shutdown = graceful_shutdown(relay_controller, logger, scheduler, journal, protocol, config, mqtt,
+                                 close_streams)
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
 
-    api_cfg = config.get('api')
-    app.run(host=api_cfg['host'], port=api_cfg['port'])
+    serve(app, config.get('api'), logger)
 
 if __name__ == "__main__":
     main()
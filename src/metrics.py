@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Default latency buckets in seconds, from 50 µs to 5 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter. `value += amount` is a read-modify-write the GIL can interrupt, so
+    increments take a lock (uncontended, well under a microsecond) to never lose a count."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and two additions under a lock."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Bucket counts and sum from the same moment, for rendering."""
+        with self._lock:
+            return list(self.counts), self.sum
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class MetricFamily:
+    """One named metric with optional labels; children are created on first use and reused."""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, collect: Callable[[], float] = None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self.collect = collect
+        self._children: Dict[Tuple, object] = {}
+        if not self.labelnames and collect is None:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return Histogram(self.buckets) if self.kind == "histogram" else Counter()
+
+    def labels(self, *values, **kwvalues):
+        key = values or tuple(kwvalues[n] for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    # Shortcuts for unlabelled metrics
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if self.collect is not None:
+            lines.append(f"{self.name} {self.collect()}")
+            return lines
+        for key, child in list(self._children.items()):
+            labels = _format_labels(self.labelnames, key)
+            if self.kind == "histogram":
+                counts, total = child.snapshot()
+                cumulative = 0
+                for bound, count in zip(child.bounds + (None,), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound is None else f'le="{bound!r}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{self.name}{labels} {child.value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        return self._families.setdefault(family.name, family)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(MetricFamily("counter", name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> MetricFamily:
+        return self._register(MetricFamily("histogram", name, documentation, labelnames, buckets))
+
+    def collected(self, name: str, documentation: str, collect: Callable[[], float],
+                  kind: str = "gauge") -> MetricFamily:
+        """Metric whose value is read from `collect()` at scrape time."""
+        return self._register(MetricFamily(kind, name, documentation, collect=collect))
+
+    def render(self) -> str:
+        lines = []
+        for family in list(self._families.values()):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+def _rss_bytes() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # Not Linux
+        return 0
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.collected("process_resident_memory_bytes", "Resident memory size in bytes.", _rss_bytes)
+REGISTRY.collected("process_cpu_seconds_total", "Total user and system CPU time in seconds.", time.process_time,
+                   kind="counter")
@@ -0,0 +1,157 @@
+"""MQTT client mode: relay commands from command topics, relay state to retained topics.
+
+    relays/<node>/<id>/set     ON | OFF (also 1/0, true/false); <id> may be "all"
+    relays/<node>/<id>/state   retained ON | OFF, published when the relay changes
+    relays/<node>/<id>/error   why a command was rejected (not retained)
+    relays/<node>/availability retained online | offline (last will)
+
+Needs paho-mqtt (`pip install paho-mqtt`) unless a client object is passed in.
+"""
+import json
+import threading
+from typing import Dict, Optional
+
+from src.relay_rules import RuleViolation
+
+_PAYLOADS = {"on": True, "1": True, "true": True, "off": False, "0": False, "false": False}
+
+
+def _make_client(client_id: str):
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise RuntimeError("MQTT needs paho-mqtt; install it with `pip install paho-mqtt`")
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    return mqtt.Client(client_id=client_id)
+
+
+class MqttBridge:
+    """Connects a RelayController to an MQTT broker.
+
+    Commands run on the client's network thread straight into the controller. State changes
+    are collected from the controller listener and published by a separate thread at most
+    once per `publish_interval_ms`, one retained message per relay whose state differs from
+    what was last published. On every (re)connect the full state is published again; paho
+    reconnects on its own with a delay doubling from `reconnect_min` to `reconnect_max` seconds.
+    """
+
+    def __init__(self, relay_controller, logger, node: str, host: str = "localhost", port: int = 1883,
+                 prefix: str = "relays", qos: int = 1, keepalive: int = 30, publish_interval_ms: float = 50,
+                 reconnect_min: float = 1, reconnect_max: float = 60, username: Optional[str] = None,
+                 password: Optional[str] = None, client=None):
+        self.relay_controller = relay_controller
+        self.logger = logger
+        self.host = host
+        self.port = port
+        self.qos = qos
+        self.keepalive = keepalive
+        self.publish_interval = publish_interval_ms / 1000.0
+        self.base = f"{prefix}/{node}"
+        self.availability_topic = f"{self.base}/availability"
+        self.client = client if client is not None else _make_client(f"relay-controller-{node}")
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.will_set(self.availability_topic, "offline", qos=qos, retain=True)
+        self.client.reconnect_delay_set(min_delay=reconnect_min, max_delay=reconnect_max)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.connected = False
+        self._published: Dict[int, bool] = {}
+        self._dirty: Dict[int, bool] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._publisher = None
+        relay_controller.add_listener(self._on_change)
+
+    def state_topic(self, relay_id) -> str:
+        return f"{self.base}/{relay_id}/state"
+
+    def start(self):
+        self._stop.clear()
+        self._publisher = threading.Thread(target=self._publish_loop, name="MqttPublisher", daemon=True)
+        self._publisher.start()
+        self.client.connect_async(self.host, self.port, self.keepalive)
+        self.client.loop_start()
+        self.logger.info("MQTT bridge connecting to %s:%s as %s", self.host, self.port, self.base)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._publisher is not None:
+            self._publisher.join()
+            self._publisher = None
+        if self.connected:
+            self.client.publish(self.availability_topic, "offline", qos=self.qos, retain=True)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc != 0:
+            self.logger.error("MQTT connection to %s:%s refused: %s", self.host, self.port, rc)
+            return
+        client.subscribe(f"{self.base}/+/set", qos=self.qos)
+        with self._lock:
+            self.connected = True
+            self._dirty.clear()
+            self._published = dict(self.relay_controller.status)
+        for rid, state in self._published.items():
+            client.publish(self.state_topic(rid), "ON" if state else "OFF", qos=self.qos, retain=True)
+        client.publish(self.availability_topic, "online", qos=self.qos, retain=True)
+        self.logger.info("MQTT connected to %s:%s", self.host, self.port)
+
+    def _on_disconnect(self, client, userdata, *args):
+        with self._lock:
+            self.connected = False
+        if not self._stop.is_set():
+            self.logger.warning("MQTT connection to %s:%s lost; reconnecting", self.host, self.port)
+
+    def _on_message(self, client, userdata, message):
+        target = message.topic[len(self.base) + 1:-len("/set")]
+        payload = message.payload.decode("utf-8", "replace").strip().lower()
+        state = _PAYLOADS.get(payload)
+        ctrl = self.relay_controller
+        try:
+            if state is None:
+                raise ValueError(f"Invalid payload {payload!r}; expected ON or OFF")
+            if target == "all":
+                (ctrl.turn_all_on if state else ctrl.turn_all_off)("mqtt")
+            else:
+                try:
+                    relay_id = int(target)
+                except ValueError:
+                    raise ValueError(f"Invalid relay ID {target!r}")
+                (ctrl.turn_on if state else ctrl.turn_off)(relay_id, "mqtt")
+        except RuleViolation as e:
+            self._report(target, e.to_dict())
+        except ValueError as e:
+            self._report(target, {"status": "error", "message": str(e)})
+        except Exception as e:
+            self.logger.error("MQTT command %s failed: %s", message.topic, e)
+
+    def _report(self, target, body):
+        self.logger.warning("MQTT command for relay %s rejected: %s", target, body['message'])
+        self.client.publish(f"{self.base}/{target}/error", json.dumps(body), qos=self.qos)
+
+    def _on_change(self, changes: Dict[int, bool], version: int):
+        with self._lock:
+            self._dirty.update(changes)
+        self._wake.set()
+
+    def _publish_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            # Let a burst settle so it goes out as one message per relay
+            if self._stop.wait(self.publish_interval):
+                return
+            self._wake.clear()
+            with self._lock:
+                if not self.connected:
+                    continue
+                batch = {rid: state for rid, state in self._dirty.items() if self._published.get(rid) != state}
+                self._dirty.clear()
+                self._published.update(batch)
+            for rid, state in batch.items():
+                self.client.publish(self.state_topic(rid), "ON" if state else "OFF", qos=self.qos, retain=True)
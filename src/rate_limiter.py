@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Mapping, Optional
+
+
+class RateLimiter:
+    """Token buckets per key: `rate` tokens per second, at most `burst` stored.
+
+    Each active key costs one `[tokens, last_seen]` entry. Keys are kept in last-use order,
+    so idle ones are dropped from the front as new requests arrive. A bucket idle for
+    `burst / rate` seconds is full again, so dropping it then loses nothing. Past `max_keys`,
+    the least recently used key is dropped early.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000, clock=time.monotonic):
+        if rate <= 0 or burst < 1:
+            raise ValueError("Rate limit needs rate > 0 and burst >= 1")
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self.idle = burst / rate
+        self._buckets: "OrderedDict[Any, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, limit_cfg: Optional[Mapping[str, Any]]) -> Optional["RateLimiter"]:
+        """Limiter for a `{rate, burst}` config entry; None when the entry is absent or rate is 0."""
+        if not limit_cfg or not limit_cfg.get('rate'):
+            return None
+        rate = float(limit_cfg['rate'])
+        return cls(rate, float(limit_cfg.get('burst', max(1.0, rate))), limit_cfg.get('max_keys', 10000))
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key, cost: float = 1.0) -> float:
+        """Take `cost` tokens from `key`'s bucket; returns 0 if admitted, else seconds until it would be."""
+        return self.acquire_all((key,), cost)
+
+    def acquire_all(self, keys, cost: float = 1.0) -> float:
+        """Take `cost` tokens from every key's bucket, or from none if any of them is short.
+
+        Returns 0 if admitted, else the seconds until the emptiest bucket would admit it.
+        """
+        now = self.clock()
+        with self._lock:
+            buckets = [self._bucket(key, now) for key in dict.fromkeys(keys)]
+            short = max((cost - bucket[0] for bucket in buckets), default=0.0)
+            if short > 0:
+                return short / self.rate
+            for bucket in buckets:
+                bucket[0] -= cost
+            return 0.0
+
+    def _bucket(self, key, now: float) -> list:
+        """`key`'s bucket refilled up to `now`, moved to the back; evicts idle keys from the front."""
+        buckets = self._buckets
+        bucket = buckets.pop(key, None)
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest[1] < self.idle and len(buckets) < self.max_keys:
+                break
+            buckets.popitem(last=False)
+        if bucket is None:
+            bucket = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        buckets[key] = bucket
+        return bucket
@@ -0,0 +1,72 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+
+class RelayBank:
+    """Fixed layout of a relay bank: relay id <-> bit index <-> GPIO pin.
+
+    Relay states are kept as one integer bitmask where bit i is the i-th relay in
+    configuration order, so whole-bank reads and masked updates are single integer
+    operations regardless of the number of channels.
+    """
+
+    def __init__(self, pin_map: Dict[int, int]):
+        self.ids: Tuple[int, ...] = tuple(pin_map)
+        self.pins = array('H', (pin_map[rid] for rid in self.ids))
+        self.index: Dict[int, int] = {rid: i for i, rid in enumerate(self.ids)}
+        self.bit: Dict[int, int] = {rid: 1 << i for i, rid in enumerate(self.ids)}
+        self.all_mask = (1 << len(self.ids)) - 1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask_of(self, relay_ids: Iterable[int]) -> int:
+        mask = 0
+        bit = self.bit
+        for rid in relay_ids:
+            mask |= bit[rid]
+        return mask
+
+    def from_states(self, states: Dict[int, bool]) -> Tuple[int, int]:
+        """Split {id: state} into (bits to set, bits to clear)."""
+        set_bits = clear_bits = 0
+        bit = self.bit
+        for rid, state in states.items():
+            if state:
+                set_bits |= bit[rid]
+            else:
+                clear_bits |= bit[rid]
+        return set_bits, clear_bits
+
+    def indices(self, mask: int) -> Iterator[int]:
+        """Bit indices set in `mask`, lowest first, in O(number of set bits)."""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def to_states(self, mask: int, which: int = None) -> Dict[int, bool]:
+        """{id: state} for the relays selected by `which` (default: all)."""
+        ids = self.ids
+        if which is None:
+            return {rid: bool(mask >> i & 1) for i, rid in enumerate(ids)}
+        return {ids[i]: bool(mask >> i & 1) for i in self.indices(which)}
+
+    def to_list(self, mask: int) -> List[Dict[str, str]]:
+        return [{"id": rid, "state": "ON" if mask >> i & 1 else "OFF"} for i, rid in enumerate(self.ids)]
+
+    def to_hex(self, mask: int) -> str:
+        return f"0x{mask:0{max(1, (len(self.ids) + 3) // 4)}x}"
+
+    def parse_mask(self, value: Union[int, str]) -> int:
+        """Accept an int or a hex string ("0x0f" / "0f") and check it fits the bank."""
+        if isinstance(value, str):
+            try:
+                value = int(value, 16)
+            except ValueError:
+                raise ValueError(f"Invalid relay mask: {value}")
+        elif isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"Invalid relay mask: {value}")
+        if value < 0 or value & ~self.all_mask:
+            raise ValueError(f"Relay mask out of range for {len(self.ids)} relays: {value:#x}")
+        return value
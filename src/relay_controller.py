@@ -1,70 +1,410 @@
-from typing import List, Dict
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    # Mock GPIO for non-RPi environments
-    class GPIO:
-        BCM = BOARD = OUT = None
-        @staticmethod
-        def setmode(mode): pass
-        @staticmethod
-        def setup(pin, mode): pass
-        @staticmethod
-        def output(pin, state): pass
-        @staticmethod
-        def cleanup(): pass
+import json
+import threading
+import time
+from concurrent.futures import Future
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
+from src.command_executor import CommandExecutor
+from src.relay_bank import RelayBank
+from src.relay_history import RelayHistory
+from src.relay_rules import RelayRules
+from src.gpio_backend import GPIO, GPIOBackend, RPiGPIOBackend
+from src.metrics import REGISTRY
+
+GPIO_WRITE_SECONDS = REGISTRY.histogram("relay_gpio_write_seconds", "Duration of GPIO backend writes.")
+GPIO_READ_SECONDS = REGISTRY.histogram("relay_gpio_read_seconds", "Duration of GPIO backend reads.")
+RELAY_TOGGLES = REGISTRY.counter("relay_toggles_total", "Relay state changes.", ["relay"])
+RELAY_COALESCED = REGISTRY.counter("relay_coalesced_commands_total",
+                                   "Relay commands merged into a pending write within the coalescing window.")
 
 class RelayController:
-    def __init__(self, pin_map: Dict[int, int], logger):
+    """Relay state and GPIO access.
+
+    Every command runs on a single CommandExecutor thread, so GPIO writes and state
+    changes are strictly ordered. State is an integer bitmask laid out by RelayBank;
+    each command ends by publishing a new immutable (version, mask) snapshot with one
+    attribute assignment, so readers just pick up the current snapshot and never wait
+    on a write.
+
+    With `coalesce_ms` > 0, commands arriving within that window are merged per relay into
+    their final desired state and written once; relays already in that state are not written.
+    Rules are still checked per command in arrival order, so a rejected command fails only
+    its own caller, and each transition is recorded with the source of the command behind it.
+    """
+
+    def __init__(self, pin_map: Dict[int, int], logger, initial_state: Optional[Dict[int, bool]] = None,
+                 backend: Optional[GPIOBackend] = None, coalesce_ms: float = 0,
+                 history: Optional[RelayHistory] = None, rules: Optional[RelayRules] = None):
         self.pin_map = pin_map
         self.logger = logger
-        self.status = {rid: False for rid in pin_map}
-        GPIO.setmode(GPIO.BOARD)
-        for rid, pin in pin_map.items():
-            GPIO.setup(pin, GPIO.OUT)
-            GPIO.output(pin, False)
+        self.bank = RelayBank(pin_map)
+        initial_state = {rid: bool((initial_state or {}).get(rid, False)) for rid in pin_map}
+        self._snapshot = (0, self.bank.from_states(initial_state)[0])
+        self._status_cache = None
+        self._reconciler = None
+        self._reconciler_stop = threading.Event()
+        self.reconcile_interval = 0
+        self.last_reconcile = None
+        self._started = time.monotonic()
+        self._listeners = []
+        self._changed = threading.Condition()
+        self._waiters_released = False
+        self.coalesce_window = coalesce_ms / 1000
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        # Bits written less than the backend's settle_time ago, and when the last of them settles
+        self._settling = 0
+        self._settled_at = 0.0
+        self._commands = CommandExecutor()
+        self.backend = backend or RPiGPIOBackend(GPIO)
+        self._toggle_counters = [RELAY_TOGGLES.labels(str(rid)) for rid in self.bank.ids]
+        self.history = history if history is not None else RelayHistory(self.bank.ids)
+        self.history.start(initial_state)
+        self.rules = rules if rules is not None else RelayRules(self.bank)
+        self.backend.setup(self.bank.pins, [initial_state[rid] for rid in self.bank.ids])
+        self.gpio_ready = True
+
+    @property
+    def status(self) -> Mapping[int, bool]:
+        """Read-only snapshot of the relay states."""
+        return self._cached_status()[1]
+
+    @property
+    def mask(self) -> int:
+        """Relay states as a bitmask; bit i is the i-th relay in pin_map order."""
+        return self._snapshot[1]
+
+    def get_mask_hex(self) -> str:
+        return self.bank.to_hex(self._snapshot[1])
+
+    @property
+    def version(self) -> int:
+        """Bumped by every command that changes a relay; keys the cached status payload."""
+        return self._snapshot[0]
+
+    def turn_on(self, relay_id: int, source: str = "api"):
+        self._switch(relay_id, True, source)
+        self.logger.info("Relay %s ON", relay_id,
+                         extra={"event": "relay_switch", "relay": relay_id, "action": "on", "source": source})
+
+    def turn_off(self, relay_id: int, source: str = "api"):
+        self._switch(relay_id, False, source)
+        self.logger.info("Relay %s OFF", relay_id,
+                         extra={"event": "relay_switch", "relay": relay_id, "action": "off", "source": source})
+
+    def turn_all_on(self, source: str = "api"):
+        self.apply({rid: True for rid in self.pin_map}, source)
+        self.logger.info("All relays ON", extra={"event": "relay_switch", "action": "all_on", "source": source})
+
+    def turn_all_off(self, source: str = "api"):
+        self.apply({rid: False for rid in self.pin_map}, source)
+        self.logger.info("All relays OFF", extra={"event": "relay_switch", "action": "all_off", "source": source})
+
+    def apply(self, states: Dict[int, bool], source: str = "api") -> List[Dict[str, str]]:
+        """Set several relays at once: validate all ids, then write every pin in one pass.
+
+        `source` (api, scheduler, binary, ...) is recorded with the transitions in `history`.
+        """
+        invalid = [rid for rid in states if rid not in self.pin_map]
+        if invalid:
+            self.logger.error("Invalid relay ID(s) in batch: %s", invalid,
+                              extra={"event": "invalid_relay", "source": source})
+            raise ValueError("Invalid relay ID")
+        states = {rid: bool(state) for rid, state in states.items()}
+        self._submit_mask(*self.bank.from_states(states), source)
+        results = [{"id": rid, "state": "ON" if state else "OFF"} for rid, state in states.items()]
+        self.logger.info("Batch applied: %s", _BatchSummary(results),
+                         extra={"event": "relay_batch", "relays": len(results), "source": source})
+        return results
+
+    def set_mask(self, mask: int, value: bool, source: str = "api") -> int:
+        """Switch every relay whose bit is set in `mask` to `value`; returns the new bank mask."""
+        mask = self.bank.parse_mask(mask)
+        value = bool(value)
+        self._submit_mask(mask if value else 0, 0 if value else mask, source)
+        self.logger.info("Mask %s %s", self.bank.to_hex(mask), "ON" if value else "OFF",
+                         extra={"event": "relay_mask", "action": "on" if value else "off", "source": source})
+        return self._snapshot[1]
+
+    def get_status(self) -> List[Dict[str, str]]:
+        """Relay states from the shadow state; the list is shared, do not mutate it."""
+        return self._cached_status()[2]
+
+    def get_status_json(self) -> bytes:
+        """Pre-serialized `{"relays": [...]}` payload, rebuilt only when the state version changes."""
+        return self._cached_status()[3]
+
+    def get_versioned_status_json(self) -> Tuple[int, bytes]:
+        """`(version, payload)` from one snapshot, so a version-based ETag always matches the body."""
+        cache = self._cached_status()
+        return cache[0][0], cache[3]
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Block until the state version differs from `version` or `timeout` seconds pass.
+
+        Returns the current version.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._snapshot[0] != version or self._waiters_released, timeout)
+        return self._snapshot[0]
+
+    def release_waiters(self):
+        """Return every current and future wait_for_change at once; used at shutdown."""
+        with self._changed:
+            self._waiters_released = True
+            self._changed.notify_all()
+
+    def reconcile(self) -> Dict[int, bool]:
+        """Re-read every pin and adopt the hardware state where it drifted from the shadow state."""
+        return self._commands.call(self._reconcile)
+
+    def start_reconciler(self, interval: float):
+        """Run reconcile() every `interval` seconds on a daemon thread."""
+        if interval <= 0 or self._reconciler is not None:
+            return
+        def run():
+            while not self._reconciler_stop.wait(interval):
+                self.reconcile()
+        self.reconcile_interval = interval
+        self._reconciler_stop.clear()
+        self._reconciler = threading.Thread(target=run, name="RelayReconciler", daemon=True)
+        self._reconciler.start()
 
-    def turn_on(self, relay_id: int):
+    def stop_reconciler(self):
+        if self._reconciler is not None:
+            self._reconciler_stop.set()
+            self._reconciler.join()
+            self._reconciler = None
+
+    def health(self) -> Dict:
+        """Readiness: GPIO initialized, command thread running and, if enabled, a recent reconcile."""
+        now = time.monotonic()
+        age = None if self.last_reconcile is None else now - self.last_reconcile
+        reconcile_ok = True
+        if self.reconcile_interval:
+            # Allow a few missed rounds before declaring the hardware view stale
+            since = age if age is not None else now - self._started
+            reconcile_ok = since < 3 * self.reconcile_interval
+        alive = self._commands.alive
+        return {"healthy": self.gpio_ready and alive and reconcile_ok, "gpio": self.gpio_ready,
+                "command_thread": alive, "last_reconcile_age": None if age is None else round(age, 3)}
+
+    def remap(self, pin_map: Dict[int, int]):
+        """Move relays to new pins without a restart, keeping their states.
+
+        The set and order of relay ids must stay the same; pins that no longer carry a relay
+        are switched off. Runs on the command thread between two commands.
+        """
+        if tuple(pin_map) != self.bank.ids:
+            raise ValueError("Relay IDs changed; adding or removing relays needs a restart")
+        self._commands.call(self._remap, dict(pin_map))
+
+    def add_listener(self, callback):
+        """Register `callback(changes, version)`, called after every command that changed relays.
+
+        Callbacks run on the command thread, in command order, and should return quickly.
+        """
+        self._listeners.append(callback)
+
+    def _switch(self, relay_id: int, state: bool, source: str):
+        if self.coalesce_window <= 0 or self._commands.on_executor_thread:
+            self._commands.call(self._write, relay_id, state, source)
+            return
         self._validate_id(relay_id)
-        pin = self.pin_map[relay_id]
-        GPIO.output(pin, True)
-        self.status[relay_id] = True
-        self.logger.info(f"Relay {relay_id} ON")
+        bit = self.bank.bit[relay_id]
+        self._coalesce(bit if state else 0, 0 if state else bit, source)
+
+    def _submit_mask(self, set_bits: int, clear_bits: int, source: str):
+        if self.coalesce_window <= 0 or self._commands.on_executor_thread:
+            self._commands.call(self._write_mask, set_bits, clear_bits, source)
+        else:
+            self._coalesce(set_bits, clear_bits, source)
+
+    def _coalesce(self, set_bits: int, clear_bits: int, source: str):
+        """Join the pending window; the first caller of a window waits it out and queues the flush."""
+        future = Future()
+        with self._pending_lock:
+            leader = self._pending is None
+            if leader:
+                self._pending = []
+            else:
+                RELAY_COALESCED.inc()
+            self._pending.append((set_bits, clear_bits, source, future))
+        if leader:
+            time.sleep(self.coalesce_window)
+            try:
+                self._commands.submit(self._flush_pending)
+            except RuntimeError as e:
+                with self._pending_lock:
+                    commands, self._pending = self._pending, None
+                for *_, waiter in commands:
+                    waiter.set_exception(e)
+        future.result()
+
+    # The methods below only run on the command executor thread.
+
+    def _flush_pending(self):
+        with self._pending_lock:
+            commands, self._pending = self._pending, None
+        mask = target = self._snapshot[1]
+        accepted = []
+        for set_bits, clear_bits, source, future in commands:
+            try:
+                self.rules.check(target, set_bits, clear_bits)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            # Later commands win per relay
+            target = (target & ~clear_bits) | set_bits
+            accepted.append((set_bits | clear_bits, source, future))
+        changed = mask ^ target
+        # Each changed relay belongs to the last command that switched it
+        owned = {}
+        unowned = changed
+        for bits, source, _ in reversed(accepted):
+            if bits & unowned:
+                owned[source] = owned.get(source, 0) | (bits & unowned)
+                unowned &= ~bits
+        try:
+            if changed:
+                self._drive(target & changed, mask & changed)
+                for source, bits in reversed(list(owned.items())):
+                    self._commit(target & bits, mask & bits, source)
+        except Exception as e:
+            for *_, future in accepted:
+                future.set_exception(e)
+            return
+        for *_, future in accepted:
+            future.set_result(None)
 
-    def turn_off(self, relay_id: int):
+    def _write(self, relay_id: int, state: bool, source: str = "api"):
         self._validate_id(relay_id)
-        pin = self.pin_map[relay_id]
-        GPIO.output(pin, False)
-        self.status[relay_id] = False
-        self.logger.info(f"Relay {relay_id} OFF")
+        bit = self.bank.bit[relay_id]
+        set_bits, clear_bits = (bit, 0) if state else (0, bit)
+        self.rules.check(self._snapshot[1], set_bits, clear_bits)
+        start = time.perf_counter()
+        self.backend.write(self.pin_map[relay_id], state)
+        GPIO_WRITE_SECONDS.observe(time.perf_counter() - start)
+        self._note_written(bit)
+        self._commit(set_bits, clear_bits, source)
 
-    def turn_all_on(self):
-        for rid in self.pin_map:
-            self.turn_on(rid)
-        self.logger.info("All relays ON")
+    def _write_mask(self, set_bits: int, clear_bits: int, source: str = "api"):
+        self.rules.check(self._snapshot[1], set_bits, clear_bits)
+        self._drive(set_bits, clear_bits)
+        self._commit(set_bits, clear_bits, source)
 
-    def turn_all_off(self):
-        for rid in self.pin_map:
-            self.turn_off(rid)
-        self.logger.info("All relays OFF")
+    def _drive(self, set_bits: int, clear_bits: int):
+        """Write the pins of `set_bits` high and of `clear_bits` low in one backend transaction."""
+        pins = self.bank.pins
+        indices = self.bank.indices
+        writes = [(pins[i], True) for i in indices(set_bits)]
+        writes.extend((pins[i], False) for i in indices(clear_bits))
+        start = time.perf_counter()
+        self.backend.write_many(writes)
+        GPIO_WRITE_SECONDS.observe(time.perf_counter() - start)
+        self._note_written(set_bits | clear_bits)
 
-    def get_status(self) -> List[Dict[str, str]]:
-        status_list = []
-        for rid, pin in self.pin_map.items():
+    def _note_written(self, bits: int):
+        """Keep the reconciler off `bits` until read-back can show what was just written."""
+        settle = self.backend.settle_time
+        if not settle:
+            return
+        now = time.monotonic()
+        self._settling = bits if now >= self._settled_at else self._settling | bits
+        self._settled_at = now + settle
+
+    def _remap(self, pin_map: Dict[int, int]):
+        bank = RelayBank(pin_map)
+        if list(bank.pins) == list(self.bank.pins):
+            return
+        mask = self._snapshot[1]
+        released = set(self.bank.pins) - set(bank.pins)
+        self.backend.write_many([(pin, False) for pin in released])
+        self.backend.setup(bank.pins, [bool(mask >> i & 1) for i in range(len(bank))])
+        self.pin_map = pin_map
+        self.bank = bank
+        self.logger.info("Relay pins remapped: %s", pin_map)
+
+    def _reconcile(self) -> Dict[int, bool]:
+        mask = self._snapshot[1]
+        start = time.perf_counter()
+        try:
+            states = self.backend.read_many(self.bank.pins)
+        except Exception as e:
+            self.logger.error("Error reading relay pins: %s", e,
+                              extra={"event": "gpio_read_error", "dedup_key": "gpio_read_error"})
+            return {}
+        GPIO_READ_SECONDS.observe(time.perf_counter() - start)
+        self.last_reconcile = time.monotonic()
+        hardware = 0
+        for i, state in enumerate(states):
+            if state:
+                hardware |= 1 << i
+        # Contacts still moving after a recent write read back their old state; that is not drift
+        if self._settling and time.monotonic() < self._settled_at:
+            hardware = (hardware & ~self._settling) | (mask & self._settling)
+        drifted = self.bank.to_states(hardware, mask ^ hardware)
+        for rid, state in drifted.items():
+            self.logger.warning("Relay %s drifted: hardware reads %s", rid, "ON" if state else "OFF",
+                                extra={"event": "relay_drift", "relay": rid})
+        self._commit(hardware & ~mask, mask & ~hardware, "reconcile")
+        return drifted
+
+    def _commit(self, set_bits: int, clear_bits: int, source: str):
+        """Publish a new snapshot with `set_bits` set and `clear_bits` cleared; record and notify."""
+        version, mask = self._snapshot
+        new_mask = (mask & ~clear_bits) | set_bits
+        changed = mask ^ new_mask
+        if not changed:
+            return
+        version += 1
+        self._snapshot = (version, new_mask)
+        with self._changed:
+            self._changed.notify_all()
+        self.rules.note(changed, new_mask)
+        counters = self._toggle_counters
+        for i in self.bank.indices(changed):
+            counters[i].inc()
+        changes = self.bank.to_states(new_mask, changed)
+        self.history.record(changes, source)
+        for callback in self._listeners:
             try:
-                state = GPIO.input(pin)
-                status_str = "ON" if state else "OFF"
+                callback(changes, version)
             except Exception as e:
-                self.logger.error(f"Error reading pin {pin} for relay {rid}: {e}")
-                status_str = "UNKNOWN"
-            status_list.append({"id": rid, "state": status_str})
-        return status_list
+                self.logger.error("State listener failed: %s", e)
+
+    def _cached_status(self):
+        snapshot = self._snapshot
+        cache = self._status_cache
+        if cache is None or cache[0] is not snapshot:
+            status_list = self.bank.to_list(snapshot[1])
+            payload = json.dumps({"relays": status_list}, separators=(",", ":")).encode()
+            status = MappingProxyType(self.bank.to_states(snapshot[1]))
+            cache = self._status_cache = (snapshot, status, status_list, payload)
+        return cache
 
     def _validate_id(self, relay_id: int):
         if relay_id not in self.pin_map:
-            self.logger.error(f"Invalid relay ID: {relay_id}")
+            self.logger.error("Invalid relay ID: %s", relay_id, extra={"event": "invalid_relay", "relay": relay_id})
             raise ValueError("Invalid relay ID")
 
     def cleanup(self):
-        GPIO.cleanup()
+        self.release_waiters()
+        self.stop_reconciler()
+        self._commands.call(self.backend.cleanup)
+        self.history.close()
+        self.gpio_ready = False
+        self._commands.shutdown()
         self.logger.info("GPIO cleanup done")
+
+
+class _BatchSummary:
+    """Formats "1=ON, 2=OFF" only if the log record is actually written."""
+
+    __slots__ = ("results",)
+
+    def __init__(self, results):
+        self.results = results
+
+    def __str__(self):
+        return ", ".join(f"{r['id']}={r['state']}" for r in self.results)
@@ -0,0 +1,248 @@
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+# Transition sources; the index is what gets stored, so only ever append to this tuple
+SOURCES = ("other", "api", "scheduler", "binary", "reconcile", "restore", "mqtt")
+_SOURCE_CODES = {name: code for code, name in enumerate(SOURCES)}
+
+# Spilled record: timestamp f64, relay id u32, state u8, source u8
+_RECORD = struct.Struct("<dIBB")
+# Spilled records read per seek when scanning a query's range
+_SPILL_CHUNK = 1024
+
+
+class RelayStats:
+    """Per-relay aggregates, updated on every transition instead of rescanning history."""
+
+    __slots__ = ("state", "transitions", "on_seconds", "last_change", "since")
+
+    def __init__(self, state: bool, now: float):
+        self.state = state
+        self.transitions = 0
+        self.on_seconds = 0.0
+        self.last_change = now
+        self.since = now
+
+    def update(self, state: bool, now: float):
+        if self.state:
+            self.on_seconds += now - self.last_change
+        self.state = state
+        self.transitions += 1
+        self.last_change = now
+
+    def to_dict(self, relay_id: int, now: float) -> Dict:
+        on_seconds = self.on_seconds + (now - self.last_change if self.state else 0)
+        tracked = now - self.since
+        return {"relay": relay_id, "state": "ON" if self.state else "OFF", "transitions": self.transitions,
+                "on_seconds": round(on_seconds, 3), "duty_cycle": round(on_seconds / tracked, 4) if tracked else 0.0,
+                "last_change": self.last_change, "tracking_since": self.since}
+
+
+class RelayHistory:
+    """Fixed-size ring of relay transitions held in parallel typed arrays.
+
+    Timestamps never go backwards, so time-range queries binary-search the ring. With
+    `spill_file`, records that fall out of the ring are appended to a segment file of
+    fixed-size records (rotated to `<file>.1` past `spill_max_bytes`) and queries that
+    reach back before the ring search that file too, by seeking, without holding up
+    `record`.
+    """
+
+    def __init__(self, relay_ids: Iterable[int], capacity: int = 4096, spill_file: Optional[str] = None,
+                 spill_max_bytes: int = 1 << 20, clock=time.time):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self.clock = clock
+        self._times = array('d', bytes(8 * capacity))
+        self._ids = array('I', bytes(4 * capacity))
+        self._states = array('B', bytes(capacity))
+        self._sources = array('B', bytes(capacity))
+        self._start = 0
+        self._count = 0
+        self._last_time = 0.0
+        self._lock = threading.Lock()
+        # Held while a query reads the spill files; `record` skips rotating them meanwhile
+        self._spill_lock = threading.Lock()
+        now = clock()
+        self.stats: Dict[int, RelayStats] = {rid: RelayStats(False, now) for rid in relay_ids}
+        self.spill_file = spill_file
+        self.spill_max_bytes = spill_max_bytes
+        self._spill = open(spill_file, 'ab') if spill_file else None
+
+    def __len__(self):
+        return self._count
+
+    def start(self, states: Dict[int, bool]):
+        """Set the states tracking starts from (no transitions are recorded)."""
+        now = self.clock()
+        with self._lock:
+            for rid, state in states.items():
+                self.stats[rid] = RelayStats(bool(state), now)
+
+    def record(self, changes: Dict[int, bool], source: str = "other"):
+        """Append one transition per changed relay; called on the controller's command thread."""
+        code = _SOURCE_CODES.get(source, 0)
+        with self._lock:
+            now = max(self.clock(), self._last_time)
+            self._last_time = now
+            for rid, state in changes.items():
+                if self._count == self.capacity:
+                    if self._spill is not None:
+                        self._spill_oldest()
+                    i = self._start
+                    self._start = (self._start + 1) % self.capacity
+                else:
+                    i = (self._start + self._count) % self.capacity
+                    self._count += 1
+                self._times[i] = now
+                self._ids[i] = rid
+                self._states[i] = state
+                self._sources[i] = code
+                stats = self.stats.get(rid)
+                if stats is not None:
+                    stats.update(bool(state), now)
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              relay_id: Optional[int] = None, limit: int = 1000, order: str = "desc") -> List[Dict]:
+        """Transitions with since <= t < until, at most `limit` of them.
+
+        `order` "desc" returns the newest first, so a limit keeps the latest transitions;
+        "asc" returns the oldest first.
+        """
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Invalid order: {order}; expected asc or desc")
+        since = float('-inf') if since is None else since
+        until = float('inf') if until is None else until
+        newest_first = order == "desc"
+        if self.spill_file is None:
+            with self._lock:
+                return self._query_ring(since, until, relay_id, limit, newest_first)
+        with self._spill_lock:
+            with self._lock:
+                events = self._query_ring(since, until, relay_id, limit, newest_first)
+                segments = None
+                reaches_back = self._count == 0 or since <= self._times[self._start]
+                if self._spill is not None and reaches_back and not (newest_first and len(events) >= limit):
+                    self._spill.flush()
+                    segments = self._spill_segments()
+            if segments is None:
+                return events
+            if newest_first:
+                return events + self._query_spilled(segments, since, until, relay_id, limit - len(events), True)
+            spilled = self._query_spilled(segments, since, until, relay_id, limit, False)
+            return (spilled + events)[:limit]
+
+    def relay_stats(self, relay_id: int) -> Dict:
+        with self._lock:
+            stats = self.stats.get(relay_id)
+            if stats is None:
+                raise ValueError("Invalid relay ID")
+            return stats.to_dict(relay_id, max(self.clock(), self._last_time))
+
+    def close(self):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+    @staticmethod
+    def _event(t, rid, state, source) -> Dict:
+        return {"t": t, "id": rid, "state": "ON" if state else "OFF",
+                "source": SOURCES[source] if source < len(SOURCES) else "other"}
+
+    def _bisect(self, t: float) -> int:
+        """Logical index of the first ring entry with timestamp >= t."""
+        lo, hi = 0, self._count
+        times, cap, start = self._times, self.capacity, self._start
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[(start + mid) % cap] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _query_ring(self, since, until, relay_id, limit, newest_first) -> List[Dict]:
+        events = []
+        lo, hi = self._bisect(since), self._bisect(until)
+        cap, start = self.capacity, self._start
+        for n in (range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)):
+            if len(events) >= limit:
+                break
+            i = (start + n) % cap
+            if relay_id is None or self._ids[i] == relay_id:
+                events.append(self._event(self._times[i], self._ids[i], self._states[i], self._sources[i]))
+        return events
+
+    def _spill_oldest(self):
+        i = self._start
+        self._spill.write(_RECORD.pack(self._times[i], self._ids[i], self._states[i], self._sources[i]))
+        # A query reading the segments has them pinned; rotate on a later spill instead
+        if self._spill.tell() >= self.spill_max_bytes and self._spill_lock.acquire(blocking=False):
+            try:
+                self._spill.close()
+                os.replace(self.spill_file, self.spill_file + ".1")
+                self._spill = open(self.spill_file, 'ab')
+            finally:
+                self._spill_lock.release()
+
+    def _spill_segments(self) -> List[tuple]:
+        """(path, record count) of the spill files, oldest first, as of now."""
+        segments = []
+        try:
+            segments.append((self.spill_file + ".1", os.path.getsize(self.spill_file + ".1") // _RECORD.size))
+        except OSError:
+            pass
+        segments.append((self.spill_file, self._spill.tell() // _RECORD.size))
+        return segments
+
+    def _query_spilled(self, segments, since, until, relay_id, limit, newest_first) -> List[Dict]:
+        """Search the spill segments, reading only the records in range; runs outside `_lock`."""
+        events = []
+        size = _RECORD.size
+        for path, count in (reversed(segments) if newest_first else segments):
+            if len(events) >= limit:
+                break
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                continue
+            with f:
+                def time_at(n):
+                    f.seek(n * size)
+                    return _RECORD.unpack(f.read(size))[0]
+
+                lo, hi = self._bisect_file(time_at, count, since), self._bisect_file(time_at, count, until)
+                while lo < hi and len(events) < limit:
+                    # Read in chunks from whichever end comes first in the requested order
+                    n = min(hi - lo, _SPILL_CHUNK)
+                    first = hi - n if newest_first else lo
+                    f.seek(first * size)
+                    records = list(_RECORD.iter_unpack(f.read(n * size)))
+                    for t, rid, state, source in (reversed(records) if newest_first else records):
+                        if len(events) >= limit:
+                            break
+                        if relay_id is None or rid == relay_id:
+                            events.append(self._event(t, rid, state, source))
+                    if newest_first:
+                        hi = first
+                    else:
+                        lo = first + n
+        return events
+
+    @staticmethod
+    def _bisect_file(time_at, count: int, t: float) -> int:
+        """Index of the first spilled record with timestamp >= t."""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if time_at(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from src.relay_bank import RelayBank
+
+
+class RuleViolation(ValueError):
+    """A command rejected by an interlock or timing rule; `to_dict()` is the 409 response body."""
+
+    def __init__(self, rule: str, relay_id: int, message: str, **details):
+        super().__init__(message)
+        self.rule = rule
+        self.relay_id = relay_id
+        self.details = details
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"status": "error", "rule": self.rule, "relay": self.relay_id, "message": str(self), **self.details}
+
+
+class RelayRules:
+    """Interlocks, groups and timing constraints compiled into per-bit lookup tables.
+
+    `exclusive[i]` is the mask of relays that may not be on together with bit i, and
+    `constrained` has a bit for every relay with any switch-on rule, so a command costs
+    one mask test plus a table lookup per relay it switches on.
+    """
+
+    def __init__(self, bank: RelayBank, interlocks: Iterable[Iterable[int]] = (),
+                 groups: Optional[Mapping[str, Iterable[int]]] = None,
+                 max_on_ms: Optional[Mapping[int, float]] = None,
+                 min_off_ms: Optional[Mapping[int, float]] = None, clock=time.monotonic):
+        self.bank = bank
+        self.clock = clock
+        size = len(bank)
+        self.exclusive: List[int] = [0] * size
+        for relays in interlocks:
+            mask = self._mask(relays, "interlock")
+            for i in bank.indices(mask):
+                self.exclusive[i] |= mask & ~(1 << i)
+        self.groups: Dict[str, int] = {str(name): self._mask(relays, f"group {name}")
+                                       for name, relays in (groups or {}).items()}
+        self.max_on: Dict[int, float] = {self._index(rid, "max_on_ms"): ms / 1000.0
+                                         for rid, ms in (max_on_ms or {}).items()}
+        self.min_off: List[float] = [0.0] * size
+        for rid, ms in (min_off_ms or {}).items():
+            self.min_off[self._index(rid, "min_off_ms")] = ms / 1000.0
+        self.min_off_mask = bank.mask_of(bank.ids[i] for i in range(size) if self.min_off[i])
+        self.constrained = self.min_off_mask | bank.mask_of(
+            bank.ids[i] for i in range(size) if self.exclusive[i])
+        self._off_at = [float('-inf')] * size
+        self._scheduler = None
+        self._max_on_jobs: Dict[int, int] = {}
+        self._jobs_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, bank: RelayBank, rules_cfg: Optional[Mapping[str, Any]]) -> "RelayRules":
+        rules_cfg = rules_cfg or {}
+        return cls(bank, rules_cfg.get('interlocks') or (), rules_cfg.get('groups'),
+                   rules_cfg.get('max_on_ms'), rules_cfg.get('min_off_ms'))
+
+    def _index(self, relay_id, where) -> int:
+        if relay_id not in self.bank.index:
+            raise ValueError(f"Unknown relay {relay_id} in rules ({where})")
+        return self.bank.index[relay_id]
+
+    def _mask(self, relays, where) -> int:
+        mask = 0
+        for rid in relays:
+            mask |= 1 << self._index(rid, where)
+        return mask
+
+    def group(self, name: str) -> int:
+        """Bank mask of a named group; KeyError if there is no such group."""
+        return self.groups[name]
+
+    def check(self, mask: int, set_bits: int, clear_bits: int):
+        """Raise RuleViolation if switching `mask` by (set_bits, clear_bits) breaks a rule."""
+        turning_on = set_bits & ~mask & self.constrained
+        if not turning_on:
+            return
+        new_mask = (mask & ~clear_bits) | set_bits
+        ids = self.bank.ids
+        now = self.clock()
+        for i in self.bank.indices(turning_on):
+            conflicts = self.exclusive[i] & new_mask
+            if conflicts:
+                others = [ids[j] for j in self.bank.indices(conflicts)]
+                raise RuleViolation("interlock", ids[i], f"Relay {ids[i]} is interlocked with relay(s) "
+                                    f"{', '.join(map(str, others))}, which would be on", conflicts=others)
+            wait = self.min_off[i] - (now - self._off_at[i])
+            if wait > 0:
+                raise RuleViolation("min_off_time", ids[i], f"Relay {ids[i]} must stay off "
+                                    f"{self.min_off[i] * 1000:.0f} ms between switch-ons",
+                                    retry_after_ms=round(wait * 1000))
+
+    def note(self, changed: int, new_mask: int):
+        """Record switch-off times; called by the controller for every committed change."""
+        turned_off = changed & self.min_off_mask & ~new_mask
+        if turned_off:
+            now = self.clock()
+            for i in self.bank.indices(turned_off):
+                self._off_at[i] = now
+
+    def enforce_max_on(self, scheduler, current: Mapping[int, bool]):
+        """Switch relays with a max_on_ms rule off through `scheduler` once their time is up."""
+        self._scheduler = scheduler
+        for rid, state in current.items():
+            if state:
+                self._schedule_off(rid)
+
+    def on_change(self, changes: Dict[int, bool], version: int):
+        """Controller listener arming and cancelling max-on-time switch-offs."""
+        if self._scheduler is None or not self.max_on:
+            return
+        for rid, state in changes.items():
+            if self.bank.index[rid] not in self.max_on:
+                continue
+            with self._jobs_lock:
+                job = self._max_on_jobs.pop(rid, None)
+            if job is not None:
+                self._scheduler.cancel(job)
+            if state:
+                self._schedule_off(rid)
+
+    def _schedule_off(self, rid):
+        limit = self.max_on.get(self.bank.index[rid])
+        if limit is None:
+            return
+        job = self._scheduler.switch_off_after(rid, limit * 1000)
+        with self._jobs_lock:
+            self._max_on_jobs[rid] = job
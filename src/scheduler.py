@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+
+class CronSpec:
+    """Five-field cron expression (minute hour day-of-month month day-of-week).
+
+    Fields accept `*`, numbers, ranges `a-b`, steps `*/n` / `a-b/n` and comma lists.
+    Day-of-week runs 0-6 with 0 = Sunday (7 is also accepted for Sunday).
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        parsed = [self._parse(f, lo, hi) for f, (lo, hi) in zip(fields, self._RANGES)]
+        self.minutes, self.hours, self.days, self.months, dows = parsed
+        self.dows = {d % 7 for d in dows}
+        self._any_day = fields[2] == '*'
+        self._any_dow = fields[4] == '*'
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> Set[int]:
+        values = set()
+        for part in field.split(','):
+            rng, _, step = part.partition('/')
+            try:
+                step = int(step) if step else 1
+                if rng == '*':
+                    start, end = lo, hi
+                elif '-' in rng:
+                    start, end = (int(x) for x in rng.split('-', 1))
+                else:
+                    start = end = int(rng)
+            except ValueError:
+                raise ValueError(f"Invalid cron field: {field!r}")
+            if start < lo or end > hi or start > end or step < 1:
+                raise ValueError(f"Cron field out of range: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.dows
+        if self._any_day or self._any_dow:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, after: datetime) -> datetime:
+        """First matching minute strictly after `after` (local, naive datetimes)."""
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression never fires: {self.expr!r}")
+
+
+class ScheduledJob:
+    def __init__(self, job_id: int, relay_id: int, state: bool, deadline: float, kind: str,
+                 cron: Optional[CronSpec] = None):
+        self.id = job_id
+        self.relay_id = relay_id
+        self.state = state
+        self.deadline = deadline
+        self.kind = kind
+        self.cron = cron
+        # Wall-clock time of the cron minute this job fires for next
+        self.fire_at = None
+
+    def to_dict(self, clock_offset: float) -> Dict:
+        job = {"id": self.id, "relay": self.relay_id, "action": "on" if self.state else "off",
+               "kind": self.kind, "due": round(self.deadline + clock_offset, 3)}
+        if self.cron:
+            job["cron"] = self.cron.expr
+        return job
+
+
+class RelayScheduler:
+    """Pulses, delayed and recurring relay actions fired from one timer thread.
+
+    Pending jobs live in a heap ordered by monotonic deadline; cancelled jobs are
+    dropped lazily when they reach the top. Jobs falling due within `merge_window`
+    seconds of each other are merged into a single RelayController.apply call; if that
+    call fails, the jobs are applied one by one so only the failing ones are lost.
+    Safety switch-offs (`switch_off_after`) are never merged with other jobs and run first.
+    """
+
+    def __init__(self, relay_controller, logger, merge_window: float = 0.001):
+        self.relay_controller = relay_controller
+        self.logger = logger
+        self.merge_window = merge_window
+        self._heap = []
+        self._jobs: Dict[int, ScheduledJob] = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="RelayScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def pulse(self, relay_id: int, duration_ms: float, state: bool = True) -> int:
+        """Switch the relay to `state` now and back after `duration_ms`; returns the revert job id."""
+        if duration_ms <= 0:
+            raise ValueError("Pulse duration must be positive")
+        self._validate_id(relay_id)
+        self.relay_controller.apply({relay_id: state})
+        return self._add(relay_id, not state, time.monotonic() + duration_ms / 1000.0, "pulse")
+
+    def schedule(self, relay_id: int, state: bool, delay_ms: Optional[float] = None,
+                 at: Optional[float] = None, cron: Optional[str] = None) -> int:
+        """Schedule one action after `delay_ms`, at epoch time `at`, or on every `cron` match."""
+        if sum(x is not None for x in (delay_ms, at, cron)) != 1:
+            raise ValueError("Specify exactly one of delay_ms, at or cron")
+        self._validate_id(relay_id)
+        if delay_ms is not None:
+            if delay_ms < 0:
+                raise ValueError("delay_ms must not be negative")
+            return self._add(relay_id, state, time.monotonic() + delay_ms / 1000.0, "delayed")
+        if at is not None:
+            return self._add(relay_id, state, time.monotonic() + (at - time.time()), "delayed")
+        spec = CronSpec(cron)
+        fire_at, deadline = self._next_cron(spec, time.time())
+        return self._add(relay_id, state, deadline, "recurring", spec, fire_at)
+
+    def switch_off_after(self, relay_id: int, delay_ms: float) -> int:
+        """Safety switch-off (max on time) in `delay_ms`, applied apart from ordinary jobs."""
+        self._validate_id(relay_id)
+        return self._add(relay_id, False, time.monotonic() + delay_ms / 1000.0, "max_on")
+
+    def cancel(self, job_id: int) -> bool:
+        with self._cond:
+            return self._jobs.pop(job_id, None) is not None
+
+    def list_jobs(self) -> List[Dict]:
+        offset = time.time() - time.monotonic()
+        with self._cond:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.deadline)
+        return [job.to_dict(offset) for job in jobs]
+
+    def _validate_id(self, relay_id: int):
+        if relay_id not in self.relay_controller.status:
+            raise ValueError("Invalid relay ID")
+
+    @staticmethod
+    def _next_cron(spec: CronSpec, after: float):
+        """(wall time, monotonic deadline) of the first cron match after wall time `after`."""
+        fire_at = spec.next_after(datetime.fromtimestamp(after)).timestamp()
+        return fire_at, time.monotonic() + (fire_at - time.time())
+
+    def _add(self, relay_id, state, deadline, kind, cron=None, fire_at=None) -> int:
+        with self._cond:
+            job = ScheduledJob(next(self._ids), relay_id, state, deadline, kind, cron)
+            job.fire_at = fire_at
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (deadline, job.id))
+            if self._heap[0][1] == job.id:
+                self._cond.notify()
+        return job.id
+
+    def _pop_due(self) -> List[ScheduledJob]:
+        """Wait for the earliest deadline and return every job due by then (None when stopping)."""
+        with self._cond:
+            while self._running:
+                while self._heap and self._heap[0][1] not in self._jobs:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now + self.merge_window:
+                    _, job_id = heapq.heappop(self._heap)
+                    job = self._jobs.get(job_id)
+                    if job is None:
+                        continue
+                    due.append(job)
+                    if job.cron:
+                        # From the minute just fired, so clock skew can't fire it twice in one minute
+                        job.fire_at, job.deadline = self._next_cron(job.cron, job.fire_at)
+                        heapq.heappush(self._heap, (job.deadline, job.id))
+                    else:
+                        del self._jobs[job_id]
+                return due
+            return None
+
+    def _run(self):
+        while True:
+            due = self._pop_due()
+            if due is None:
+                return
+            self._fire([job for job in due if job.kind == "max_on"])
+            self._fire([job for job in due if job.kind != "max_on"])
+
+    def _fire(self, jobs: List[ScheduledJob]):
+        if not jobs:
+            return
+        states = {}
+        for job in jobs:
+            states[job.relay_id] = job.state
+        try:
+            self.relay_controller.apply(states, source="scheduler")
+        except Exception as e:
+            if len(jobs) == 1:
+                self._log_failure(jobs[0], e)
+            else:
+                self._apply_each(jobs)
+
+    def _apply_each(self, jobs: List[ScheduledJob]):
+        """Apply jobs one at a time, in deadline order, so only the failing ones are lost."""
+        for job in jobs:
+            try:
+                self.relay_controller.apply({job.relay_id: job.state}, source="scheduler")
+            except Exception as e:
+                self._log_failure(job, e)
+
+    def _log_failure(self, job: ScheduledJob, error: Exception):
+        self.logger.error("Scheduled job %s (relay %s %s) failed: %s", job.id, job.relay_id,
+                          "ON" if job.state else "OFF", error,
+                          extra={"event": "schedule_failed", "job": job.id, "relay": job.relay_id})
@@ -0,0 +1,216 @@
+import io
+import queue
+import socket
+import threading
+import time
+from typing import Any, Dict
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+SERVER_MODES = ("development", "threaded", "waitress")
+
+
+class _BodyReader(io.RawIOBase):
+    """The request body: at most `length` bytes of `stream`, so the next request stays unread."""
+
+    def __init__(self, stream, length: int):
+        self._stream = stream
+        self._left = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._stream.read(size) if size else b""
+        self._left -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._stream.readline(size) if size else b""
+        self._left -= len(data)
+        return data
+
+    def discard(self):
+        while self._left and self.read(65536):
+            pass
+
+
+def _always_readable() -> socket.socket:
+    """A socket whose peer is closed, so it always polls readable (at EOF)."""
+    ready, peer = socket.socketpair()
+    peer.close()
+    return ready
+
+
+class _FencedConnection:
+    """The client socket as seen by Werkzeug's post-response drain.
+
+    The drain waits up to 10 ms for the socket to turn readable; pointing it at an
+    always-readable socket makes it read the fenced body to its end at once instead.
+    """
+
+    _ready = None
+
+    def __init__(self, connection):
+        self._connection = connection
+        if _FencedConnection._ready is None:
+            _FencedConnection._ready = _always_readable()
+
+    def fileno(self):
+        return self._ready.fileno()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    """Werkzeug handler that keeps HTTP/1.1 connections open between requests.
+
+    Werkzeug always answers `Connection: close` because after a response it drains
+    whatever the socket still holds, which would swallow the next request. Here the
+    request body is fenced to its Content-Length, so the drain stops at the body (without
+    its 10 ms wait) and the connection can serve another request. Chunked uploads, HTTP/1.0 clients and requests
+    that arrive while other connections wait for a worker still get `Connection: close`.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this, Nagle holds the body
+        # back until the client's delayed ACK on every reused connection
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def run_wsgi(self):
+        length = self.headers.get("Content-Length", "0")
+        self._keep_alive = (self.request_version == "HTTP/1.1" and not self.close_connection
+                            and "Transfer-Encoding" not in self.headers and length.isdigit()
+                            and self.server.accepting_keep_alive())
+        if not self._keep_alive:
+            return super().run_wsgi()
+        stream, connection = self.rfile, self.connection
+        self.rfile = body = _BodyReader(stream, int(length))
+        self.connection = _FencedConnection(connection)
+        try:
+            super().run_wsgi()
+            body.discard()
+        finally:
+            self.rfile, self.connection = stream, connection
+
+    def send_header(self, keyword, value):
+        if getattr(self, "_keep_alive", False) and keyword.lower() == "connection" and value.lower() == "close":
+            return
+        super().send_header(keyword, value)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server that hands connections to a fixed-size worker pool.
+
+    At most `workers + queue_depth` connections are in flight; beyond that the accept
+    loop stops and further clients wait in the listen backlog (also `queue_depth`).
+    An idle keep-alive connection holds its worker for up to `keep_alive` seconds, so
+    connections are only kept open while no other connection is waiting for a worker.
+
+    Workers are daemon threads: a connection stuck in a stream cannot keep the process
+    alive, and `server_close` waits at most `close_timeout` seconds for them.
+    """
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, workers: int = 8, keep_alive: float = 5.0,
+                 queue_depth: int = 64, close_timeout: float = 2.0):
+        self.request_queue_size = queue_depth
+        handler = type("KeepAliveHandler", (_KeepAliveHandler,), {"timeout": keep_alive})
+        super().__init__(host, port, app, handler=handler)
+        self.close_timeout = close_timeout
+        self._connections = queue.Queue()
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name=f"api-worker_{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        if self._closed:
+            self._slots.release()
+            self.shutdown_request(request)
+            return
+        self._connections.put((request, client_address))
+
+    def accepting_keep_alive(self) -> bool:
+        return not self._closed and self._connections.empty()
+
+    def _work(self):
+        while True:
+            item = self._connections.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._closed = True
+        # Drop connections still waiting for a worker
+        while True:
+            try:
+                item = self._connections.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self.shutdown_request(item[0])
+                self._slots.release()
+        for _ in self._workers:
+            self._connections.put(None)
+        deadline = time.monotonic() + self.close_timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+
+def serve(app, api_cfg: Dict[str, Any], logger):
+    """Run the API with the backend selected by `api.server` until the process exits.
+
+    SIGINT/SIGTERM still go through main.graceful_shutdown, whose sys.exit unwinds
+    out of the serving loop here.
+    """
+    mode = api_cfg.get('server', 'development')
+    host, port = api_cfg['host'], api_cfg['port']
+    workers = api_cfg.get('workers', 8)
+    keep_alive = api_cfg.get('keep_alive', 5)
+    queue_depth = api_cfg.get('queue_depth', 64)
+
+    if mode not in SERVER_MODES:
+        raise ValueError(f"Unknown api.server mode: {mode}")
+    logger.info("Starting API server (%s) on %s:%s", mode, host, port)
+
+    if mode == "development":
+        app.run(host=host, port=port)
+    elif mode == "threaded":
+        server = PooledWSGIServer(host, port, app, workers, keep_alive, queue_depth)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    else:
+        try:
+            import waitress
+        except ImportError:
+            raise ImportError("api.server 'waitress' requires the waitress package: pip install waitress")
+        waitress.serve(app, host=host, port=port, threads=workers, channel_timeout=keep_alive,
+                       backlog=queue_depth, connection_limit=workers + queue_depth)
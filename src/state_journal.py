@@ -0,0 +1,165 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+MAGIC = b"RLYJ"
+FORMAT_VERSION = 1
+RESTORE_POLICIES = ("restore", "all_off", "default")
+
+_HEADER = struct.Struct("<4sBH")
+_RECORD_HEAD = struct.Struct("<Qd")
+_CRC = struct.Struct("<I")
+
+
+class StateJournal:
+    """Append-only binary journal of full relay-state snapshots.
+
+    Layout: a header (magic, format version, relay count, relay ids) followed by
+    fixed-size records of sequence number, timestamp, state bitmask and CRC32.
+    The newest record with a valid CRC wins, so a torn final write is simply
+    ignored on replay. Records are written by a background thread that only ever
+    writes the latest pending state, and the file is rewritten down to a single
+    record every `compact_after` records.
+    """
+
+    def __init__(self, path: str, relay_ids: Iterable[int], logger, compact_after: int = 1000,
+                 fsync: bool = True):
+        self.path = path
+        self.relay_ids: List[int] = list(relay_ids)
+        self.logger = logger
+        self.compact_after = compact_after
+        self.fsync = fsync
+        self._bit = {rid: 1 << i for i, rid in enumerate(self.relay_ids)}
+        self._mask_bytes = (len(self.relay_ids) + 7) // 8
+        self._record_size = _RECORD_HEAD.size + self._mask_bytes + _CRC.size
+        self._header = (_HEADER.pack(MAGIC, FORMAT_VERSION, len(self.relay_ids))
+                        + struct.pack(f"<{len(self.relay_ids)}H", *self.relay_ids))
+        self._mask = 0
+        self._seq = 0
+        self._pending = None
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self._file = None
+        self._records = 0
+
+    def load(self) -> Optional[Dict[int, bool]]:
+        """Latest journaled state, or None if the file is missing, foreign or has no valid record."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if not data.startswith(self._header):
+            self.logger.warning("Ignoring state journal %s: relay set or format differs", self.path)
+            return None
+        body = len(data) - len(self._header)
+        for offset in range(len(self._header) + (body // self._record_size - 1) * self._record_size,
+                            len(self._header) - 1, -self._record_size):
+            record = data[offset:offset + self._record_size]
+            payload, (crc,) = record[:-_CRC.size], _CRC.unpack(record[-_CRC.size:])
+            if zlib.crc32(payload) != crc:
+                continue
+            self._seq, _ = _RECORD_HEAD.unpack_from(payload)
+            mask = int.from_bytes(payload[_RECORD_HEAD.size:], "little")
+            return {rid: bool(mask & bit) for rid, bit in self._bit.items()}
+        return None
+
+    def start(self, state: Dict[int, bool]):
+        """Compact the file down to `state` and start the background writer."""
+        self._mask = self._to_mask(state)
+        self._compact(self._mask)
+        self._thread = threading.Thread(target=self._run, name="StateJournal", daemon=True)
+        self._thread.start()
+
+    def record(self, changes: Dict[int, bool], version: int = None):
+        """RelayController listener: fold `changes` in and hand the snapshot to the writer."""
+        mask = self._mask
+        for rid, state in changes.items():
+            bit = self._bit.get(rid)
+            if bit is None:
+                continue
+            mask = mask | bit if state else mask & ~bit
+        self._mask = mask
+        with self._cond:
+            self._pending = mask
+            self._cond.notify()
+
+    def close(self):
+        """Write any pending state and stop the writer."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _to_mask(self, state: Dict[int, bool]) -> int:
+        mask = 0
+        for rid, bit in self._bit.items():
+            if state.get(rid):
+                mask |= bit
+        return mask
+
+    def _encode(self, mask: int) -> bytes:
+        self._seq += 1
+        payload = _RECORD_HEAD.pack(self._seq, time.time()) + mask.to_bytes(self._mask_bytes, "little")
+        return payload + _CRC.pack(zlib.crc32(payload))
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _compact(self, mask: int):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._header + self._encode(mask))
+            self._sync(f)
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "ab")
+        self._records = 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopping:
+                    self._cond.wait()
+                mask, self._pending = self._pending, None
+                stopping = self._stopping
+            try:
+                if mask is not None:
+                    # A failed compaction leaves no open file; start over from a fresh one
+                    if self._file is None or self._records >= self.compact_after:
+                        self._compact(mask)
+                    else:
+                        self._file.write(self._encode(mask))
+                        self._sync(self._file)
+                        self._records += 1
+            except Exception as e:
+                self.logger.error("State journal write failed: %s", e)
+            if stopping:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+
+def initial_state(policy: str, relay_ids: Iterable[int], journaled: Optional[Dict[int, bool]],
+                  defaults: Optional[Dict[int, bool]] = None) -> Dict[int, bool]:
+    """Boot state per restore policy; relays missing from the journal/defaults start OFF."""
+    if policy not in RESTORE_POLICIES:
+        raise ValueError(f"Unknown restore policy: {policy}")
+    defaults = defaults or {}
+    if policy == "all_off":
+        return {rid: False for rid in relay_ids}
+    if policy == "restore" and journaled is not None:
+        return {rid: journaled.get(rid, bool(defaults.get(rid, False))) for rid in relay_ids}
+    return {rid: bool(defaults.get(rid, False)) for rid in relay_ids}
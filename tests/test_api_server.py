@@ -25,22 +25,64 @@ system:
 import unittest
 import tempfile
 import os
-from src.api_server import init_api
+from src.api_server import init_api, shutdown_api
 from src.relay_controller import RelayController
 from src.config_manager import ConfigManager
 from src.logger import setup_logger
+from src.relay_history import RelayHistory
+from src.relay_bank import RelayBank
+from src.relay_rules import RelayRules
 
 class MockRelayController:
     def __init__(self):
         self.status = {1: False, 2: False, 3: False, 4: False}
-    def turn_on(self, relay_id): self.status[relay_id] = True
-    def turn_off(self, relay_id): self.status[relay_id] = False
+        self.history = RelayHistory(self.status)
+        self.bank = RelayBank({1: 31, 2: 33, 3: 35, 4: 37})
+        self.rules = RelayRules(self.bank, interlocks=[[1, 2]], groups={"pumps": [3, 4]})
+        self.listeners = []
+        self.healthy = True
+        self.version = 0
+        self.on_wait = None
+    def add_listener(self, callback): self.listeners.append(callback)
+    def mask(self):
+        return sum(1 << (rid - 1) for rid, state in self.status.items() if state)
+    def turn_on(self, relay_id):
+        self.rules.check(self.mask(), 1 << (relay_id - 1), 0)
+        self.status[relay_id] = True
+        self.version += 1
+        for callback in self.listeners: callback({relay_id: True}, 1)
+    def turn_off(self, relay_id):
+        self.status[relay_id] = False
+        self.version += 1
     def turn_all_on(self):
         for rid in self.status: self.status[rid] = True
     def turn_all_off(self):
         for rid in self.status: self.status[rid] = False
+    def apply(self, states):
+        for rid in states:
+            if rid not in self.status: raise ValueError("Invalid relay ID")
+        self.status.update(states)
+        return [{"id": rid, "state": "ON" if s else "OFF"} for rid, s in states.items()]
     def get_status(self):
         return [{"id": rid, "state": "ON" if self.status[rid] else "OFF"} for rid in self.status]
+    def health(self):
+        return {"healthy": self.healthy, "gpio": self.healthy, "command_thread": True, "last_reconcile_age": None}
+    def get_mask_hex(self):
+        return hex(sum(1 << (rid - 1) for rid, state in self.status.items() if state))
+    def set_mask(self, mask, value):
+        mask = int(mask, 16) if isinstance(mask, str) else mask
+        if mask >> 4: raise ValueError("Relay mask out of range")
+        for rid in self.status:
+            if mask >> (rid - 1) & 1: self.status[rid] = value
+    def get_status_json(self):
+        import json
+        return json.dumps({"relays": self.get_status()}).encode()
+    def get_versioned_status_json(self):
+        return self.version, self.get_status_json()
+    def wait_for_change(self, version, timeout):
+        self.waited = timeout
+        if self.on_wait: self.on_wait()
+        return self.version
 
 class ApiServerTestCase(unittest.TestCase):
     def setUp(self):
@@ -49,7 +91,9 @@ class ApiServerTestCase(unittest.TestCase):
         config = ConfigManager(config_path)
         logger = setup_logger("TestAPI", "DEBUG")
         relay_ctrl = MockRelayController()
+        self.relay_ctrl = relay_ctrl
         self.app = init_api(relay_ctrl, config, logger)
+        self.addCleanup(shutdown_api)
         self.app.config['TESTING'] = True
         self.client = self.app.test_client()
 
@@ -60,6 +104,240 @@ class ApiServerTestCase(unittest.TestCase):
         resp = self.client.post("/relay/1/off")
         self.assertEqual(resp.status_code, 200)
 
+    def test_relay_status(self):
+        self.client.post("/relay/2/on")
+        resp = self.client.get("/relay/status")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["relays"][1], {"id": 2, "state": "ON"})
+
+    def test_relay_events_stream(self):
+        resp = self.client.get("/relay/events")
+        self.assertEqual(resp.mimetype, "text/event-stream")
+        stream = resp.response
+        self.assertTrue(next(stream).startswith(b"event: snapshot\ndata: {\"relays\""))
+        self.client.post("/relay/3/on")
+        self.assertIn(b'data: {"v":1,"r":{"3":1}}', next(stream))
+        resp.close()
+
+    def test_relay_pulse_and_schedule(self):
+        resp = self.client.post("/relay/2/pulse", json={"duration_ms": 60000})
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.post("/schedule", json={"relay": 1, "action": "on", "cron": "0 6 * * *"})
+        self.assertEqual(resp.status_code, 201)
+        job_id = resp.json["job"]
+        jobs = self.client.get("/schedule").json["jobs"]
+        self.assertIn(job_id, [job["id"] for job in jobs])
+        self.assertEqual(self.client.delete(f"/schedule/{job_id}").status_code, 200)
+        self.assertEqual(self.client.delete(f"/schedule/{job_id}").status_code, 404)
+        resp = self.client.post("/schedule", json={"relay": 9, "action": "on", "delay_ms": 10})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_relay_mask(self):
+        resp = self.client.post("/relay/mask", json={"mask": "0x5", "state": "ON"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.client.get("/relay/mask").json, {"mask": "0x5"})
+        resp = self.client.post("/relay/mask", json={"mask": "0x1f", "state": "ON"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_system_health(self):
+        resp = self.client.get("/system/health")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["status"], "healthy")
+        self.relay_ctrl.healthy = False
+        resp = self.client.get("/system/health")
+        self.assertEqual(resp.status_code, 503)
+        self.assertFalse(resp.json["checks"]["gpio"])
+
+    def test_metrics(self):
+        self.client.post("/relay/1/on")
+        body = self.client.get("/metrics").get_data(as_text=True)
+        self.assertIn('relay_http_requests_total{route="/relay/<int:relay_id>/on",method="POST",status="200"}', body)
+        self.assertIn('relay_http_request_duration_seconds_bucket{route="/relay/<int:relay_id>/on",le="+Inf"}', body)
+        self.assertIn("process_resident_memory_bytes", body)
+
+    def test_relay_batch(self):
+        resp = self.client.post("/relay/batch", json={"relays": {"1": "ON", "3": True, "4": "off"}})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["relays"], [
+            {"id": 1, "state": "ON"}, {"id": 3, "state": "ON"}, {"id": 4, "state": "OFF"}])
+        resp = self.client.post("/relay/batch", json={"relays": {"1": "ON", "9": "ON"}})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post("/relay/batch", json={"relays": {"1": "maybe"}})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_relay_history_and_stats(self):
+        self.relay_ctrl.history.record({2: True}, "api")
+        self.relay_ctrl.history.record({1: True}, "scheduler")
+        resp = self.client.get("/relay/history?id=2")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([(e["id"], e["state"], e["source"]) for e in resp.json["events"]], [(2, "ON", "api")])
+        self.assertEqual([e["id"] for e in self.client.get("/relay/history?since=0").json["events"]], [1, 2])
+        self.assertEqual([e["id"] for e in self.client.get("/relay/history?order=asc").json["events"]], [2, 1])
+        self.assertEqual(self.client.get("/relay/history?order=up").status_code, 400)
+        self.assertEqual(self.client.get("/relay/history?until=0").json["events"], [])
+        self.assertEqual(self.client.get("/relay/history?since=yesterday").status_code, 400)
+        stats = self.client.get("/relay/2/stats").json
+        self.assertEqual((stats["state"], stats["transitions"]), ("ON", 1))
+        self.assertEqual(self.client.get("/relay/9/stats").status_code, 404)
+
+    def test_groups_and_interlock_violation(self):
+        resp = self.client.post("/group/pumps/on")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["relays"], [3, 4])
+        self.assertTrue(self.relay_ctrl.status[3] and self.relay_ctrl.status[4])
+        self.assertEqual(self.client.post("/group/fans/on").status_code, 404)
+        self.client.post("/relay/1/on")
+        resp = self.client.post("/relay/2/on")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json["rule"], "interlock")
+        self.assertEqual(resp.json["conflicts"], [1])
+        self.assertFalse(self.relay_ctrl.status[2])
+
+    def test_event_stream_subscribers_are_capped(self):
+        import threading
+        import src.api_server
+        src.api_server.sse_slots = threading.BoundedSemaphore(1)
+        first = self.client.get("/relay/events", buffered=False)
+        self.assertEqual(first.status_code, 200)
+        resp = self.client.get("/relay/events")
+        self.assertEqual(resp.status_code, 503)
+        self.assertIn("Retry-After", resp.headers)
+        # Closing the stream frees the slot
+        first.close()
+        second = self.client.get("/relay/events", buffered=False)
+        self.assertEqual(second.status_code, 200)
+        second.close()
+
+    def test_request_id_header(self):
+        resp = self.client.get("/relay/status")
+        first = resp.headers["X-Request-Id"]
+        self.assertNotEqual(self.client.get("/relay/status").headers["X-Request-Id"], first)
+        resp = self.client.post("/relay/1/on", headers={"X-Request-Id": "abc-123"})
+        self.assertEqual(resp.headers["X-Request-Id"], "abc-123")
+
+    def test_system_version(self):
+        resp = self.client.get("/system/version")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["version"], "1.0.0")
+        self.assertIn("build_date", resp.json)
+
+    def test_idempotent_retry_is_replayed(self):
+        calls = []
+        self.relay_ctrl.turn_on = lambda rid: calls.append(rid)
+        headers = {"Idempotency-Key": "abc-1"}
+        first = self.client.post("/relay/2/on", headers=headers)
+        retry = self.client.post("/relay/2/on", headers=headers)
+        self.assertEqual(calls, [2])
+        self.assertEqual(retry.get_data(), first.get_data())
+        self.assertEqual(retry.headers["Idempotent-Replay"], "true")
+        # Same key for another command is rejected
+        self.assertEqual(self.client.post("/relay/3/on", headers=headers).status_code, 422)
+        # Client sequence numbers work as keys too
+        seq = {"X-Client-Id": "gui", "X-Client-Seq": "7"}
+        self.client.post("/relay/1/on", headers=seq)
+        self.client.post("/relay/1/on", headers=seq)
+        self.client.post("/relay/1/on")
+        self.assertEqual(calls, [2, 1, 1])
+
+    def test_status_etag_and_not_modified(self):
+        first = self.client.get("/relay/status")
+        etag = first.headers["ETag"]
+        resp = self.client.get("/relay/status", headers={"If-None-Match": etag})
+        self.assertEqual((resp.status_code, resp.get_data()), (304, b""))
+        self.assertEqual(resp.headers["ETag"], etag)
+        self.client.post("/relay/1/on")
+        resp = self.client.get("/relay/status", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        for path in ("/system/version", "/system/health"):
+            tag = self.client.get(path).headers["ETag"]
+            self.assertEqual(self.client.get(path, headers={"If-None-Match": tag}).status_code, 304)
+
+    def test_status_long_poll(self):
+        etag = self.client.get("/relay/status").headers["ETag"]
+        # Nothing changes before the timeout: 304
+        resp = self.client.get(f"/relay/status?wait={etag}&timeout=0.1")
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(self.relay_ctrl.waited, 0.1)
+        self.assertEqual(self.client.get(f"/relay/status?wait={etag}&timeout=nan").status_code, 400)
+        self.assertEqual(self.client.get(f"/relay/status?wait={etag}&timeout=inf").status_code, 400)
+        # A change while waiting: the new state
+        self.relay_ctrl.on_wait = lambda: self.relay_ctrl.turn_on(3)
+        resp = self.client.get(f"/relay/status?wait={etag}&timeout=999")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["relays"][2], {"id": 3, "state": "ON"})
+        self.assertEqual(self.relay_ctrl.waited, 60)
+        # A stale tag answers at once
+        self.relay_ctrl.waited = None
+        self.assertEqual(self.client.get(f"/relay/status?wait={etag}").status_code, 200)
+        self.assertIsNone(self.relay_ctrl.waited)
+
+    def test_own_scheduler_is_stopped(self):
+        import src.api_server
+        first = src.api_server.scheduler
+        init_api(self.relay_ctrl, ConfigManager(self.config_path), setup_logger("TestAPI", "DEBUG"))
+        self.assertIsNone(first._thread)
+        second = src.api_server.scheduler
+        self.assertIsNotNone(second._thread)
+        shutdown_api()
+        self.assertIsNone(second._thread)
+
+    def test_long_poll_limit(self):
+        import threading
+        import src.api_server
+        src.api_server.long_polls = threading.BoundedSemaphore(1)
+        src.api_server.long_polls.acquire()
+        etag = self.client.get("/relay/status").headers["ETag"]
+        resp = self.client.get(f"/relay/status?wait={etag}")
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers["Retry-After"], "1")
+
+    def test_rate_limits_and_write_slots(self):
+        import threading
+        import src.api_server
+        from src.rate_limiter import RateLimiter
+        src.api_server.limits = {'relay': RateLimiter(rate=0.01, burst=2), 'read': RateLimiter(rate=0.01, burst=1)}
+        self.assertEqual(self.client.post("/relay/1/on").status_code, 200)
+        self.assertEqual(self.client.post("/relay/1/off").status_code, 200)
+        resp = self.client.post("/relay/1/on")
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp.json["message"], "Rate limit exceeded (relay)")
+        self.assertGreaterEqual(int(resp.headers["Retry-After"]), 1)
+        # Budgets are per relay and per route class
+        self.assertEqual(self.client.post("/relay/2/on").status_code, 200)
+        self.assertEqual(self.client.get("/relay/status").status_code, 200)
+        self.assertEqual(self.client.get("/relay/mask").status_code, 429)
+        # Health and metrics are never limited
+        self.assertEqual(self.client.get("/system/health").status_code, 200)
+        # Multi-relay writes charge every relay they switch, all or nothing
+        src.api_server.limits = {'relay': RateLimiter(rate=0.01, burst=1)}
+        self.assertEqual(self.client.post("/group/pumps/on").status_code, 200)
+        self.assertEqual(self.client.post("/relay/batch", json={"relays": {"3": "OFF", "2": "OFF"}}).status_code, 429)
+        self.assertEqual(self.client.post("/relay/mask", json={"mask": "0xA", "state": "OFF"}).status_code, 429)
+        self.assertEqual(self.client.post("/relay/2/off").status_code, 200)
+        # Commands that change nothing cost nothing, and all-off is never refused
+        for _ in range(3):
+            self.assertEqual(self.client.post("/relay/2/off").status_code, 200)
+            self.assertEqual(self.client.post("/group/pumps/on").status_code, 200)
+        self.assertEqual(self.client.post("/relay/all/off").status_code, 200)
+        self.assertEqual(self.client.post("/relay/batch", json={}).status_code, 400)
+        # Trusted clients (gateways, load generators) skip the per-client budget
+        src.api_server.limits = {'client': RateLimiter(rate=0.01, burst=1)}
+        self.assertEqual(self.client.get("/relay/mask").status_code, 200)
+        self.assertEqual(self.client.get("/relay/mask").status_code, 429)
+        src.api_server.trusted_clients = frozenset({"127.0.0.1"})
+        self.assertEqual(self.client.get("/relay/mask").status_code, 200)
+        src.api_server.trusted_clients = frozenset()
+        src.api_server.limits = {}
+        src.api_server.write_slots = threading.BoundedSemaphore(1)
+        src.api_server.write_slots.acquire()
+        self.assertEqual(self.client.post("/relay/3/on").status_code, 429)
+        self.assertEqual(self.client.get("/relay/mask").status_code, 200)
+        src.api_server.write_slots.release()
+        self.assertEqual(self.client.post("/relay/3/on").status_code, 200)
+        # The slot is released after the request
+        self.assertEqual(self.client.post("/relay/3/off").status_code, 200)
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,87 @@
+import socket
+import unittest
+from src import binary_protocol as bp
+from src.gpio_backend import SimulatedBackend
+from src.relay_controller import RelayController
+
+
+class MockLogger:
+    def info(self, msg, *args, **kwargs): pass
+    def warning(self, msg, *args, **kwargs): pass
+    def error(self, msg, *args, **kwargs): pass
+
+
+class CommandDispatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.relay_controller = RelayController({1: 31, 2: 33, 3: 35, 4: 37}, MockLogger(),
+                                                backend=SimulatedBackend())
+        self.dispatcher = bp.CommandDispatcher(self.relay_controller, MockLogger())
+
+    def tearDown(self):
+        self.relay_controller.cleanup()
+
+    def send(self, action, seq, arg=0):
+        return bp.decode_ack(self.dispatcher.handle(bp.encode_command(action, seq, arg)))
+
+    def test_relay_on_off(self):
+        self.assertEqual(self.send(bp.ON, 7, 2), (bp.OK, 7, 0b0010))
+        self.assertTrue(self.relay_controller.status[2])
+        self.assertEqual(self.send(bp.OFF, 8, 2), (bp.OK, 8, 0))
+
+    def test_mask_and_all(self):
+        self.assertEqual(self.send(bp.MASK_ON, 1, 0b0101), (bp.OK, 1, 0b0101))
+        self.assertEqual(self.send(bp.MASK_OFF, 2, 0b0001), (bp.OK, 2, 0b0100))
+        self.assertEqual(self.send(bp.ALL_ON, 3), (bp.OK, 3, 0b1111))
+        self.assertEqual(self.send(bp.ALL_OFF, 4), (bp.OK, 4, 0))
+        self.assertEqual(self.send(bp.STATUS, 5), (bp.OK, 5, 0))
+
+    def test_errors(self):
+        self.assertEqual(self.send(bp.ON, 1, 9)[0], bp.INVALID)
+        self.assertEqual(self.send(bp.MASK_ON, 2, 0b10000)[0], bp.INVALID)
+        self.assertEqual(self.send(99, 3)[0], bp.BAD_ACTION)
+        ack = self.dispatcher.handle(b"XX" + bp.encode_command(bp.ON, 4, 1)[2:])
+        self.assertEqual(bp.decode_ack(ack)[0], bp.BAD_FRAME)
+        self.assertFalse(self.relay_controller.status[1])
+
+    def test_banks_over_64_relays_are_refused(self):
+        ctrl = RelayController({rid: 100 + rid for rid in range(1, 66)}, MockLogger(), backend=SimulatedBackend())
+        self.addCleanup(ctrl.cleanup)
+        with self.assertRaises(ValueError):
+            bp.CommandDispatcher(ctrl, MockLogger())
+        with self.assertRaises(ValueError):
+            bp.BinaryProtocolServer(ctrl, MockLogger(), "127.0.0.1", tcp_port=0)
+
+
+class BinaryProtocolServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.relay_controller = RelayController({1: 31, 2: 33}, MockLogger(), backend=SimulatedBackend())
+        self.server = bp.BinaryProtocolServer(self.relay_controller, MockLogger(), "127.0.0.1",
+                                              tcp_port=0, udp_port=0)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.relay_controller.cleanup()
+
+    def test_udp_frame(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(5)
+            sock.sendto(bp.encode_command(bp.MASK_ON, 42, 0b11), self.server.udp_address)
+            self.assertEqual(bp.decode_ack(sock.recv(64)), (bp.OK, 42, 0b11))
+            sock.sendto(b"short", self.server.udp_address)
+            self.assertEqual(bp.decode_ack(sock.recv(64))[0], bp.BAD_FRAME)
+
+    def test_pipelined_tcp_frames(self):
+        with socket.create_connection(self.server.tcp_address, timeout=5) as sock:
+            sock.sendall(b"".join(bp.encode_command(bp.ON if i % 2 else bp.OFF, i, 1) for i in range(100)))
+            data = b""
+            while len(data) < 100 * bp.FRAME_SIZE:
+                data += sock.recv(65536)
+        acks = [bp.decode_ack(data[i:i + bp.FRAME_SIZE]) for i in range(0, len(data), bp.FRAME_SIZE)]
+        self.assertEqual([seq for _, seq, _ in acks], list(range(100)))
+        self.assertTrue(all(status == bp.OK for status, _, _ in acks))
+        self.assertTrue(self.relay_controller.status[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import threading
+import unittest
+from src.command_executor import CommandExecutor
+
+
+class CommandExecutorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.executor = CommandExecutor()
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_commands_run_in_order_on_one_thread(self):
+        seen = []
+        futures = [self.executor.submit(lambda i=i: seen.append((i, threading.current_thread().name)))
+                   for i in range(100)]
+        for f in futures:
+            f.result()
+        self.assertEqual([i for i, _ in seen], list(range(100)))
+        self.assertEqual({name for _, name in seen}, {"RelayCommands"})
+
+    def test_call_returns_result_and_raises_errors(self):
+        self.assertEqual(self.executor.call(lambda a, b: a + b, 2, 3), 5)
+        with self.assertRaises(ValueError):
+            self.executor.call(int, "x")
+
+    def test_nested_call_runs_inline(self):
+        self.assertEqual(self.executor.call(lambda: self.executor.call(lambda: 42)), 42)
+
+    def test_submit_after_shutdown_raises(self):
+        self.executor.shutdown()
+        with self.assertRaises(RuntimeError):
+            self.executor.submit(lambda: None)
+        with self.assertRaises(RuntimeError):
+            self.executor.call(lambda: None)
+        self.executor.shutdown()
+
+    def test_shutdown_finishes_queued_commands_and_rejects_new_ones(self):
+        release = threading.Event()
+        first = self.executor.submit(release.wait)
+        queued = self.executor.submit(lambda: 42)
+        stopper = threading.Thread(target=self.executor.shutdown)
+        stopper.start()
+        while not self.executor._stopped:
+            pass
+        with self.assertRaises(RuntimeError):
+            self.executor.submit(lambda: None)
+        release.set()
+        stopper.join(timeout=1)
+        self.assertFalse(stopper.is_alive())
+        self.assertTrue(first.result(timeout=1))
+        self.assertEqual(queued.result(timeout=1), 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
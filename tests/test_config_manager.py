@@ -3,6 +3,8 @@ import unittest
 from src.config_manager import ConfigManager
 import os
 import tempfile
+import time
+from unittest import mock
 import yaml
 
 
@@ -34,6 +36,105 @@ class ConfigManagerTestCase(unittest.TestCase):
             ConfigManager(path)
         os.remove(path)
 
+    def test_snapshot_is_typed_and_frozen(self):
+        config_data = {
+            'api': {'host': '0.0.0.0', 'port': 5000},
+            'relays': {'pins': {1: 31, 2: 33}, 'reconcile_interval': 5},
+            'logging': {'level': 'debug', 'async': True},
+            'system': {'version': '1.2.3'}
+        }
+        path = make_config_file(config_data)
+        version_file = make_text_file("Version: 1.2.3\nBuild date: 2024-01-01\n")
+        snapshot = ConfigManager(path, version_file).snapshot
+        self.assertEqual(dict(snapshot.relays.pins), {1: 31, 2: 33})
+        self.assertEqual(snapshot.relays.reconcile_interval, 5)
+        self.assertEqual(snapshot.logging.level, 'DEBUG')
+        self.assertTrue(snapshot.logging.async_mode)
+        self.assertEqual((snapshot.logging.format, snapshot.logging.sample), ('text', None))
+        self.assertEqual((snapshot.version, snapshot.build_date), ('1.2.3', '2024-01-01'))
+        with self.assertRaises(TypeError):
+            snapshot.sections['api']['port'] = 1
+        with self.assertRaises(AttributeError):
+            snapshot.version = '2'
+        os.remove(path)
+        os.remove(version_file)
+
+    def test_invalid_pins_and_level(self):
+        base = {'api': {}, 'logging': {}, 'system': {}}
+        for relays, logging_cfg in (({'pins': {1: 31, 2: 31}}, {}), ({'pins': {1: 31}}, {'level': 'LOUD'}),
+                                    ({'pins': {1: 31}}, {'format': 'xml'})):
+            path = make_config_file(dict(base, relays=relays, logging=logging_cfg))
+            with self.assertRaises(ValueError):
+                ConfigManager(path)
+            os.remove(path)
+
+    def test_reload_swaps_snapshot_and_keeps_old_on_error(self):
+        config_data = {'api': {}, 'relays': {'pins': {1: 31}}, 'logging': {'level': 'INFO'}, 'system': {}}
+        path = make_config_file(config_data)
+        cfg = ConfigManager(path)
+        seen = []
+        cfg.add_listener(lambda old, new: seen.append((old.logging.level, new.logging.level)))
+        config_data['logging']['level'] = 'DEBUG'
+        write_config_file(path, config_data)
+        self.assertTrue(cfg.reload())
+        self.assertEqual(seen, [('INFO', 'DEBUG')])
+        with open(path, 'w') as f:
+            f.write("api: [unclosed")
+        self.assertFalse(cfg.reload())
+        self.assertEqual(cfg.snapshot.logging.level, 'DEBUG')
+        os.remove(path)
+
+    def test_watch_reloads_on_change(self):
+        config_data = {'api': {}, 'relays': {'pins': {1: 31}}, 'logging': {}, 'system': {}}
+        path = make_config_file(config_data)
+        cfg = ConfigManager(path)
+        cfg.watch(0.01)
+        config_data['relays']['pins'] = {1: 33}
+        write_config_file(path, config_data)
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        deadline = time.time() + 2
+        while cfg.snapshot.relays.pins[1] != 33 and time.time() < deadline:
+            time.sleep(0.01)
+        cfg.stop_watching()
+        self.assertEqual(cfg.snapshot.relays.pins[1], 33)
+        os.remove(path)
+
+    def test_config_cache_skips_parse_until_file_changes(self):
+        config_data = {'api': {'port': 5000}, 'relays': {'pins': {1: 31}}, 'logging': {}, 'system': {}}
+        path = make_config_file(config_data)
+        cache = path + '.cache'
+        ConfigManager(path, cache_path=cache)
+        self.assertTrue(os.path.exists(cache))
+        with mock.patch('yaml.safe_load', side_effect=AssertionError("parsed despite cache")):
+            cfg = ConfigManager(path, cache_path=cache)
+        self.assertEqual(cfg.get('api', 'port'), 5000)
+        config_data['api']['port'] = 6000
+        write_config_file(path, config_data)
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        self.assertEqual(ConfigManager(path, cache_path=cache).get('api', 'port'), 6000)
+        os.remove(path)
+        os.remove(cache)
+
+    def test_corrupt_config_cache_is_ignored(self):
+        config_data = {'api': {'port': 5000}, 'relays': {'pins': {1: 31}}, 'logging': {}, 'system': {}}
+        path = make_config_file(config_data)
+        cache = make_text_file("not marshal data")
+        self.assertEqual(ConfigManager(path, cache_path=cache).get('api', 'port'), 5000)
+        os.remove(path)
+        os.remove(cache)
+
+
+def write_config_file(path, data):
+    with open(path, 'w') as f:
+        yaml.dump(data, f)
+
+
+def make_text_file(text):
+    tmp = tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.txt')
+    tmp.write(text)
+    tmp.close()
+    return tmp.name
+
 
 def make_config_file(data):
     tmp = tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.yaml')
@@ -0,0 +1,35 @@
+import unittest
+from src.event_stream import EventBroadcaster
+
+
+class EventBroadcasterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.events = EventBroadcaster(lambda: b'{"relays":[]}', buffer_size=4, heartbeat=0.01)
+
+    def test_subscribers_share_deltas(self):
+        first, second = self.events.stream(), self.events.stream()
+        next(first), next(second)
+        self.events.publish({1: True}, 1)
+        self.events.publish({2: False}, 2)
+        for stream in (first, second):
+            chunk = next(stream)
+            self.assertIn(b'data: {"v":1,"r":{"1":1}}', chunk)
+            self.assertIn(b'data: {"v":2,"r":{"2":0}}', chunk)
+
+    def test_heartbeat_and_close(self):
+        stream = self.events.stream()
+        next(stream)
+        self.assertEqual(next(stream), b": keep-alive\n\n")
+        self.events.close()
+        self.assertEqual(list(stream), [])
+
+    def test_slow_subscriber_gets_resync(self):
+        stream = self.events.stream()
+        next(stream)
+        for version in range(1, 7):
+            self.events.publish({1: version % 2 == 1}, version)
+        self.assertEqual(next(stream), b"event: resync\ndata: {}\n\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
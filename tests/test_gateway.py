@@ -0,0 +1,111 @@
+import time
+import unittest
+from src.gateway import Fleet, NodeClient, init_gateway
+from src.logger import setup_logger
+
+
+class FakeResponse:
+    def __init__(self, code, data, headers=None):
+        self.status_code = code
+        self._data = data
+        self.text = str(data)
+        self.headers = headers or {}
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+    def request(self, method, url, json=None, headers=None, timeout=None):
+        self.calls.append((method, url, json))
+        self.headers = headers
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("connection refused")
+        if url.endswith('/relay/status'):
+            if (headers or {}).get('If-None-Match') == '"b-7"':
+                return FakeResponse(304, None, {"ETag": '"b-7"'})
+            return FakeResponse(200, {"relays": [{"id": 1, "state": "ON"}]}, {"ETag": '"b-7"'})
+        if url.endswith('/relay/2/on'):
+            return FakeResponse(429, {"status": "error"}, {"Retry-After": "3"})
+        if url.endswith('/relay/9/on'):
+            return FakeResponse(400, {"status": "error", "message": "Invalid relay ID"})
+        return FakeResponse(200, {"status": "success"})
+    def close(self): pass
+
+
+class GatewayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sessions = {f"pi-{i:02d}": FakeSession(delay=0.1) for i in range(50)}
+        nodes = {name: NodeClient(name, f"http://{name}:5000", 0.5, 0.5, session=session)
+                 for name, session in self.sessions.items()}
+        self.fleet = Fleet(nodes, fanout_timeout=0.5, workers=64)
+        app = init_gateway(self.fleet, setup_logger("TestGateway", "CRITICAL", console=False))
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.fleet.shutdown()
+
+    def test_fleet_status_is_parallel(self):
+        start = time.monotonic()
+        resp = self.client.get("/fleet/status")
+        elapsed = time.monotonic() - start
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json["nodes"]), 50)
+        self.assertTrue(all(node["online"] for node in resp.json["nodes"].values()))
+        self.assertLess(elapsed, 1.0)
+
+    def test_fanout_pool_covers_every_node(self):
+        fleet = Fleet(self.fleet.nodes, fanout_timeout=0.5, workers=4)
+        self.addCleanup(fleet.shutdown)
+        start = time.monotonic()
+        results = fleet.fan_out('GET', '/relay/status')
+        self.assertTrue(all(result["ok"] for result in results.values()))
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_offline_node_reports_cached_status(self):
+        self.client.get("/fleet/status")
+        self.sessions["pi-03"].fail = True
+        self.sessions["pi-04"].delay = 2.0
+        nodes = self.client.get("/fleet/status").json["nodes"]
+        self.assertFalse(nodes["pi-03"]["online"])
+        self.assertEqual(nodes["pi-03"]["relays"], [{"id": 1, "state": "ON"}])
+        self.assertEqual(nodes["pi-04"]["error"], "timeout")
+        self.assertTrue(nodes["pi-05"]["online"])
+
+    def test_node_namespaced_command(self):
+        resp = self.client.post("/node/pi-07/relay/1/on")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.sessions["pi-07"].calls[-1], ("POST", "http://pi-07:5000/relay/1/on", None))
+        self.assertEqual(self.client.post("/node/pi-07/relay/9/on").status_code, 400)
+        self.assertEqual(self.client.post("/node/nope/relay/1/on").status_code, 404)
+
+    def test_node_forwarding_keeps_query_and_headers(self):
+        session = self.sessions["pi-07"]
+        self.client.post("/node/pi-07/relay/1/on", headers={"Idempotency-Key": "k1", "X-Client-Id": "gui",
+                                                             "X-Client-Seq": "4", "Cookie": "x"})
+        self.assertEqual(session.headers, {"Idempotency-Key": "k1", "X-Client-Id": "gui", "X-Client-Seq": "4"})
+        resp = self.client.post("/node/pi-07/relay/2/on")
+        self.assertEqual((resp.status_code, resp.headers["Retry-After"]), (429, "3"))
+        self.client.get("/node/pi-07/relay/history?relay=1&limit=5")
+        self.assertEqual(session.calls[-1][1], "http://pi-07:5000/relay/history?relay=1&limit=5")
+        resp = self.client.get("/node/pi-07/relay/status")
+        self.assertEqual((resp.status_code, resp.headers["ETag"]), (200, '"b-7"'))
+        resp = self.client.get("/node/pi-07/relay/status", headers={"If-None-Match": '"b-7"'})
+        self.assertEqual((resp.status_code, resp.data), (304, b""))
+        self.assertEqual(self.fleet.nodes["pi-07"].last_status, {"relays": [{"id": 1, "state": "ON"}]})
+
+    def test_fleet_command_reports_partial_failure(self):
+        self.sessions["pi-01"].fail = True
+        resp = self.client.post("/fleet/relay/batch", json={"relays": {"1": "ON"}})
+        self.assertEqual(resp.status_code, 207)
+        self.assertFalse(resp.json["nodes"]["pi-01"]["ok"])
+        self.assertEqual(self.sessions["pi-02"].calls[-1][2], {"relays": {"1": "ON"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
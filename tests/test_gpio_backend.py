@@ -0,0 +1,86 @@
+import unittest
+from src.gpio_backend import (MCP23017Backend, PCF8574Backend, RPiGPIOBackend, SimulatedBackend,
+                              create_backend)
+from src.relay_controller import RelayController
+
+
+class MockLogger:
+    def info(self, msg, *args, **kwargs): pass
+    def warning(self, msg, *args, **kwargs): pass
+    def error(self, msg, *args, **kwargs): pass
+
+
+class FakeSMBus:
+    def __init__(self):
+        self.writes = []
+        self.registers = {}
+    def write_i2c_block_data(self, address, register, data):
+        self.writes.append((address, register, list(data)))
+        for i, value in enumerate(data):
+            self.registers[register + i] = value
+    def read_i2c_block_data(self, address, register, length):
+        return [self.registers.get(register - 2 + i, 0) for i in range(length)]
+    def write_byte(self, address, value):
+        self.writes.append((address, None, [value]))
+        self.registers[None] = value
+    def read_byte(self, address):
+        return self.registers.get(None, 0xFF)
+    def close(self): pass
+
+
+class GPIOBackendTestCase(unittest.TestCase):
+    def test_mcp23017_bank_write_is_one_transaction(self):
+        bus = FakeSMBus()
+        backend = MCP23017Backend(address=0x21, smbus=bus)
+        pin_map = {rid: rid - 1 for rid in range(1, 17)}
+        ctrl = RelayController(pin_map, MockLogger(), backend=backend)
+        bus.writes.clear()
+        ctrl.turn_all_on()
+        self.assertEqual(bus.writes, [(0x21, MCP23017Backend.OLATA, [0xFF, 0xFF])])
+        ctrl.apply({1: False, 16: False})
+        self.assertEqual(bus.writes[-1], (0x21, MCP23017Backend.OLATA, [0xFE, 0x7F]))
+        self.assertEqual(len(bus.writes), 2)
+        ctrl.cleanup()
+
+    def test_mcp23017_configures_relay_pins_as_outputs(self):
+        bus = FakeSMBus()
+        MCP23017Backend(smbus=bus).setup([0, 9], [True, False])
+        self.assertEqual(bus.writes[0], (0x20, MCP23017Backend.IODIRA, [0xFE, 0xFD]))
+        self.assertEqual(bus.writes[1], (0x20, MCP23017Backend.OLATA, [0x01, 0x00]))
+
+    def test_pcf8574_keeps_unused_pins_high(self):
+        bus = FakeSMBus()
+        backend = PCF8574Backend(smbus=bus)
+        backend.setup([0, 1], [False, False])
+        self.assertEqual(bus.writes[-1][2], [0xFC])
+        backend.write_many([(0, True), (1, True)])
+        self.assertEqual(bus.writes[-1][2], [0xFF])
+        self.assertEqual(backend.read_many([0, 1]), [True, True])
+        with self.assertRaises(ValueError):
+            backend.setup([8], [True])
+
+    def test_simulator_counts_transactions(self):
+        backend = SimulatedBackend(write_latency_us=10, transaction_latency_us=50)
+        ctrl = RelayController({rid: 100 + rid for rid in range(1, 33)}, MockLogger(), backend=backend)
+        ctrl.turn_all_on()
+        self.assertEqual((backend.writes, backend.transactions), (32, 1))
+        self.assertEqual(ctrl.reconcile(), {})
+        ctrl.cleanup()
+
+    def test_simulator_charges_every_pin(self):
+        backend = SimulatedBackend(write_latency_us=10, transaction_latency_us=50)
+        delays = []
+        backend._delay = delays.append
+        backend.write(1, True)
+        backend.write_many([(pin, True) for pin in range(1, 33)])
+        self.assertEqual([round(d * 1e6) for d in delays], [60, 370])
+
+    def test_create_backend(self):
+        self.assertIsInstance(create_backend({}), RPiGPIOBackend)
+        self.assertIsInstance(create_backend({'backend': 'simulator', 'write_latency_us': 5}), SimulatedBackend)
+        with self.assertRaises(ValueError):
+            create_backend({'backend': 'parallel-port'})
+
+
+if __name__ == "__main__":
+    unittest.main()
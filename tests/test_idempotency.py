@@ -0,0 +1,49 @@
+import threading
+import time
+import unittest
+from src.idempotency import IdempotencyCache
+
+
+class IdempotencyCacheTestCase(unittest.TestCase):
+    def test_replay_returns_stored_result(self):
+        cache = IdempotencyCache()
+        self.assertIsNone(cache.begin("k", "POST /relay/1/on"))
+        cache.finish("k", (b"ok", 200, "application/json"))
+        self.assertEqual(cache.begin("k", "POST /relay/1/on"), (b"ok", 200, "application/json"))
+        with self.assertRaises(ValueError):
+            cache.begin("k", "POST /relay/2/on")
+
+    def test_lru_eviction_and_ttl(self):
+        cache = IdempotencyCache(capacity=2, ttl=0.05)
+        for key in ("a", "b"):
+            cache.begin(key, "f")
+            cache.finish(key, key)
+        cache.begin("a", "f")  # refresh a
+        cache.begin("c", "f")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.begin("a", "f"), "a")
+        self.assertIsNone(cache.begin("b", "f"))
+        time.sleep(0.06)
+        self.assertIsNone(cache.begin("a", "f"))
+
+    def test_concurrent_duplicate_waits_for_first(self):
+        cache = IdempotencyCache()
+        cache.begin("k", "f")
+        results = []
+        t = threading.Thread(target=lambda: results.append(cache.begin("k", "f")))
+        t.start()
+        time.sleep(0.02)
+        self.assertEqual(results, [])
+        cache.finish("k", "done")
+        t.join()
+        self.assertEqual(results, ["done"])
+
+    def test_discard_allows_rerun(self):
+        cache = IdempotencyCache()
+        cache.begin("k", "f")
+        cache.discard("k")
+        self.assertIsNone(cache.begin("k", "f"))
+
+
+if __name__ == "__main__":
+    unittest.main()
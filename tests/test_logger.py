@@ -3,7 +3,8 @@ import unittest
 import logging
 import tempfile
 import os
-from src.logger import setup_logger
+import json
+from src.logger import DedupFilter, DroppingQueueHandler, dropped_records, setup_logger, shutdown_logger
 
 class LoggerTestCase(unittest.TestCase):
     def test_logger_setup(self):
@@ -24,5 +25,129 @@ class LoggerTestCase(unittest.TestCase):
                 logger.removeHandler(handler)
             logging.shutdown()
 
+    def test_repeated_setup_does_not_duplicate_handlers(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            setup_logger("TestRepeat", "INFO", log_file, console=False)
+            logger = setup_logger("TestRepeat", "INFO", log_file, console=False)
+            self.assertEqual(len(logger.handlers), 1)
+            logger.info("once")
+            shutdown_logger("TestRepeat")
+            with open(log_file) as f:
+                self.assertEqual(f.read().count("once"), 1)
+
+    def test_async_mode_writes_from_background_thread(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            logger = setup_logger("TestAsync", "INFO", log_file, console=False, async_mode=True)
+            self.assertIsInstance(logger.handlers[0], DroppingQueueHandler)
+            for i in range(500):
+                logger.info("record %d", i)
+            shutdown_logger("TestAsync")
+            with open(log_file) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(len(lines), 500)
+            self.assertTrue(lines[-1].endswith("record 499"))
+
+    def test_async_mode_drops_when_queue_full(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            logger = setup_logger("TestFull", "INFO", log_file, console=False, async_mode=True, queue_size=1)
+            handler = logger.handlers[0]
+            for i in range(2000):
+                logger.info("record %d", i)
+            shutdown_logger("TestFull")
+            self.assertGreater(handler.dropped, 0)
+
+    def test_dropped_total_survives_reconfiguration(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            before = dropped_records()
+            logger = setup_logger("TestDropTotal", "INFO", log_file, console=False, async_mode=True, queue_size=1)
+            handler = logger.handlers[0]
+            for i in range(2000):
+                logger.info("record %d", i)
+            dropped = dropped_records()
+            self.assertEqual(dropped, before + handler.dropped)
+            setup_logger("TestDropTotal", "INFO", log_file, console=False, async_mode=True)
+            self.assertEqual(dropped_records(), dropped)
+            shutdown_logger("TestDropTotal")
+            self.assertEqual(dropped_records(), dropped)
+
+    def test_size_based_rotation(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            logger = setup_logger("TestRotate", "INFO", log_file, console=False, max_bytes=1024, backup_count=2)
+            for i in range(200):
+                logger.info("rotating record %d", i)
+            shutdown_logger("TestRotate")
+            self.assertTrue(os.path.exists(log_file + ".1"))
+            self.assertFalse(os.path.exists(log_file + ".3"))
+            self.assertLessEqual(os.path.getsize(log_file), 1024)
+
+    def test_json_format_with_structured_fields(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            logger = setup_logger("TestJson", "INFO", log_file, console=False, async_mode=True,
+                                  log_format="json")
+            logger.info("Relay %s ON", 3, extra={"event": "relay_switch", "relay": 3, "action": "on"})
+            try:
+                raise RuntimeError("boom")
+            except RuntimeError:
+                logger.exception("failed")
+            shutdown_logger("TestJson")
+            with open(log_file) as f:
+                first, second = [json.loads(line) for line in f]
+            self.assertEqual(first["msg"], "Relay 3 ON")
+            self.assertEqual((first["level"], first["logger"]), ("INFO", "TestJson"))
+            self.assertEqual((first["event"], first["relay"], first["action"]), ("relay_switch", 3, "on"))
+            self.assertNotIn("args", first)
+            self.assertIn("RuntimeError: boom", second["exc"])
+        with self.assertRaises(ValueError):
+            setup_logger("TestJson", "INFO", console=False, log_format="xml")
+
+    def test_sampling_keeps_fraction_of_event(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            logger = setup_logger("TestSample", "INFO", log_file, console=False,
+                                  sample={"relay_switch": 0.1})
+            for i in range(100):
+                logger.info("switch %d", i, extra={"event": "relay_switch"})
+                logger.info("other %d", i)
+            logger.warning("relay failed", extra={"event": "relay_switch"})
+            shutdown_logger("TestSample")
+            with open(log_file) as f:
+                content = f.read()
+            self.assertEqual(content.count("switch "), 10)
+            self.assertEqual(content.count("other "), 100)
+            self.assertIn("relay failed", content)
+            # Filters are replaced, not stacked, by a new setup
+            self.assertEqual(logging.getLogger("TestSample").filters, [])
+
+    def test_dedup_suppresses_repeated_errors(self):
+        clock = [0.0]
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            log_file = os.path.join(tmpdirname, "test.log")
+            logger = setup_logger("TestDedup", "INFO", log_file, console=False, dedup_window=10)
+            logger.filters[0].clock = lambda: clock[0]
+            self.assertIsInstance(logger.filters[0], DedupFilter)
+            for i in range(50):
+                logger.error("Error reading relay pins: %s", f"errno {i}", extra={"dedup_key": "read"})
+                logger.warning("Relay %s drifted", i % 2)
+                logger.info("poll %d", i)
+            clock[0] = 11.0
+            logger.error("Error reading relay pins: %s", "errno 99", extra={"dedup_key": "read"})
+            logger.error("Another error")
+            shutdown_logger("TestDedup")
+            with open(log_file) as f:
+                lines = f.read().splitlines()
+            errors = [line for line in lines if "Error reading" in line]
+            self.assertEqual(len(errors), 2)
+            self.assertTrue(errors[0].endswith("errno 0"))
+            self.assertTrue(errors[1].endswith("errno 99 (49 similar suppressed)"))
+            self.assertEqual(sum("poll" in line for line in lines), 50)
+            self.assertEqual([line[-9:] for line in lines if "drifted" in line], ["0 drifted", "1 drifted"])
+            self.assertTrue(lines[-1].endswith("Another error"))
+
 if __name__ == "__main__":
     unittest.main()
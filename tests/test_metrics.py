@@ -0,0 +1,63 @@
+import sys
+import threading
+import timeit
+import unittest
+from src.metrics import Histogram, MetricsRegistry
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_render(self):
+        family = self.registry.counter("test_total", "Test counter.", ["relay"])
+        family.labels("1").inc()
+        family.labels(relay="1").inc(2)
+        body = self.registry.render()
+        self.assertIn("# TYPE test_total counter", body)
+        self.assertIn('test_total{relay="1"} 3', body)
+
+    def test_histogram_buckets_are_cumulative(self):
+        family = self.registry.histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            family.observe(value)
+        body = self.registry.render()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', body)
+        self.assertIn('test_seconds_bucket{le="1.0"} 3', body)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 4', body)
+        self.assertIn("test_seconds_count 4", body)
+
+    def test_collected_metric(self):
+        self.registry.collected("test_depth", "Test gauge.", lambda: 7)
+        self.assertIn("test_depth 7", self.registry.render())
+
+    def test_concurrent_increments_are_not_lost(self):
+        counter = self.registry.counter("test_concurrent_total", "Test counter.")
+        histogram = self.registry.histogram("test_concurrent_seconds", "Test histogram.", buckets=(1.0,))
+        def work():
+            for _ in range(20000):
+                counter.inc()
+                histogram.observe(0.5)
+        # Switch threads as often as possible to expose lost updates
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+        body = self.registry.render()
+        self.assertIn("test_concurrent_total 80000", body)
+        self.assertIn("test_concurrent_seconds_count 80000", body)
+
+    def test_observe_is_cheap(self):
+        histogram = Histogram((0.001, 0.01, 0.1))
+        per_call = min(timeit.repeat(lambda: histogram.observe(0.005), number=10000, repeat=3)) / 10000
+        self.assertLess(per_call, 5e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
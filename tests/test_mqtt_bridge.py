@@ -0,0 +1,140 @@
+import json
+import time
+import unittest
+from src.gpio_backend import SimulatedBackend
+from src.mqtt_bridge import MqttBridge
+from src.relay_controller import RelayController
+from src.relay_rules import RelayRules
+from src.relay_bank import RelayBank
+
+
+class MockLogger:
+    def info(self, msg, *args, **kwargs): pass
+    def warning(self, msg, *args, **kwargs): pass
+    def error(self, msg, *args, **kwargs): pass
+
+
+class FakeMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakeClient:
+    """In-process stand-in for paho's Client: records publishes, delivers messages directly."""
+
+    def __init__(self):
+        self.published = []
+        self.subscriptions = []
+        self.will = None
+        self.connected = False
+
+    def will_set(self, topic, payload, qos=0, retain=False):
+        self.will = (topic, payload, retain)
+
+    def reconnect_delay_set(self, min_delay, max_delay):
+        self.delays = (min_delay, max_delay)
+
+    def username_pw_set(self, username, password):
+        pass
+
+    def connect_async(self, host, port, keepalive):
+        pass
+
+    def loop_start(self):
+        self.connect()
+
+    def loop_stop(self):
+        pass
+
+    def connect(self, rc=0):
+        self.connected = rc == 0
+        self.on_connect(self, None, {}, rc)
+
+    def disconnect(self):
+        self.connected = False
+        self.on_disconnect(self, None, 0)
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append(topic)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, payload, retain))
+
+    def deliver(self, topic, payload):
+        self.on_message(self, None, FakeMessage(topic, payload.encode()))
+
+
+class MqttBridgeTestCase(unittest.TestCase):
+    def setUp(self):
+        pins = {1: 31, 2: 33, 3: 35}
+        rules = RelayRules(RelayBank(pins), interlocks=[[1, 2]])
+        self.relay_controller = RelayController(pins, MockLogger(), backend=SimulatedBackend(), rules=rules)
+        self.client = FakeClient()
+        self.bridge = MqttBridge(self.relay_controller, MockLogger(), "lab", publish_interval_ms=20,
+                                 client=self.client)
+        self.bridge.start()
+
+    def tearDown(self):
+        self.bridge.stop()
+        self.relay_controller.cleanup()
+
+    def wait_published(self, count, timeout=2.0):
+        deadline = time.time() + timeout
+        while len(self.client.published) < count and time.time() < deadline:
+            time.sleep(0.005)
+        time.sleep(0.05)
+        return self.client.published
+
+    def test_connect_subscribes_and_publishes_full_state(self):
+        self.assertEqual(self.client.subscriptions, ["relays/lab/+/set"])
+        self.assertEqual(self.client.will, ("relays/lab/availability", "offline", True))
+        self.assertEqual(self.client.published, [
+            ("relays/lab/1/state", "OFF", True), ("relays/lab/2/state", "OFF", True),
+            ("relays/lab/3/state", "OFF", True), ("relays/lab/availability", "online", True)])
+
+    def test_commands_switch_relays_and_publish_changes(self):
+        self.client.published.clear()
+        self.client.deliver("relays/lab/1/set", "ON")
+        self.assertTrue(self.relay_controller.status[1])
+        self.assertEqual(self.wait_published(1), [("relays/lab/1/state", "ON", True)])
+        self.client.deliver("relays/lab/1/set", "on")
+        time.sleep(0.05)
+        self.assertEqual(len(self.client.published), 1)
+        self.client.deliver("relays/lab/all/set", "0")
+        self.assertEqual(self.wait_published(2)[1:], [("relays/lab/1/state", "OFF", True)])
+        history = self.relay_controller.history.query()
+        self.assertEqual({e["source"] for e in history}, {"mqtt"})
+
+    def test_burst_publishes_net_changes_once(self):
+        self.client.published.clear()
+        for _ in range(5):
+            self.client.deliver("relays/lab/3/set", "ON")
+            self.client.deliver("relays/lab/3/set", "OFF")
+        self.client.deliver("relays/lab/2/set", "true")
+        self.assertEqual(self.wait_published(1), [("relays/lab/2/state", "ON", True)])
+
+    def test_rejected_commands_publish_error(self):
+        self.client.published.clear()
+        self.client.deliver("relays/lab/1/set", "ON")
+        self.client.deliver("relays/lab/2/set", "ON")
+        self.client.deliver("relays/lab/9/set", "ON")
+        self.client.deliver("relays/lab/3/set", "maybe")
+        errors = {t: json.loads(p) for t, p, _ in self.client.published if t.endswith("/error")}
+        self.assertEqual(errors["relays/lab/2/error"]["rule"], "interlock")
+        self.assertIn("Invalid relay ID", errors["relays/lab/9/error"]["message"])
+        self.assertIn("Invalid payload", errors["relays/lab/3/error"]["message"])
+        self.assertFalse(self.relay_controller.status[2])
+
+    def test_reconnect_republishes_state_after_offline_changes(self):
+        self.client.disconnect()
+        self.relay_controller.turn_on(3)
+        time.sleep(0.05)
+        self.client.published.clear()
+        self.client.connect()
+        self.assertIn(("relays/lab/3/state", "ON", True), self.client.published)
+        self.assertEqual(self.client.published[-1], ("relays/lab/availability", "online", True))
+
+
+if __name__ == "__main__":
+    unittest.main()
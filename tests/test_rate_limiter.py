@@ -0,0 +1,58 @@
+import unittest
+from src.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(rate=2, burst=3, clock=self.clock)
+
+    def test_burst_then_refill(self):
+        self.assertEqual([self.limiter.acquire("a") for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(self.limiter.acquire("a"), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(self.limiter.acquire("a"), 0)
+        self.assertAlmostEqual(self.limiter.acquire("a"), 0.5)
+        # Other keys have their own bucket
+        self.assertEqual(self.limiter.acquire("b"), 0)
+
+    def test_refill_is_capped_at_burst(self):
+        self.limiter.acquire("a")
+        self.clock.now += 60
+        self.assertEqual([self.limiter.acquire("a") for _ in range(3)], [0, 0, 0])
+        self.assertGreater(self.limiter.acquire("a"), 0)
+
+    def test_idle_keys_are_evicted(self):
+        for key in range(100):
+            self.limiter.acquire(key)
+        self.assertEqual(len(self.limiter), 100)
+        # burst / rate = 1.5 s idle refills a bucket completely
+        self.clock.now += 1.5
+        self.limiter.acquire("fresh")
+        self.assertEqual(len(self.limiter), 1)
+
+    def test_max_keys_bounds_memory(self):
+        limiter = RateLimiter(rate=1, burst=1, max_keys=10, clock=self.clock)
+        for key in range(1000):
+            limiter.acquire(key)
+        self.assertLessEqual(len(limiter), 10)
+
+    def test_from_config(self):
+        self.assertIsNone(RateLimiter.from_config(None))
+        self.assertIsNone(RateLimiter.from_config({'rate': 0}))
+        limiter = RateLimiter.from_config({'rate': 5, 'burst': 10})
+        self.assertEqual((limiter.rate, limiter.burst), (5.0, 10.0))
+        with self.assertRaises(ValueError):
+            RateLimiter(rate=-1, burst=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
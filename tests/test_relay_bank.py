@@ -0,0 +1,35 @@
+import unittest
+from src.relay_bank import RelayBank
+
+
+class RelayBankTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bank = RelayBank({rid: 100 + rid for rid in range(1, 257)})
+
+    def test_layout(self):
+        self.assertEqual(len(self.bank), 256)
+        self.assertEqual(self.bank.bit[1], 1)
+        self.assertEqual(self.bank.pins[255], 356)
+        self.assertEqual(self.bank.all_mask, (1 << 256) - 1)
+
+    def test_state_conversions(self):
+        set_bits, clear_bits = self.bank.from_states({1: True, 3: False, 256: True})
+        self.assertEqual(set_bits, 1 | 1 << 255)
+        self.assertEqual(clear_bits, 1 << 2)
+        self.assertEqual(list(self.bank.indices(set_bits)), [0, 255])
+        self.assertEqual(self.bank.to_states(set_bits, set_bits | clear_bits), {1: True, 3: False, 256: True})
+        self.assertEqual(self.bank.to_list(set_bits)[:2], [{"id": 1, "state": "ON"}, {"id": 2, "state": "OFF"}])
+
+    def test_hex_round_trip(self):
+        mask = self.bank.mask_of([2, 200])
+        text = self.bank.to_hex(mask)
+        self.assertEqual(len(text), 2 + 64)
+        self.assertEqual(self.bank.parse_mask(text), mask)
+        with self.assertRaises(ValueError):
+            self.bank.parse_mask(1 << 256)
+        with self.assertRaises(ValueError):
+            self.bank.parse_mask("zz")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,15 @@
 
+import random
+import threading
+import time
 import unittest
 from src.relay_controller import RelayController
+from src.relay_bank import RelayBank
 
 class MockLogger:
-    def info(self, msg): pass
-    def error(self, msg): pass
+    def info(self, msg, *args, **kwargs): pass
+    def warning(self, msg, *args, **kwargs): pass
+    def error(self, msg, *args, **kwargs): pass
 
 class MockGPIO:
     BOARD = OUT = None
@@ -52,9 +57,207 @@ class RelayControllerTestCase(unittest.TestCase):
         self.assertEqual(status[1]['state'], 'ON')
         self.assertEqual(status[1]['id'], 2)
 
+    def test_apply_batch(self):
+        results = self.relay_controller.apply({1: True, 3: True, 4: False})
+        self.assertEqual(results, [{"id": 1, "state": "ON"}, {"id": 3, "state": "ON"}, {"id": 4, "state": "OFF"}])
+        self.assertEqual(self.relay_controller.status, {1: True, 2: False, 3: True, 4: False})
+
+    def test_apply_batch_invalid_id_writes_nothing(self):
+        with self.assertRaises(ValueError):
+            self.relay_controller.apply({1: True, 9: True})
+        self.assertFalse(self.relay_controller.status[1])
+
+    def test_status_served_from_cache(self):
+        first = self.relay_controller.get_status_json()
+        self.assertIs(self.relay_controller.get_status_json(), first)
+        self.relay_controller.turn_on(3)
+        self.assertIn(b'{"id":3,"state":"ON"}', self.relay_controller.get_status_json())
+
+    def test_wait_for_change(self):
+        version, payload = self.relay_controller.get_versioned_status_json()
+        self.assertIs(payload, self.relay_controller.get_status_json())
+        self.assertEqual(self.relay_controller.wait_for_change(version, 0.01), version)
+        timer = threading.Timer(0.05, self.relay_controller.turn_on, (2,))
+        timer.start()
+        start = time.monotonic()
+        self.assertEqual(self.relay_controller.wait_for_change(version, 5), version + 1)
+        self.assertLess(time.monotonic() - start, 2)
+        timer.join()
+
+    def test_release_waiters_ends_long_polls(self):
+        version = self.relay_controller.version
+        threading.Timer(0.05, self.relay_controller.release_waiters).start()
+        start = time.monotonic()
+        self.assertEqual(self.relay_controller.wait_for_change(version, 5), version)
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_reconcile_adopts_hardware_drift(self):
+        import src.relay_controller
+        src.relay_controller.GPIO.output(35, True)
+        self.assertEqual(self.relay_controller.reconcile(), {3: True})
+        self.assertTrue(self.relay_controller.status[3])
+        self.assertEqual(self.relay_controller.reconcile(), {})
+
+    def test_listeners_receive_changes_only(self):
+        seen = []
+        self.relay_controller.add_listener(lambda changes, version: seen.append(changes))
+        self.relay_controller.apply({1: True, 2: False})
+        self.relay_controller.turn_on(1)
+        self.relay_controller.turn_off(1)
+        self.assertEqual(seen, [{1: True}, {1: False}])
+
+    def test_status_is_read_only_snapshot(self):
+        before = self.relay_controller.status
+        self.relay_controller.turn_on(1)
+        self.assertFalse(before[1])
+        self.assertTrue(self.relay_controller.status[1])
+        with self.assertRaises(TypeError):
+            self.relay_controller.status[1] = False
+
+    def test_concurrent_mixed_commands_keep_state_consistent(self):
+        import src.relay_controller
+        gpio = src.relay_controller.GPIO
+        ctrl = self.relay_controller
+        versions = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            for _ in range(1000):
+                op = rng.randrange(5)
+                rid = rng.randint(1, 4)
+                if op == 0:
+                    ctrl.turn_on(rid)
+                elif op == 1:
+                    ctrl.turn_off(rid)
+                elif op == 2:
+                    ctrl.apply({r: rng.random() < 0.5 for r in (1, 2, 3, 4)})
+                elif op == 3:
+                    rng.choice((ctrl.turn_all_on, ctrl.turn_all_off))()
+                else:
+                    versions.append(ctrl.version)
+                    self.assertEqual(len(ctrl.get_status()), 4)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for rid, pin in ctrl.pin_map.items():
+            self.assertEqual(ctrl.status[rid], gpio.input(pin))
+        self.assertEqual(ctrl.reconcile(), {})
+
+    def test_initial_state_is_written_to_pins(self):
+        import src.relay_controller
+        ctrl = RelayController({1: 31, 2: 33}, MockLogger(), initial_state={2: True})
+        self.assertEqual(ctrl.status, {1: False, 2: True})
+        self.assertTrue(src.relay_controller.GPIO.input(33))
+
+    def test_set_mask(self):
+        import src.relay_controller
+        self.assertEqual(self.relay_controller.set_mask(0b1011, True), 0b1011)
+        self.assertEqual(self.relay_controller.status, {1: True, 2: True, 3: False, 4: True})
+        self.assertEqual(self.relay_controller.set_mask("0x3", False), 0b1000)
+        self.assertEqual(self.relay_controller.get_mask_hex(), "0x8")
+        self.assertTrue(src.relay_controller.GPIO.input(37))
+        self.assertFalse(src.relay_controller.GPIO.input(31))
+        with self.assertRaises(ValueError):
+            self.relay_controller.set_mask(0x10, True)
+
+    def test_health_reports_stale_reconcile(self):
+        self.assertTrue(self.relay_controller.health()["healthy"])
+        self.relay_controller.reconcile_interval = 0.001
+        self.relay_controller.last_reconcile = 0
+        self.assertFalse(self.relay_controller.health()["healthy"])
+        self.relay_controller.reconcile()
+        self.relay_controller.reconcile_interval = 60
+        self.assertTrue(self.relay_controller.health()["healthy"])
+
     def test_invalid_id(self):
         with self.assertRaises(ValueError):
             self.relay_controller.turn_on(5)
 
+    def test_transitions_recorded_with_source(self):
+        self.relay_controller.turn_on(1)
+        self.relay_controller.apply({1: True, 2: True}, source="scheduler")
+        self.relay_controller.set_mask(0b11, False, source="binary")
+        events = [(e["id"], e["state"], e["source"]) for e in self.relay_controller.history.query(order="asc")]
+        self.assertEqual(events, [(1, "ON", "api"), (2, "ON", "scheduler"), (1, "OFF", "binary"),
+                                  (2, "OFF", "binary")])
+        self.assertEqual(self.relay_controller.history.relay_stats(1)["transitions"], 2)
+
+    def test_rules_checked_before_writing(self):
+        import src.relay_controller
+        from src.relay_rules import RelayRules, RuleViolation
+        ctrl = RelayController({1: 31, 2: 33}, MockLogger(),
+                               rules=RelayRules(RelayBank({1: 31, 2: 33}), interlocks=[[1, 2]]))
+        ctrl.turn_on(1)
+        with self.assertRaises(RuleViolation):
+            ctrl.turn_on(2)
+        with self.assertRaises(RuleViolation):
+            ctrl.apply({2: True})
+        self.assertFalse(src.relay_controller.GPIO.input(33))
+        ctrl.apply({1: False, 2: True})
+        self.assertEqual(dict(ctrl.status), {1: False, 2: True})
+        ctrl.cleanup()
+
+    def test_remap_moves_relays_to_new_pins(self):
+        import src.relay_controller
+        gpio = src.relay_controller.GPIO
+        self.relay_controller.turn_on(2)
+        self.relay_controller.remap({1: 31, 2: 40, 3: 35, 4: 37})
+        self.assertTrue(gpio.input(40))
+        self.assertFalse(gpio.input(33))
+        self.relay_controller.turn_off(2)
+        self.assertFalse(gpio.input(40))
+        self.assertEqual(self.relay_controller.status[2], False)
+        with self.assertRaises(ValueError):
+            self.relay_controller.remap({1: 31, 2: 40})
+
+    def test_coalescing_writes_final_state_once(self):
+        from src.gpio_backend import SimulatedBackend
+        backend = SimulatedBackend()
+        ctrl = RelayController({1: 31, 2: 33}, MockLogger(), backend=backend, coalesce_ms=50)
+        changes = []
+        ctrl.add_listener(lambda c, v: changes.append(c))
+        commands = [(ctrl.turn_on, 1), (ctrl.turn_off, 1), (ctrl.turn_on, 1), (ctrl.turn_on, 2),
+                    (ctrl.turn_off, 2)]
+        threads = []
+        for fn, rid in commands:
+            threads.append(threading.Thread(target=fn, args=(rid,)))
+            threads[-1].start()
+            time.sleep(0.005)
+        for t in threads:
+            t.join()
+        self.assertEqual(ctrl.status, {1: True, 2: False})
+        self.assertEqual(backend.transactions, 1)
+        self.assertEqual(changes, [{1: True}])
+        with self.assertRaises(ValueError):
+            ctrl.turn_on(3)
+        ctrl.cleanup()
+
+    def test_coalesced_commands_are_checked_and_recorded_one_by_one(self):
+        from src.relay_rules import RelayRules, RuleViolation
+        pins = {1: 31, 2: 33, 3: 35}
+        ctrl = RelayController(pins, MockLogger(), coalesce_ms=50,
+                               rules=RelayRules(RelayBank(pins), interlocks=[[1, 2]]))
+        errors = {}
+        def run(rid, source):
+            try:
+                ctrl.turn_on(rid, source)
+            except RuleViolation as e:
+                errors[rid] = e.rule
+        threads = []
+        for rid, source in ((1, "api"), (2, "mqtt"), (3, "scheduler")):
+            threads.append(threading.Thread(target=run, args=(rid, source)))
+            threads[-1].start()
+            time.sleep(0.005)
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, {2: "interlock"})
+        self.assertEqual(ctrl.status, {1: True, 2: False, 3: True})
+        events = [(e["id"], e["source"]) for e in ctrl.history.query(order="asc")]
+        self.assertEqual(events, [(1, "api"), (3, "scheduler")])
+        ctrl.cleanup()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from src.relay_history import RelayHistory
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+
+class RelayHistoryTestCase(unittest.TestCase):
+    def test_ring_keeps_newest_and_queries_by_time(self):
+        clock = FakeClock()
+        history = RelayHistory([1, 2], capacity=4, clock=clock)
+        for i in range(6):
+            clock.now = 1000.0 + i
+            history.record({1 + i % 2: bool(i % 3)}, "api")
+        self.assertEqual(len(history), 4)
+        self.assertEqual([e["t"] for e in history.query()], [1005.0, 1004.0, 1003.0, 1002.0])
+        self.assertEqual([e["t"] for e in history.query(order="asc")], [1002.0, 1003.0, 1004.0, 1005.0])
+        self.assertEqual([e["t"] for e in history.query(since=1003, until=1005, order="asc")], [1003.0, 1004.0])
+        self.assertEqual([e["t"] for e in history.query(relay_id=2)], [1005.0, 1003.0])
+        self.assertEqual([e["t"] for e in history.query(limit=1)], [1005.0])
+        self.assertEqual([e["t"] for e in history.query(limit=1, order="asc")], [1002.0])
+        with self.assertRaises(ValueError):
+            history.query(order="random")
+
+    def test_timestamps_never_go_backwards(self):
+        clock = FakeClock()
+        history = RelayHistory([1], clock=clock)
+        history.record({1: True})
+        clock.now -= 5
+        history.record({1: False})
+        times = [e["t"] for e in history.query(order="asc")]
+        self.assertEqual(times, sorted(times))
+
+    def test_stats_are_incremental(self):
+        clock = FakeClock(0.0)
+        history = RelayHistory([1], clock=clock)
+        history.start({1: False})
+        clock.now = 10.0
+        history.record({1: True}, "scheduler")
+        clock.now = 15.0
+        history.record({1: False}, "scheduler")
+        clock.now = 20.0
+        history.record({1: True}, "scheduler")
+        clock.now = 25.0
+        stats = history.relay_stats(1)
+        self.assertEqual(stats["transitions"], 3)
+        self.assertEqual(stats["on_seconds"], 10.0)
+        self.assertEqual(stats["duty_cycle"], 0.4)
+        self.assertEqual(stats["state"], "ON")
+        with self.assertRaises(ValueError):
+            history.relay_stats(2)
+
+    def test_spilled_records_stay_queryable(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "history.seg")
+            clock = FakeClock()
+            history = RelayHistory([1], capacity=2, spill_file=path, spill_max_bytes=14 * 3, clock=clock)
+            for i in range(8):
+                clock.now = 1000.0 + i
+                history.record({1: bool(i % 2)}, "binary")
+            # Segments hold 3 records and one rotated segment is kept: 0-2 are gone, 3-5 spilled
+            events = history.query(since=1001, order="asc")
+            self.assertEqual([e["t"] for e in events], [1000.0 + i for i in range(3, 8)])
+            self.assertEqual(events[0]["source"], "binary")
+            self.assertTrue(os.path.exists(path + ".1"))
+            self.assertEqual([e["t"] for e in history.query()], [1000.0 + i for i in range(7, 2, -1)])
+            self.assertEqual([e["t"] for e in history.query(limit=4)], [1007.0, 1006.0, 1005.0, 1004.0])
+            self.assertEqual([e["t"] for e in history.query(until=1005, limit=2)], [1004.0, 1003.0])
+            self.assertEqual([e["t"] for e in history.query(since=1004, until=1006, order="asc")], [1004.0, 1005.0])
+            history.close()
+
+    def test_spill_rotation_waits_for_readers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "history.seg")
+            clock = FakeClock()
+            history = RelayHistory([1], capacity=1, spill_file=path, spill_max_bytes=14 * 2, clock=clock)
+            for i in range(2):
+                clock.now = 1000.0 + i
+                history.record({1: bool(i % 2)})
+            # A query reading the segments: recording goes on, rotation is put off
+            with history._spill_lock:
+                for i in range(2, 5):
+                    clock.now = 1000.0 + i
+                    history.record({1: bool(i % 2)})
+                self.assertFalse(os.path.exists(path + ".1"))
+            clock.now = 1005.0
+            history.record({1: False})
+            self.assertTrue(os.path.exists(path + ".1"))
+            self.assertEqual([e["t"] for e in history.query(order="asc")], [1000.0 + i for i in range(6)])
+            history.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
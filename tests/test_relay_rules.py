@@ -0,0 +1,76 @@
+import unittest
+from src.relay_bank import RelayBank
+from src.relay_rules import RelayRules, RuleViolation
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+    def __call__(self):
+        return self.now
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = {}
+        self.cancelled = []
+    def switch_off_after(self, relay_id, delay_ms):
+        job = len(self.jobs) + 1
+        self.jobs[job] = (relay_id, False, delay_ms)
+        return job
+    def cancel(self, job_id):
+        self.cancelled.append(job_id)
+        return True
+
+
+class RelayRulesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bank = RelayBank({1: 31, 2: 33, 3: 35, 4: 37})
+        self.clock = FakeClock()
+        self.rules = RelayRules(self.bank, interlocks=[[1, 2, 3]], groups={"pumps": [3, 4]},
+                                max_on_ms={4: 60000}, min_off_ms={4: 2000}, clock=self.clock)
+
+    def test_tables_compiled_per_bit(self):
+        self.assertEqual(self.rules.exclusive, [0b0110, 0b0101, 0b0011, 0])
+        self.assertEqual(self.rules.group("pumps"), 0b1100)
+        self.assertEqual(self.rules.constrained, 0b1111)
+        with self.assertRaises(KeyError):
+            self.rules.group("fans")
+
+    def test_interlock(self):
+        self.rules.check(0b0000, 0b0001, 0)
+        with self.assertRaises(RuleViolation) as ctx:
+            self.rules.check(0b0001, 0b0010, 0)
+        self.assertEqual(ctx.exception.to_dict()["conflicts"], [1])
+        # Switching the other relay off in the same command is allowed
+        self.rules.check(0b0001, 0b0010, 0b0001)
+        with self.assertRaises(RuleViolation):
+            self.rules.check(0, 0b0101, 0)
+
+    def test_min_off_time(self):
+        self.rules.check(0, 0b1000, 0)
+        self.rules.note(0b1000, 0)
+        self.clock.now += 0.5
+        with self.assertRaises(RuleViolation) as ctx:
+            self.rules.check(0, 0b1000, 0)
+        self.assertEqual(ctx.exception.rule, "min_off_time")
+        self.assertEqual(ctx.exception.details["retry_after_ms"], 1500)
+        self.clock.now += 1.5
+        self.rules.check(0, 0b1000, 0)
+
+    def test_max_on_time_scheduled_and_cancelled(self):
+        scheduler = FakeScheduler()
+        self.rules.enforce_max_on(scheduler, {1: False, 4: True})
+        self.assertEqual(scheduler.jobs, {1: (4, False, 60000)})
+        self.rules.on_change({4: False}, 2)
+        self.assertEqual(scheduler.cancelled, [1])
+        self.rules.on_change({1: True}, 3)
+        self.assertEqual(len(scheduler.jobs), 1)
+
+    def test_unknown_relay_in_config(self):
+        with self.assertRaises(ValueError):
+            RelayRules.from_config(self.bank, {"interlocks": [[1, 9]]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import heapq
+import threading
+import time
+import unittest
+from datetime import datetime
+from src.scheduler import CronSpec, RelayScheduler
+
+
+class MockLogger:
+    def info(self, msg, *args, **kwargs): pass
+    def error(self, msg, *args, **kwargs): pass
+
+
+class MockRelayController:
+    def __init__(self):
+        self.status = {1: False, 2: False, 3: False, 4: False}
+        self.calls = []
+        self.applied = threading.Event()
+        self.rejected = set()
+    def apply(self, states, source="api"):
+        self.calls.append((time.monotonic(), dict(states)))
+        if self.rejected & {rid for rid, state in states.items() if state}:
+            raise ValueError("rejected")
+        self.status.update(states)
+        self.applied.set()
+
+
+class RelaySchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ctrl = MockRelayController()
+        self.scheduler = RelayScheduler(self.ctrl, MockLogger())
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_pulse_turns_relay_on_then_off(self):
+        start = time.monotonic()
+        self.scheduler.pulse(3, 50)
+        self.assertTrue(self.ctrl.status[3])
+        self.ctrl.applied.clear()
+        self.assertTrue(self.ctrl.applied.wait(1))
+        fired_at, states = self.ctrl.calls[-1]
+        self.assertEqual(states, {3: False})
+        self.assertLess(abs((fired_at - start) - 0.050), 0.010)
+
+    def test_due_jobs_are_merged_and_cancel_works(self):
+        keep = self.scheduler.schedule(1, True, delay_ms=30)
+        self.scheduler.schedule(2, True, delay_ms=30)
+        dropped = self.scheduler.schedule(4, True, delay_ms=10)
+        self.assertTrue(self.scheduler.cancel(dropped))
+        self.assertFalse(self.scheduler.cancel(dropped))
+        self.assertEqual([job["id"] for job in self.scheduler.list_jobs()][0], keep)
+        self.assertTrue(self.ctrl.applied.wait(1))
+        time.sleep(0.02)
+        self.assertEqual([states for _, states in self.ctrl.calls], [{1: True, 2: True}])
+        self.assertEqual(self.scheduler.list_jobs(), [])
+
+    def test_failing_job_does_not_drop_the_rest_of_its_window(self):
+        self.ctrl.rejected = {2}
+        self.scheduler.schedule(2, True, delay_ms=30)
+        self.scheduler.schedule(1, True, delay_ms=30)
+        self.scheduler.schedule(3, True, delay_ms=30)
+        self.assertTrue(self.ctrl.applied.wait(1))
+        time.sleep(0.05)
+        self.assertEqual([states for _, states in self.ctrl.calls],
+                         [{2: True, 1: True, 3: True}, {2: True}, {1: True}, {3: True}])
+        self.assertEqual(self.ctrl.status, {1: True, 2: False, 3: True, 4: False})
+
+    def test_safety_switch_off_is_applied_on_its_own(self):
+        self.scheduler.merge_window = 0.05
+        self.scheduler.schedule(2, True, delay_ms=30)
+        self.scheduler.switch_off_after(1, 30)
+        self.assertTrue(self.ctrl.applied.wait(1))
+        time.sleep(0.05)
+        self.assertEqual([states for _, states in self.ctrl.calls], [{1: False}, {2: True}])
+        self.assertEqual(self.scheduler.list_jobs(), [])
+
+    def test_max_on_switch_off_survives_rule_violation_in_its_window(self):
+        from src.gpio_backend import SimulatedBackend
+        from src.relay_bank import RelayBank
+        from src.relay_controller import RelayController
+        from src.relay_rules import RelayRules
+        pins = {1: 31, 2: 33, 3: 35}
+        rules = RelayRules(RelayBank(pins), interlocks=[[2, 3]], max_on_ms={1: 50})
+        ctrl = RelayController(pins, MockLogger(), backend=SimulatedBackend(), rules=rules)
+        self.addCleanup(ctrl.cleanup)
+        scheduler = RelayScheduler(ctrl, MockLogger(), merge_window=0.05)
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        rules.enforce_max_on(scheduler, ctrl.status)
+        ctrl.add_listener(rules.on_change)
+        ctrl.turn_on(3)
+        ctrl.turn_on(1)
+        scheduler.schedule(2, True, delay_ms=50)
+        deadline = time.monotonic() + 1
+        while ctrl.status[1] and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(dict(ctrl.status), {1: False, 2: False, 3: True})
+
+    def test_cron_deadline_follows_the_minute_just_fired(self):
+        job_id = self.scheduler.schedule(1, True, cron="* * * * *")
+        # Fire early, as when the monotonic clock runs ahead of wall time: the wall clock
+        # has not reached the minute yet, but the next run must still be the minute after
+        upcoming = (int(time.time()) // 60 + 1) * 60.0
+        with self.scheduler._cond:
+            job = self.scheduler._jobs[job_id]
+            job.fire_at = upcoming
+            job.deadline = time.monotonic()
+            heapq.heappush(self.scheduler._heap, (job.deadline, job_id))
+            self.scheduler._cond.notify()
+        self.assertTrue(self.ctrl.applied.wait(1))
+        with self.scheduler._cond:
+            self.assertEqual(job.fire_at, upcoming + 60)
+
+    def test_many_pending_timers(self):
+        threads_before = threading.active_count()
+        for i in range(5000):
+            self.scheduler.schedule(1 + i % 4, True, delay_ms=60000 + i)
+        self.assertEqual(len(self.scheduler.list_jobs()), 5000)
+        self.assertLessEqual(threading.active_count(), threads_before)
+
+    def test_recurring_job_stays_scheduled(self):
+        job_id = self.scheduler.schedule(1, True, cron="*/5 * * * *")
+        job = self.scheduler.list_jobs()[0]
+        self.assertEqual((job["id"], job["kind"], job["cron"]), (job_id, "recurring", "*/5 * * * *"))
+
+    def test_invalid_requests(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.pulse(9, 100)
+        with self.assertRaises(ValueError):
+            self.scheduler.schedule(1, True, delay_ms=10, cron="* * * * *")
+        with self.assertRaises(ValueError):
+            self.scheduler.schedule(1, True, cron="61 * * * *")
+
+
+class CronSpecTestCase(unittest.TestCase):
+    def test_next_after(self):
+        spec = CronSpec("0 6 * * *")
+        self.assertEqual(spec.next_after(datetime(2024, 1, 1, 6, 0)), datetime(2024, 1, 2, 6, 0))
+        self.assertEqual(spec.next_after(datetime(2024, 1, 1, 5, 59, 30)), datetime(2024, 1, 1, 6, 0))
+
+    def test_day_of_week_and_steps(self):
+        # 2024-01-01 is a Monday; "1-5" is Monday-Friday
+        spec = CronSpec("30 */12 * * 1-5")
+        self.assertEqual(spec.next_after(datetime(2024, 1, 5, 12, 30)), datetime(2024, 1, 8, 0, 30))
+        self.assertEqual(CronSpec("0 0 29 2 *").next_after(datetime(2024, 3, 1)), datetime(2028, 2, 29))
+
+
+if __name__ == "__main__":
+    unittest.main()
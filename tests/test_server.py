@@ -0,0 +1,88 @@
+import http.client
+import threading
+import unittest
+from flask import Flask
+from src.server import PooledWSGIServer, serve
+
+
+class MockLogger:
+    def info(self, msg, *args, **kwargs): pass
+
+
+class PooledWSGIServerTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.add_url_rule('/ping', 'ping', lambda: {"thread": threading.current_thread().name})
+        self.server = PooledWSGIServer('127.0.0.1', 0, app, workers=2, keep_alive=1, queue_depth=4)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive_requests_served_by_pool(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+        for _ in range(3):
+            conn.request('GET', '/ping')
+            resp = conn.getresponse()
+            self.assertEqual(resp.status, 200)
+            self.assertIn(b'api-worker', resp.read())
+        conn.close()
+
+    def test_two_requests_over_one_socket(self):
+        import socket
+        self.server.app.add_url_rule('/echo', 'echo', lambda: "ignored body", methods=['POST'])
+        sock = socket.create_connection(('127.0.0.1', self.server.port), timeout=5)
+        self.addCleanup(sock.close)
+        # The first body is never read by the app; the second request must still be parsed
+        sock.sendall(b"POST /echo HTTP/1.1\r\nHost: x\r\nContent-Length: 5\r\n\r\nhello"
+                     b"GET /ping HTTP/1.1\r\nHost: x\r\n\r\n")
+        reader = sock.makefile('rb')
+        def response():
+            status = reader.readline()
+            headers = {}
+            for line in iter(reader.readline, b"\r\n"):
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            return status, headers, reader.read(int(headers["content-length"]))
+        for expected in (b"ignored body", b"api-worker"):
+            status, headers, body = response()
+            self.assertIn(b" 200 ", status)
+            self.assertNotEqual(headers.get("connection"), "close")
+            self.assertIn(expected, body)
+        sock.sendall(b"GET /ping HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+        self.assertEqual(response()[1]["connection"], "close")
+        self.assertEqual(reader.read(), b"")
+
+    def test_close_does_not_wait_for_endless_streams(self):
+        import time
+        from flask import Response
+        def endless():
+            while True:
+                yield b"x"
+                time.sleep(0.01)
+        self.server.app.add_url_rule('/stream', 'stream', lambda: Response(endless()))
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+        conn.request('GET', '/stream')
+        conn.getresponse().read(1)
+        self.server.close_timeout = 0.2
+        start = time.monotonic()
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(all(worker.daemon for worker in self.server._workers))
+        conn.close()
+
+    def test_listen_backlog_uses_queue_depth(self):
+        self.assertEqual(self.server.request_queue_size, 4)
+
+
+class ServeTestCase(unittest.TestCase):
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            serve(None, {'host': '127.0.0.1', 'port': 0, 'server': 'gunicorn'}, MockLogger())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from src.api_server import init_api, shutdown_api
+from src.config_manager import ConfigManager
+from src.gpio_backend import create_backend
+from src.relay_controller import RelayController
+from src.server import PooledWSGIServer
+from simulator import loadgen
+from simulator.board import VirtualRelayBoard
+
+
+class MockLogger:
+    def info(self, msg, *args, **kwargs): pass
+    def warning(self, msg, *args, **kwargs): pass
+    def error(self, msg, *args, **kwargs): pass
+    def debug(self, msg, *args, **kwargs): pass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 10.0
+
+    def __call__(self):
+        return self.now
+
+
+class VirtualRelayBoardTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_contacts_follow_after_switch_latency_and_bounce(self):
+        board = VirtualRelayBoard(switch_latency_ms=10, bounce_ms=5, seed=1, clock=self.clock)
+        board.setup([31, 33], [False, True])
+        board.write(31, True)
+        self.assertEqual(board.read_many([31, 33]), [False, True])
+        self.clock.now += 0.012
+        self.assertEqual({board.read(31) for _ in range(50)}, {True, False})
+        self.clock.now += 0.005
+        self.assertTrue(board.read(31))
+        # Rewriting the same state does not operate the relay again
+        board.write_many([(31, True), (33, False)])
+        self.assertEqual(board.operations, {31: 1, 33: 1})
+
+    def test_stuck_relays_and_injected_failures(self):
+        board = VirtualRelayBoard(stuck={33: False}, write_fail_rate=1.0, clock=self.clock)
+        board.setup([31, 33], [False, False])
+        with self.assertRaises(OSError):
+            board.write(33, True)
+        self.assertEqual(board.write_failures, 1)
+        board.write_fail_rate = 0
+        board.write(33, True)
+        self.assertEqual(board.pins[33], True)
+        self.assertFalse(board.read(33))
+        board.read_fail_rate = 1.0
+        with self.assertRaises(OSError):
+            board.read_many([31])
+
+    def test_reconcile_waits_for_contacts_to_settle(self):
+        board = VirtualRelayBoard(switch_latency_ms=100, stuck={33: False})
+        ctrl = RelayController({1: 31, 2: 33}, MockLogger(), backend=board)
+        self.addCleanup(ctrl.cleanup)
+        ctrl.turn_on(1)
+        ctrl.turn_on(2)
+        # Read-back still shows the old contact state, which is not drift
+        self.assertEqual(ctrl.reconcile(), {})
+        self.assertEqual(dict(ctrl.status), {1: True, 2: True})
+        time.sleep(0.15)
+        self.assertEqual(ctrl.reconcile(), {2: False})
+        self.assertEqual(dict(ctrl.status), {1: True, 2: False})
+
+    def test_created_from_config(self):
+        board = create_backend({'backend': 'virtual', 'switch_latency_ms': 8, 'stuck': {31: True}})
+        self.assertIsInstance(board, VirtualRelayBoard)
+        self.assertEqual((board.switch_latency, board.stuck), (0.008, {31: True}))
+
+
+class LoadGeneratorTestCase(unittest.TestCase):
+    def start_server(self, board):
+        self.relay_controller = RelayController({1: 31, 2: 33, 3: 35, 4: 37}, MockLogger(), backend=board)
+        fd, self.config_path = tempfile.mkstemp(suffix='.yaml')
+        with os.fdopen(fd, 'w') as f:
+            f.write("api: {}\nrelays: {pins: {1: 31}}\nlogging: {}\nsystem: {version: '1.0.0'}\n")
+        app = init_api(self.relay_controller, ConfigManager(self.config_path), MockLogger())
+        self.server = PooledWSGIServer("127.0.0.1", 0, app, workers=4)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.stop_server)
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop_server(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutdown_api()
+        self.relay_controller.cleanup()
+        os.remove(self.config_path)
+
+    def test_synthetic_trace_is_consistent(self):
+        url = self.start_server(VirtualRelayBoard())
+        self.assertEqual(loadgen.relay_ids(url), [1, 2, 3, 4])
+        trace = loadgen.synthetic_trace([1, 2, 3, 4], rate=2000, duration=0.1, seed=3)
+        report = loadgen.run(url, trace, clients=4)
+        self.assertEqual(report["completed"], 200)
+        self.assertEqual(report["statuses"], {"200": 200})
+        self.assertEqual(report["consistency_errors"], 0)
+        self.assertGreater(report["latency_ms"]["max"], 0)
+
+    def test_stuck_relay_is_reported(self):
+        url = self.start_server(VirtualRelayBoard(stuck={31: False}))
+        self.relay_controller.start_reconciler(0.005)
+        trace = [{"t": 0, "method": "POST", "path": "/relay/1/on"},
+                 {"t": 0.05, "method": "GET", "path": "/relay/status"}]
+        report = loadgen.run(url, trace, clients=2)
+        self.assertGreaterEqual(report["consistency_errors"], 1)
+        self.assertEqual(report["mismatches"][0]["relay"], 1)
+
+    def test_trace_round_trip(self):
+        trace = loadgen.synthetic_trace([1, 2], rate=10, duration=1, seed=1)
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        loadgen.save_trace(path, trace)
+        self.assertEqual(loadgen.load_trace(path), trace)
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import threading
+import unittest
+from src.state_journal import StateJournal, initial_state
+
+
+class MockLogger:
+    def warning(self, msg, *args, **kwargs): pass
+    def error(self, msg, *args, **kwargs): pass
+
+
+class StateJournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "relay_state.journal")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_journal(self, relay_ids=(1, 2, 3, 4), **kwargs):
+        return StateJournal(self.path, relay_ids, MockLogger(), fsync=False, **kwargs)
+
+    def test_missing_journal(self):
+        self.assertIsNone(self.make_journal().load())
+
+    def test_replays_latest_state(self):
+        journal = self.make_journal()
+        journal.start({1: False, 2: False, 3: False, 4: False})
+        journal.record({1: True, 3: True})
+        journal.record({1: False})
+        journal.close()
+        self.assertEqual(self.make_journal().load(), {1: False, 2: False, 3: True, 4: False})
+
+    def test_torn_last_record_is_ignored(self):
+        journal = self.make_journal()
+        journal.start({1: True})
+        journal.record({2: True})
+        journal.close()
+        with open(self.path, "r+b") as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b"\xff\xff")
+        self.assertEqual(self.make_journal().load(), {1: True, 2: False, 3: False, 4: False})
+
+    def test_compaction_bounds_file_size(self):
+        journal = self.make_journal(compact_after=10)
+        journal.start({})
+        for i in range(100):
+            journal.record({1: i % 2 == 0})
+            journal.close()
+            journal.start(journal.load())
+        journal.close()
+        self.assertLessEqual(os.path.getsize(self.path), len(journal._header) + 10 * journal._record_size)
+
+    def test_writer_survives_failed_compaction(self):
+        journal = self.make_journal(compact_after=1)
+        journal.start({1: False})
+        failed = threading.Event()
+        sync = journal._sync
+
+        def failing_sync(f):
+            if not failed.is_set():
+                failed.set()
+                raise ValueError("disk gone")
+            sync(f)
+        journal._sync = failing_sync
+        journal.record({1: True})
+        self.assertTrue(failed.wait(2))
+        journal.record({2: True})
+        journal.close()
+        self.assertEqual(self.make_journal().load(), {1: True, 2: True, 3: False, 4: False})
+
+    def test_relay_set_change_ignores_journal(self):
+        journal = self.make_journal()
+        journal.start({1: True})
+        journal.close()
+        self.assertIsNone(self.make_journal(relay_ids=(1, 2)).load())
+
+
+class InitialStateTestCase(unittest.TestCase):
+    def test_policies(self):
+        ids = [1, 2, 3]
+        journaled = {1: True, 2: False, 3: True}
+        defaults = {2: True}
+        self.assertEqual(initial_state("restore", ids, journaled, defaults), journaled)
+        self.assertEqual(initial_state("restore", ids, None, defaults), {1: False, 2: True, 3: False})
+        self.assertEqual(initial_state("all_off", ids, journaled, defaults), {1: False, 2: False, 3: False})
+        self.assertEqual(initial_state("default", ids, journaled, defaults), {1: False, 2: True, 3: False})
+        with self.assertRaises(ValueError):
+            initial_state("sometimes", ids, journaled)
+
+
+if __name__ == "__main__":
+    unittest.main()